@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import struct
+from datetime import datetime
+
+import numpy as np
+
+MAGICO = b'SCRVEC01'
+VERSAO_FORMATO = 1
+ALINHAMENTO = 64
+DTYPES_SUPORTADOS = ('float32', 'float16')
+TAMANHO_BLOCO = 65536
+
+
+def normalizar_linhas(matriz):
+    matriz = np.asarray(matriz, dtype=np.float32)
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    normas[normas == 0] = 1.0
+    return matriz / normas
+
+
+def nova_versao_build():
+    return datetime.now().strftime('%Y%m%d%H%M%S%f')
+
+
+def salvar_matriz_vetores(caminho, embeddings, modelo, dtype='float32', versao_build=None):
+    if dtype not in DTYPES_SUPORTADOS:
+        raise ValueError(f"dtype '{dtype}' não suportado. Use um de {DTYPES_SUPORTADOS}.")
+
+    matriz = np.ascontiguousarray(normalizar_linhas(embeddings).astype(dtype))
+    cabecalho = {
+        'formato': VERSAO_FORMATO,
+        'modelo': modelo,
+        'dimensao': int(matriz.shape[1]),
+        'linhas': int(matriz.shape[0]),
+        'dtype': dtype,
+        'normalizado': True,
+        'versao_build': versao_build or nova_versao_build(),
+    }
+    json_cabecalho = json.dumps(cabecalho, ensure_ascii=False).encode('utf-8')
+    tamanho = len(MAGICO) + 4 + len(json_cabecalho)
+    preenchimento = (-tamanho) % ALINHAMENTO
+
+    caminho_tmp = caminho + '.tmp'
+    with open(caminho_tmp, 'wb') as f:
+        f.write(MAGICO)
+        f.write(struct.pack('<I', len(json_cabecalho) + preenchimento))
+        f.write(json_cabecalho)
+        f.write(b' ' * preenchimento)
+        f.write(matriz.tobytes())
+    os.replace(caminho_tmp, caminho)
+    return cabecalho
+
+
+def ler_cabecalho(caminho):
+    with open(caminho, 'rb') as f:
+        if f.read(len(MAGICO)) != MAGICO:
+            raise ValueError(f"'{caminho}' não é um arquivo de vetores do Scriptura.")
+        (tamanho_json,) = struct.unpack('<I', f.read(4))
+        cabecalho = json.loads(f.read(tamanho_json).decode('utf-8'))
+    cabecalho['offset_dados'] = len(MAGICO) + 4 + tamanho_json
+    return cabecalho
+
+
+def carregar_matriz_vetores(caminho):
+    cabecalho = ler_cabecalho(caminho)
+    if cabecalho['formato'] != VERSAO_FORMATO:
+        raise ValueError(f"Formato {cabecalho['formato']} de '{caminho}' não suportado.")
+    matriz = np.memmap(
+        caminho,
+        dtype=cabecalho['dtype'],
+        mode='r',
+        offset=cabecalho['offset_dados'],
+        shape=(cabecalho['linhas'], cabecalho['dimensao']),
+    )
+    return matriz, cabecalho
+
+
+def salvar_arrays_npy(prefixo, arrays):
+    for nome, array in arrays.items():
+        caminho = f'{prefixo}_{nome}.npy'
+        with open(caminho + '.tmp', 'wb') as f:
+            np.save(f, array)
+        os.replace(caminho + '.tmp', caminho)
+
+
+def carregar_arrays_npy(prefixo, nomes):
+    return {nome: np.load(f'{prefixo}_{nome}.npy', mmap_mode='r') for nome in nomes}
+
+
+class MatrizEmPartes:
+    # Várias matrizes (por exemplo, o .vec mapeado em memória e as linhas
+    # ingeridas depois dele) vistas como uma só, sem copiar a base. Suporta o
+    # que as buscas usam: len, fatias contíguas e indexação por array de linhas.
+    def __init__(self, partes):
+        self.partes = []
+        for parte in partes:
+            if isinstance(parte, MatrizEmPartes):
+                self.partes.extend(parte.partes)
+            elif len(parte):
+                self.partes.append(parte)
+        self.inicios = np.cumsum([0] + [len(parte) for parte in self.partes])
+        self.shape = (int(self.inicios[-1]), self.partes[0].shape[1] if self.partes else 0)
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def nbytes(self):
+        return sum(int(parte.nbytes) for parte in self.partes)
+
+    def __getitem__(self, chave):
+        if isinstance(chave, slice):
+            inicio, fim, passo = chave.indices(len(self))
+            if passo != 1:
+                raise IndexError("MatrizEmPartes só aceita fatias contíguas.")
+            pedacos = []
+            for parte, base in zip(self.partes, self.inicios):
+                a, b = max(inicio - base, 0), min(fim - base, len(parte))
+                if a < b:
+                    pedacos.append(np.asarray(parte[a:b], dtype=np.float32))
+            return np.concatenate(pedacos) if pedacos else np.empty((0, self.shape[1]), dtype=np.float32)
+
+        linhas = np.asarray(chave, dtype=np.int64)
+        resultado = np.empty((len(linhas), self.shape[1]), dtype=np.float32)
+        qual_parte = np.searchsorted(self.inicios, linhas, side='right') - 1
+        for p in np.unique(qual_parte):
+            mascara = qual_parte == p
+            resultado[mascara] = self.partes[p][linhas[mascara] - self.inicios[p]]
+        return resultado
+
+
+def juntar_matrizes(matriz, novas_linhas):
+    return MatrizEmPartes([matriz, novas_linhas])
+
+
+def similaridade_cosseno_lote(matriz, vetores):
+    vetores = normalizar_linhas(np.atleast_2d(vetores))
+    scores = np.empty((len(vetores), len(matriz)), dtype=np.float32)
+    for inicio in range(0, len(matriz), TAMANHO_BLOCO):
+        bloco = np.asarray(matriz[inicio : inicio + TAMANHO_BLOCO], dtype=np.float32)
+        scores[:, inicio : inicio + len(bloco)] = vetores @ bloco.T
+    return scores
+
+
+def similaridade_cosseno(matriz, vetor):
+    return similaridade_cosseno_lote(matriz, vetor)[0]
@@ -12,12 +12,8 @@ echo 2. Convertendo novos PDFs para TXT...
 python auto_converter.py
 
 echo.
-echo 3. Recriando indices de TRECHOS (Busca exata)...
-python processar_textos.py
-
-echo.
-echo 4. Recriando indices de TEMAS (Busca semantica)...
-python processar_temas.py
+echo 3. Atualizando indices de TRECHOS e TEMAS (somente livros novos ou alterados)...
+python processar_indices.py
 
 echo.
 echo =================================================================
@@ -1,47 +1,116 @@
 import pdfplumber
+import hashlib
+import json
 import os
 import re
 import string
-import sqlite3 
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-DB_PATH = 'literatura.db' 
+DB_PATH = 'literatura.db'
+
+PROCESSOS = int(os.environ.get('SCRIPTURA_CONVERSAO_PROCESSOS', os.cpu_count() or 1))
+PAGINAS_POR_TAREFA = int(os.environ.get('SCRIPTURA_CONVERSAO_PAGINAS', 100))
 
 MARCADORES_INICIO = re.compile(
     r'\b(CAPÍTULO\s+(I|1)|CANTO\s+(I|1)|ATO\s+(I|1)|PARTE\s+(I|1)|LIVRO\s+(I|1)|INTRODUÇÃO|PRIMEIRA\s+PARTE)\b',
     re.IGNORECASE
 )
 
+def caminho_origem(caminho_txt):
+    return caminho_txt + '.origem.json'
+
+def hash_pdf(caminho_pdf):
+    sha = hashlib.sha256()
+    with open(caminho_pdf, 'rb') as f:
+        for bloco in iter(lambda: f.read(1 << 20), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+def pdf_inalterado(caminho_pdf, caminho_txt):
+    # O .txt só é reaproveitado se foi gerado a partir deste mesmo PDF: primeiro
+    # compara mtime/tamanho e, se só o mtime mudou, confirma pelo sha256.
+    if not os.path.exists(caminho_txt):
+        return False
+    try:
+        with open(caminho_origem(caminho_txt), 'r', encoding='utf-8') as f:
+            origem = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return False
+    stat = os.stat(caminho_pdf)
+    if origem.get('pdf') != caminho_pdf or origem.get('tamanho') != stat.st_size:
+        return False
+    if origem.get('mtime_ns') == stat.st_mtime_ns:
+        return True
+    if origem.get('sha256') != hash_pdf(caminho_pdf):
+        return False
+    origem['mtime_ns'] = stat.st_mtime_ns
+    salvar_origem(caminho_txt, origem)
+    return True
+
+def salvar_origem(caminho_txt, origem):
+    destino = caminho_origem(caminho_txt)
+    with open(destino + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(origem, f, ensure_ascii=False)
+    os.replace(destino + '.tmp', destino)
+
+def contar_paginas(caminho_pdf):
+    with pdfplumber.open(caminho_pdf) as pdf:
+        return len(pdf.pages)
+
+def extrair_paginas(caminho_pdf, inicio, fim):
+    inicio_extracao = time.perf_counter()
+    textos = []
+    with pdfplumber.open(caminho_pdf) as pdf:
+        for pagina in pdf.pages[inicio:fim]:
+            texto_pagina = pagina.extract_text(x_tolerance=1, y_tolerance=1)
+            if texto_pagina:
+                textos.append(texto_pagina)
+    return textos, time.perf_counter() - inicio_extracao
+
+def intervalos_de_paginas(total_paginas, paginas_por_tarefa=PAGINAS_POR_TAREFA):
+    return [(inicio, min(inicio + paginas_por_tarefa, total_paginas))
+            for inicio in range(0, max(total_paginas, 1), paginas_por_tarefa)]
+
+def salvar_txt_limpo(caminho_pdf_completo, caminho_txt_completo, paginas):
+    texto_completo_original = "".join(texto_pagina + "\n" for texto_pagina in paginas)
+
+    match = MARCADORES_INICIO.search(texto_completo_original)
+    if match:
+        start_index = match.end()
+        texto_para_salvar = texto_completo_original[start_index:]
+        texto_para_salvar = texto_para_salvar.lstrip(string.whitespace + '-\n')
+        print(f"    -> Marcador de início encontrado! Lixo da capa removido.")
+    else:
+        texto_para_salvar = texto_completo_original
+        print(f"    -> Marcador não encontrado. Salvando o texto inteiro.")
+
+    os.makedirs(os.path.dirname(caminho_txt_completo) or '.', exist_ok=True)
+    with open(caminho_txt_completo + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(texto_para_salvar)
+    os.replace(caminho_txt_completo + '.tmp', caminho_txt_completo)
+
+    stat = os.stat(caminho_pdf_completo)
+    salvar_origem(caminho_txt_completo, {
+        'pdf': caminho_pdf_completo,
+        'tamanho': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': hash_pdf(caminho_pdf_completo),
+    })
+    print(f"  [SUCESSO] -> Salvo em '{caminho_txt_completo}'")
+
 def converter_pdf_para_txt_limpo(caminho_pdf_completo, caminho_txt_completo):
-    if os.path.exists(caminho_txt_completo):
-        print(f"  AVISO (converter): O arquivo .txt '{caminho_txt_completo}' já existe. Pulando conversão.")
-        return True 
+    if pdf_inalterado(caminho_pdf_completo, caminho_txt_completo):
+        print(f"  AVISO (converter): '{caminho_txt_completo}' já está atualizado com o PDF. Pulando conversão.")
+        return True
 
     print(f"  [CONVERTENDO]: {caminho_pdf_completo}")
-    
-    texto_completo_original = ""
     try:
-        with pdfplumber.open(caminho_pdf_completo) as pdf:
-            for i, pagina in enumerate(pdf.pages):
-                texto_pagina = pagina.extract_text(x_tolerance=1, y_tolerance=1)
-                if texto_pagina:
-                    texto_completo_original += texto_pagina + "\n"
-        
-        match = MARCADORES_INICIO.search(texto_completo_original)
-        texto_para_salvar = ""
-        
-        if match:
-            start_index = match.end() 
-            texto_para_salvar = texto_completo_original[start_index:]
-            texto_para_salvar = texto_para_salvar.lstrip(string.whitespace + '-\n')
-            print(f"    -> Marcador de início encontrado! Lixo da capa removido.")
-        else:
-            texto_para_salvar = texto_completo_original
-            print(f"    -> Marcador não encontrado. Salvando o texto inteiro.")
-        
-        with open(caminho_txt_completo, 'w', encoding='utf-8') as f:
-            f.write(texto_para_salvar)
-        
-        print(f"  [SUCESSO] -> Salvo em '{caminho_txt_completo}'")
+        paginas, segundos = extrair_paginas(caminho_pdf_completo, 0, None)
+        salvar_txt_limpo(caminho_pdf_completo, caminho_txt_completo, paginas)
+        print(f"    -> {len(paginas)} páginas com texto em {segundos:.1f}s ({len(paginas) / max(segundos, 1e-9):.1f} páginas/s).")
         return True
 
     except Exception as e:
@@ -49,15 +118,73 @@ def converter_pdf_para_txt_limpo(caminho_pdf_completo, caminho_txt_completo):
         print(f"          Motivo: {e}")
         return False
 
-def rodar_build_limpo_completo():
+def converter_em_paralelo(pares_pdf_txt, processos=PROCESSOS):
+    # Livros grandes são divididos em intervalos de páginas; cada intervalo é
+    # uma tarefa do pool, e o .txt de um livro é gravado assim que todos os
+    # intervalos dele terminam.
+    sucesso = 0
+    falha = 0
+    with ProcessPoolExecutor(max_workers=max(processos, 1)) as executor:
+        futuros = {}
+        livros = {}
+        for caminho_pdf, caminho_txt in pares_pdf_txt:
+            try:
+                total_paginas = contar_paginas(caminho_pdf)
+            except Exception as e:
+                print(f"  [ERRO] -> Não foi possível abrir o arquivo {caminho_pdf}.")
+                print(f"          Motivo: {e}")
+                falha += 1
+                continue
+            intervalos = intervalos_de_paginas(total_paginas)
+            livros[caminho_pdf] = {
+                'txt': caminho_txt, 'paginas': total_paginas, 'partes': [None] * len(intervalos),
+                'faltam': len(intervalos), 'segundos': 0.0, 'erro': None, 'inicio': time.perf_counter(),
+            }
+            print(f"  [CONVERTENDO]: {caminho_pdf} ({total_paginas} páginas, {len(intervalos)} tarefa(s))")
+            for posicao, (inicio, fim) in enumerate(intervalos):
+                futuro = executor.submit(extrair_paginas, caminho_pdf, inicio, fim)
+                futuros[futuro] = (caminho_pdf, posicao)
+
+        for futuro in as_completed(futuros):
+            caminho_pdf, posicao = futuros[futuro]
+            livro = livros[caminho_pdf]
+            try:
+                livro['partes'][posicao], segundos = futuro.result()
+                livro['segundos'] += segundos
+            except Exception as e:
+                livro['erro'] = e
+            livro['faltam'] -= 1
+            if livro['faltam']:
+                continue
+
+            if livro['erro'] is not None:
+                print(f"  [ERRO] -> Não foi possível processar o arquivo {caminho_pdf}.")
+                print(f"          Motivo: {livro['erro']}")
+                falha += 1
+            else:
+                print(f"  [{os.path.basename(caminho_pdf)}]")
+                try:
+                    salvar_txt_limpo(caminho_pdf, livro['txt'], [p for parte in livro['partes'] for p in parte])
+                    decorrido = time.perf_counter() - livro['inicio']
+                    print(f"    -> {livro['paginas']} páginas em {decorrido:.1f}s "
+                          f"({livro['paginas'] / max(decorrido, 1e-9):.1f} páginas/s; "
+                          f"{livro['paginas'] / max(livro['segundos'], 1e-9):.1f} páginas/s por processo).")
+                    sucesso += 1
+                except Exception as e:
+                    print(f"  [ERRO] -> Não foi possível salvar '{livro['txt']}'. Motivo: {e}")
+                    falha += 1
+            del livros[caminho_pdf]
+    return sucesso, falha
+
+def rodar_build_limpo_completo(forcar=False):
     PASTA_PDFS = 'static/pdfs/'
     PASTA_CORPUS = 'corpus/'
 
     os.makedirs(PASTA_PDFS, exist_ok=True)
     os.makedirs(PASTA_CORPUS, exist_ok=True)
-    
+
     print(f"--- Iniciando conversão ---")
-    
+
     try:
         conn = sqlite3.connect(DB_PATH)
         conn.row_factory = sqlite3.Row
@@ -76,25 +203,32 @@ def rodar_build_limpo_completo():
 
     print(f"Encontrados {len(livros_a_processar)} livros marcados como 'PROCESSADO' no DB para converter.")
 
-    sucesso = 0
+    pendentes = []
+    inalterados = 0
     falha = 0
 
     for livro in livros_a_processar:
         caminho_pdf = livro['caminho_pdf']
         caminho_txt = livro['caminho_arquivo']
-        
+
         if not caminho_pdf or not os.path.exists(caminho_pdf):
             print(f"  AVISO: PDF '{caminho_pdf}' não encontrado no disco. Pulando.")
             falha += 1
             continue
-            
-        if converter_pdf_para_txt_limpo(caminho_pdf, caminho_txt):
-            sucesso += 1
-        else:
-            falha += 1
+        if not forcar and pdf_inalterado(caminho_pdf, caminho_txt):
+            inalterados += 1
+            continue
+        pendentes.append((caminho_pdf, caminho_txt))
+
+    print(f"{inalterados} livros já convertidos e inalterados; {len(pendentes)} para converter "
+          f"({PROCESSOS} processo(s), até {PAGINAS_POR_TAREFA} páginas por tarefa).")
+
+    inicio = time.perf_counter()
+    sucesso, falha_conversao = converter_em_paralelo(pendentes) if pendentes else (0, 0)
+    falha += falha_conversao
 
-    print(f"\n--- Conversão inteligente (v6.0) concluída! ---")
-    print(f"Sucesso: {sucesso} / Falha: {falha}")
+    print(f"\n--- Conversão inteligente (v6.0) concluída em {time.perf_counter() - inicio:.1f}s! ---")
+    print(f"Sucesso: {sucesso} / Inalterados: {inalterados} / Falha: {falha}")
 
 if __name__ == '__main__':
-    rodar_build_limpo_completo()
\ No newline at end of file
+    rodar_build_limpo_completo(forcar='--forcar' in sys.argv)
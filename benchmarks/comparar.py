@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+# Compara dois resultados de `rodar_benchmarks.py` (por exemplo, de dois
+# commits) e aponta as métricas que pioraram além do limite:
+#
+#     python benchmarks/comparar.py base.json novo.json --limite 10
+#
+# Tempos, latências e memória pioram quando sobem; vazão e acerto, quando
+# descem. Diferenças absolutas abaixo de MINIMOS (ruído de medição) não contam.
+# Sai com código 1 se houver regressão, para poder ser usado em um script de CI.
+
+import argparse
+import json
+import sys
+
+METRICAS_MAIOR_MELHOR = ('vazao_por_s', 'acerto_top1')
+IGNORADAS = ('configuracao', 'ambiente', 'versao_codigo', 'data', 'n', 'concorrencia', 'tamanho_lote')
+MINIMOS = {'_s': 0.05, '_ms': 1.0, '_mb': 1.0}
+
+
+def achatar(dados, prefixo=''):
+    metricas = {}
+    for nome, valor in dados.items():
+        if nome in IGNORADAS:
+            continue
+        caminho = f'{prefixo}{nome}'
+        if isinstance(valor, dict):
+            metricas.update(achatar(valor, caminho + '.'))
+        elif isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            metricas[caminho] = valor
+    return metricas
+
+
+def comparar(base, novo, limite_pct):
+    linhas, regressoes = [], []
+    metricas_base, metricas_novo = achatar(base), achatar(novo)
+    for caminho in sorted(set(metricas_base) & set(metricas_novo)):
+        antes, depois = metricas_base[caminho], metricas_novo[caminho]
+        variacao = (depois - antes) / antes * 100 if antes else 0.0
+        pior = -variacao if caminho.rsplit('.', 1)[-1] in METRICAS_MAIOR_MELHOR else variacao
+        # A unidade vem do nome da métrica ou do grupo (etapas_s.indices).
+        minimo = next(
+            (valor for parte in reversed(caminho.split('.')) for sufixo, valor in MINIMOS.items() if parte.endswith(sufixo)), 0
+        )
+        marcador = ''
+        if pior > limite_pct and abs(depois - antes) >= minimo and caminho.rsplit('.', 1)[-1] != 'erros':
+            marcador = '  <-- REGRESSÃO'
+            regressoes.append(caminho)
+        elif caminho.endswith('erros') and depois > antes:
+            marcador = '  <-- MAIS ERROS'
+            regressoes.append(caminho)
+        linhas.append(f"{caminho:<55} {antes:>12} {depois:>12} {variacao:>+8.1f}%{marcador}")
+    return linhas, regressoes
+
+
+def rodar():
+    parser = argparse.ArgumentParser(description="Compara dois resultados de benchmark do Scriptura.")
+    parser.add_argument('base')
+    parser.add_argument('novo')
+    parser.add_argument('--limite', type=float, default=10.0, help='piora tolerada, em %% (padrão: 10)')
+    args = parser.parse_args()
+
+    with open(args.base, 'r', encoding='utf-8') as f:
+        base = json.load(f)
+    with open(args.novo, 'r', encoding='utf-8') as f:
+        novo = json.load(f)
+
+    if base.get('configuracao') != novo.get('configuracao'):
+        print("AVISO: As configurações dos dois resultados são diferentes; a comparação pode não ser justa.")
+    print(f"Base: {base.get('versao_codigo')} ({base.get('data')})  Novo: {novo.get('versao_codigo')} ({novo.get('data')})\n")
+    print(f"{'métrica':<55} {'base':>12} {'novo':>12} {'variação':>9}")
+    linhas, regressoes = comparar(base, novo, args.limite)
+    print("\n".join(linhas))
+    print(f"\n{len(regressoes)} regressão(ões) acima de {args.limite:.0f}%.")
+    sys.exit(1 if regressoes else 0)
+
+
+if __name__ == '__main__':
+    rodar()
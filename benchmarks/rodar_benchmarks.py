@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+
+# Benchmark reprodutível do Scriptura: gera um acervo sintético, mede o build dos
+# índices, a subida da API e a latência/vazão dos endpoints de busca, e imprime
+# (e grava, com --saida) um JSON que pode ser comparado entre commits com
+# `benchmarks/comparar.py`. Cada etapa roda em um subprocesso próprio, para que
+# a memória medida seja só a daquela etapa. As variáveis `SCRIPTURA_*`
+# (quantização, n_probe, caches...) são repassadas e registradas no resultado.
+#
+#     python benchmarks/rodar_benchmarks.py --livros 100 --saida resultado.json
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import sintetico
+
+MARCADOR = 'RESULTADO_BENCHMARK '
+
+
+def percentis(amostras_ms):
+    amostras = np.asarray(amostras_ms, dtype=np.float64)
+    return {
+        'n': int(len(amostras)),
+        'media_ms': round(float(amostras.mean()), 3),
+        'p50_ms': round(float(np.percentile(amostras, 50)), 3),
+        'p95_ms': round(float(np.percentile(amostras, 95)), 3),
+        'p99_ms': round(float(np.percentile(amostras, 99)), 3),
+        'max_ms': round(float(amostras.max()), 3),
+    }
+
+
+def emitir(resultado):
+    print(MARCADOR + json.dumps(resultado, ensure_ascii=False), flush=True)
+
+
+# --- Etapas (cada uma roda em um subprocesso, dentro do diretório de trabalho)
+
+def etapa_build(args):
+    pipeline_corpus = sintetico.instalar_modelos_sinteticos()
+    from geracoes import diretorio_atual
+
+    inicio = time.perf_counter()
+    if not pipeline_corpus.rodar_pipeline(processos=args.processos):
+        raise SystemExit("O build falhou.")
+    tempo_build = time.perf_counter() - inicio
+
+    # Segunda execução sem mudanças: mede o custo fixo do build incremental.
+    inicio = time.perf_counter()
+    pipeline_corpus.rodar_pipeline(processos=args.processos)
+    tempo_incremental = time.perf_counter() - inicio
+
+    from indice_colunar import IndiceColunar
+    diretorio = diretorio_atual()
+    _, pico = sintetico.memoria_mb()
+    emitir({
+        'tempo_s': round(tempo_build, 3),
+        'tempo_incremental_s': round(tempo_incremental, 3),
+        'pico_rss_mb': pico,
+        'indices_em_disco_mb': sintetico.tamanho_diretorio_mb(diretorio),
+        'segmentos_em_disco_mb': round(
+            sintetico.tamanho_diretorio_mb('segmentos_TRECHO') + sintetico.tamanho_diretorio_mb('segmentos_TEMA'), 2
+        ),
+        'trechos': len(IndiceColunar.carregar(os.path.join(diretorio, 'index_TRECHO'))),
+        'chunks_tema': len(IndiceColunar.carregar(os.path.join(diretorio, 'index_TEMA'))),
+    })
+
+
+def medir_endpoint(cliente, caminho, consultas, concorrencia):
+    corpos = [{'texto': consulta['texto']} for consulta in consultas]
+    latencias = []
+    erros = acertos = 0
+    for consulta, corpo in zip(consultas, corpos):
+        inicio = time.perf_counter()
+        resposta = cliente.post(caminho, json=corpo)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        if resposta.status_code != 200:
+            erros += 1
+            continue
+        resultados = resposta.json()
+        acertos += bool(resultados) and resultados[0]['obra']['id'] == consulta['livro_id']
+
+    # Vazão: as mesmas buscas disparadas por `concorrencia` threads ao mesmo
+    # tempo (o micro-lote da API junta as que chegam juntas).
+    def enviar(corpo):
+        return cliente.post(caminho, json=corpo).status_code
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        status = list(executor.map(enviar, corpos))
+    decorrido = time.perf_counter() - inicio
+    erros += sum(codigo != 200 for codigo in status)
+
+    resultado = percentis(latencias)
+    resultado['acerto_top1'] = round(acertos / max(len(consultas), 1), 4)
+    resultado['vazao_por_s'] = round(len(corpos) / decorrido, 2)
+    resultado['concorrencia'] = concorrencia
+    resultado['erros'] = int(erros)
+    return resultado
+
+
+def medir_lote(cliente, caminho, consultas, tamanho_lote):
+    # As mesmas buscas enviadas em lotes de `tamanho_lote` textos: a latência
+    # é por lote e a vazão, em buscas por segundo (comparável à do endpoint
+    # individual).
+    latencias = []
+    erros = acertos = 0
+    for i in range(0, len(consultas), tamanho_lote):
+        lote = consultas[i : i + tamanho_lote]
+        inicio = time.perf_counter()
+        resposta = cliente.post(caminho, json={'textos': [consulta['texto'] for consulta in lote]})
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        if resposta.status_code != 200:
+            erros += len(lote)
+            continue
+        for consulta, item in zip(lote, resposta.json()):
+            if item['erro'] is not None:
+                erros += 1
+                continue
+            resultados = item['resultados']
+            acertos += bool(resultados) and resultados[0]['obra']['id'] == consulta['livro_id']
+
+    resultado = percentis(latencias)
+    resultado['acerto_top1'] = round(acertos / max(len(consultas), 1), 4)
+    resultado['vazao_por_s'] = round(len(consultas) / (sum(latencias) / 1000), 2)
+    resultado['tamanho_lote'] = tamanho_lote
+    resultado['erros'] = int(erros)
+    return resultado
+
+
+def etapa_api(args):
+    rss_antes, _ = sintetico.memoria_mb()
+    inicio = time.perf_counter()
+    sintetico.instalar_modelos_sinteticos()
+    import main
+    tempo_import = time.perf_counter() - inicio
+    if not main.inicializacao.pronto.wait(600):
+        raise SystemExit("A API não ficou pronta em 600 s.")
+    tempo_pronto = time.perf_counter() - inicio
+    rss_pronto, _ = sintetico.memoria_mb()
+
+    from fastapi.testclient import TestClient
+
+    with open('consultas.json', 'r', encoding='utf-8') as f:
+        consultas = json.load(f)
+
+    endpoints = {}
+    with TestClient(main.app) as cliente:
+        endpoints['encontrar-por-trecho'] = medir_endpoint(cliente, '/encontrar-por-trecho', consultas['trecho'], args.concorrencia)
+        endpoints['recomendar-por-tema'] = medir_endpoint(cliente, '/recomendar-por-tema', consultas['tema'], args.concorrencia)
+        endpoints['encontrar-por-trecho/batch'] = medir_lote(cliente, '/encontrar-por-trecho/batch', consultas['trecho'], args.lote)
+        endpoints['recomendar-por-tema/batch'] = medir_lote(cliente, '/recomendar-por-tema/batch', consultas['tema'], args.lote)
+
+    rss_final, pico = sintetico.memoria_mb()
+    emitir({
+        'inicializacao': {
+            'import_s': round(tempo_import, 3),
+            'pronto_s': round(tempo_pronto, 3),
+            'etapas_s': main.inicializacao.estado()['etapas'],
+        },
+        'memoria': {
+            'rss_base_mb': rss_antes,
+            'rss_pronto_mb': rss_pronto,
+            'rss_final_mb': rss_final,
+            'pico_rss_mb': pico,
+        },
+        'endpoints': endpoints,
+    })
+
+
+# --- Orquestração ------------------------------------------------------------
+
+def rodar_etapa(nome, args, diretorio):
+    comando = [
+        sys.executable, os.path.abspath(__file__), '--etapa', nome,
+        '--processos', str(args.processos), '--concorrencia', str(args.concorrencia), '--lote', str(args.lote),
+    ]
+    processo = subprocess.run(comando, cwd=diretorio, capture_output=True, text=True, encoding='utf-8')
+    if args.verboso or processo.returncode != 0:
+        sys.stderr.write(processo.stdout)
+        sys.stderr.write(processo.stderr)
+    for linha in reversed(processo.stdout.splitlines()):
+        if linha.startswith(MARCADOR):
+            return json.loads(linha[len(MARCADOR):])
+    raise SystemExit(f"A etapa '{nome}' não produziu resultado (código {processo.returncode}).")
+
+
+def versao_codigo():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=sintetico.RAIZ, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def rodar():
+    parser = argparse.ArgumentParser(description="Benchmark do Scriptura com corpus sintético e encoder determinístico.")
+    parser.add_argument('--livros', type=int, default=10, help='número de livros sintéticos (padrão: 10)')
+    parser.add_argument('--frases-por-livro', type=int, default=300, help='frases por livro (padrão: 300)')
+    parser.add_argument('--consultas', type=int, default=200, help='buscas por endpoint (padrão: 200)')
+    parser.add_argument('--concorrencia', type=int, default=8, help='threads na medição de vazão (padrão: 8)')
+    parser.add_argument('--lote', type=int, default=16, help='textos por requisição nos endpoints /batch (padrão: 16)')
+    # Sem fork, os processos de segmentação não herdariam o segmentador sintético.
+    processos_padrao = (os.cpu_count() or 1) if multiprocessing.get_start_method() == 'fork' else 1
+    parser.add_argument('--processos', type=int, default=processos_padrao, help='processos de segmentação do build')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--diretorio', help='diretório de trabalho (padrão: temporário, apagado ao final)')
+    parser.add_argument('--saida', help='arquivo JSON de saída (além da saída padrão)')
+    parser.add_argument('--verboso', action='store_true', help='mostra a saída dos builders e da API')
+    parser.add_argument('--etapa', choices=['build', 'api'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.etapa == 'build':
+        return etapa_build(args)
+    if args.etapa == 'api':
+        return etapa_api(args)
+
+    diretorio = args.diretorio or tempfile.mkdtemp(prefix='scriptura_bench_')
+    os.makedirs(diretorio, exist_ok=True)
+    # Sem caches de consulta/resposta, cada busca mede o caminho completo.
+    os.environ.setdefault('SCRIPTURA_CACHE_CONSULTAS_MB', '0')
+    os.environ.setdefault('SCRIPTURA_CACHE_RESPOSTAS_MB', '0')
+    try:
+        inicio = time.perf_counter()
+        sintetico.gerar_corpus(diretorio, args.livros, args.frases_por_livro, args.consultas, args.semente)
+        tempo_corpus = time.perf_counter() - inicio
+
+        resultado = {
+            'versao_codigo': versao_codigo(),
+            'data': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'configuracao': {
+                'livros': args.livros,
+                'frases_por_livro': args.frases_por_livro,
+                'consultas': args.consultas,
+                'concorrencia': args.concorrencia,
+                'lote': args.lote,
+                'processos': args.processos,
+                'semente': args.semente,
+                'variaveis': {nome: valor for nome, valor in sorted(os.environ.items()) if nome.startswith('SCRIPTURA_')},
+            },
+            'ambiente': {
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'plataforma': platform.platform(),
+                'cpus': os.cpu_count(),
+            },
+            'corpus': {'tempo_s': round(tempo_corpus, 3)},
+        }
+        resultado['build'] = rodar_etapa('build', args, diretorio)
+        resultado.update(rodar_etapa('api', args, diretorio))
+    finally:
+        if not args.diretorio:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+    texto = json.dumps(resultado, ensure_ascii=False, indent=2)
+    print(texto)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            f.write(texto + '\n')
+
+
+if __name__ == '__main__':
+    rodar()
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import re
+import sqlite3
+import sys
+import types
+import zlib
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+DIMENSAO = 384
+TAMANHO_VOCABULARIO = 20000
+EXPOENTE_ZIPF = 1.1
+
+CONSOANTES = ['', 'b', 'c', 'd', 'f', 'g', 'l', 'm', 'n', 'p', 'r', 's', 't', 'v', 'ch', 'lh', 'nh', 'qu', 'br', 'tr']
+VOGAIS = ['a', 'e', 'i', 'o', 'u', 'ão', 'ã', 'é', 'ê', 'ó', 'ei', 'ou']
+GENEROS = ['Romance', 'Contos', 'Poesia', 'Novela', 'Crônica']
+MOVIMENTOS = ['Romantismo', 'Realismo', 'Naturalismo', 'Parnasianismo', 'Modernismo']
+
+RE_FRASE = re.compile(r'(?<=[.!?])\s+')
+RE_PALAVRA = re.compile(r'\w+')
+
+
+# --- Modelos determinísticos, sem download ---------------------------------
+
+class EncoderDeterministico:
+    # Substitui o SentenceTransformer: cada palavra tem um vetor aleatório fixo
+    # (semente = crc32 da palavra) e a frase é a soma dos vetores das palavras.
+    # Textos parecidos ficam próximos, o que basta para exercitar IVF, BM25 e
+    # ranking com resultados estáveis entre execuções.
+    def __init__(self, dimensao=DIMENSAO):
+        self.dimensao = dimensao
+        self._vetores = {}
+
+    def _vetor(self, palavra):
+        vetor = self._vetores.get(palavra)
+        if vetor is None:
+            rng = np.random.default_rng(zlib.crc32(palavra.encode('utf-8')))
+            vetor = rng.standard_normal(self.dimensao).astype(np.float32)
+            self._vetores[palavra] = vetor
+        return vetor
+
+    def encode(self, textos, **kwargs):
+        saida = np.zeros((len(textos), self.dimensao), dtype=np.float32)
+        for i, texto in enumerate(textos):
+            for palavra in RE_PALAVRA.findall(texto.lower()):
+                saida[i] += self._vetor(palavra)
+        return saida
+
+
+class _Frase:
+    def __init__(self, texto):
+        self.text = texto
+
+
+class _Documento:
+    def __init__(self, texto):
+        self.sents = [_Frase(frase) for frase in RE_FRASE.split(texto)]
+
+
+class SegmentadorRegex:
+    # Só é usado quando o pacote spacy não está instalado: separa as frases na
+    # pontuação final, como o `sentencizer`.
+    max_length = 10 ** 9
+
+    def __call__(self, texto):
+        return _Documento(texto)
+
+    def pipe(self, textos, **kwargs):
+        # Usado pela segmentação das buscas em lote.
+        return (self(texto) for texto in textos)
+
+    def add_pipe(self, *args, **kwargs):
+        pass
+
+
+def criar_segmentador():
+    try:
+        import spacy
+    except ImportError:
+        return SegmentadorRegex()
+    nlp = spacy.blank('pt')
+    nlp.max_length = 10 ** 9
+    nlp.add_pipe('sentencizer')
+    return nlp
+
+
+def instalar_modelos_sinteticos():
+    # Tem que rodar antes de importar o main: a inicialização pega o modelo de
+    # `pipeline_corpus.carregar_modelo()` e o segmentador do spaCy.
+    import pipeline_corpus
+
+    pipeline_corpus.MODEL = EncoderDeterministico()
+    pipeline_corpus.NLP = criar_segmentador()
+    os.environ['SCRIPTURA_SEGMENTADOR_CONSULTAS'] = 'sentencizer'
+    if isinstance(pipeline_corpus.NLP, SegmentadorRegex):
+        modulo = types.ModuleType('spacy')
+        modulo.blank = lambda *args, **kwargs: SegmentadorRegex()
+        modulo.load = lambda *args, **kwargs: SegmentadorRegex()
+        sys.modules['spacy'] = modulo
+    return pipeline_corpus
+
+
+# --- Corpus sintético -------------------------------------------------------
+
+def gerar_vocabulario(rng, tamanho=TAMANHO_VOCABULARIO):
+    palavras = set()
+    while len(palavras) < tamanho:
+        n_silabas = rng.integers(1, 5)
+        palavras.add(''.join(rng.choice(CONSOANTES) + rng.choice(VOGAIS) for _ in range(n_silabas)))
+    palavras = sorted(palavras)
+    rng.shuffle(palavras)
+    pesos = 1.0 / np.arange(1, tamanho + 1) ** EXPOENTE_ZIPF
+    return palavras, pesos / pesos.sum()
+
+
+def gerar_frases(rng, palavras, probabilidades, n_frases):
+    # Todas as palavras do livro são sorteadas de uma vez (busca binária na
+    # distribuição acumulada); sortear frase a frase com `p=` custaria O(V) cada.
+    tamanhos = rng.integers(5, 21, size=n_frases)
+    sorteadas = np.searchsorted(np.cumsum(probabilidades), rng.random(int(tamanhos.sum())))
+    sorteadas = np.minimum(sorteadas, len(palavras) - 1)
+    finais = rng.choice(['.', '.', '.', '.', '!', '?'], size=n_frases)
+    virgulas = rng.random(n_frases) < 0.4
+
+    frases, inicio = [], 0
+    for tamanho, final, virgula in zip(tamanhos.tolist(), finais.tolist(), virgulas.tolist()):
+        escolhidas = [palavras[i] for i in sorteadas[inicio : inicio + tamanho]]
+        inicio += tamanho
+        if virgula and tamanho > 10:
+            escolhidas[tamanho // 2] += ','
+        frases.append(escolhidas[0].capitalize() + ' ' + ' '.join(escolhidas[1:]) + final)
+    return frases
+
+
+def gerar_corpus(diretorio, n_livros, frases_por_livro, n_consultas, semente=42):
+    # Grava corpus/*.txt, um literatura.db com a tabela `livros` do
+    # scripts_db.py e consultas.json com as buscas usadas na medição.
+    import scripts_db
+    from cache_metadados import garantir_contador_versao
+
+    rng = np.random.default_rng(semente)
+    palavras, probabilidades = gerar_vocabulario(rng)
+    os.makedirs(os.path.join(diretorio, 'corpus'), exist_ok=True)
+    os.makedirs(os.path.join(diretorio, 'static'), exist_ok=True)
+
+    livros_consulta = set(rng.choice(n_livros, size=min(n_livros, n_consultas), replace=False).tolist())
+    amostras = []
+    registros = []
+    for n in range(n_livros):
+        # Cada livro privilegia um pedaço do vocabulário, para que a busca por
+        # tema tenha livros claramente mais relevantes que outros.
+        foco = rng.permutation(len(palavras))[:200]
+        probabilidades_livro = probabilidades.copy()
+        probabilidades_livro[foco] += 0.3 / len(foco)
+        probabilidades_livro /= probabilidades_livro.sum()
+
+        frases = gerar_frases(rng, palavras, probabilidades_livro, frases_por_livro)
+        paragrafos = [' '.join(frases[i : i + 6]) for i in range(0, len(frases), 6)]
+        caminho = os.path.join('corpus', f'livro_{n:05d}.txt')
+        with open(os.path.join(diretorio, caminho), 'w', encoding='utf-8') as f:
+            f.write('\n\n'.join(paragrafos))
+        registros.append((
+            f'Obra Sintética {n}', f'Autor {n % 97}', 1800 + n % 200,
+            GENEROS[n % len(GENEROS)], MOVIMENTOS[n % len(MOVIMENTOS)], caminho,
+        ))
+        if n in livros_consulta:
+            amostras.append((n + 1, frases, [palavras[i] for i in foco[:30]]))
+
+    conn = sqlite3.connect(os.path.join(diretorio, 'literatura.db'))
+    try:
+        conn.executescript(scripts_db.SQL_SCRIPT)
+        conn.execute("DELETE FROM livros")
+        conn.execute("DELETE FROM sqlite_sequence WHERE name = 'livros'")
+        conn.executemany(
+            "INSERT INTO livros (titulo, autor, ano_lancamento, genero, movimento_literario, caminho_arquivo, status) "
+            "VALUES (?, ?, ?, ?, ?, ?, 'PROCESSADO')",
+            registros,
+        )
+        conn.commit()
+        garantir_contador_versao(conn)
+    finally:
+        conn.close()
+
+    consultas = gerar_consultas(rng, amostras, n_consultas)
+    with open(os.path.join(diretorio, 'consultas.json'), 'w', encoding='utf-8') as f:
+        json.dump(consultas, f, ensure_ascii=False)
+    return consultas
+
+
+def gerar_consultas(rng, amostras, n_consultas):
+    # Trecho: metade citações exatas de uma frase, um quarto com uma palavra a
+    # menos e um quarto com três frases seguidas. Tema: palavras do foco de um
+    # livro misturadas a uma frase dele. Cada busca guarda o id do livro de
+    # origem, para medir o acerto do primeiro resultado.
+    trecho, tema = [], []
+    for i in range(n_consultas):
+        livro_id, frases, foco = amostras[i % len(amostras)]
+        posicao = int(rng.integers(0, max(len(frases) - 3, 1)))
+        tipo = i % 4
+        if tipo in (0, 1):
+            texto = frases[posicao]
+        elif tipo == 2:
+            palavras_frase = frases[posicao].split()
+            del palavras_frase[int(rng.integers(0, len(palavras_frase)))]
+            texto = ' '.join(palavras_frase)
+        else:
+            texto = ' '.join(frases[posicao : posicao + 3])
+        trecho.append({'texto': texto, 'livro_id': livro_id})
+        palavras_tema = [foco[j] for j in rng.choice(len(foco), size=8, replace=False)]
+        tema.append({'texto': ' '.join(palavras_tema) + '. ' + frases[posicao], 'livro_id': livro_id})
+    return {'trecho': trecho, 'tema': tema}
+
+
+# --- Medição de memória -----------------------------------------------------
+
+def memoria_mb():
+    # (residente atual, pico residente) do processo, em MB. Lê /proc no Linux;
+    # em outros sistemas usa o psutil, se estiver instalado.
+    try:
+        valores = {}
+        with open('/proc/self/status', 'r', encoding='utf-8') as f:
+            for linha in f:
+                if linha.startswith(('VmRSS:', 'VmHWM:')):
+                    nome, valor = linha.split(':', 1)
+                    valores[nome] = int(valor.split()[0]) / 1024
+        return round(valores['VmRSS'], 1), round(valores['VmHWM'], 1)
+    except (OSError, KeyError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None, None
+    info = psutil.Process().memory_info()
+    pico = getattr(info, 'peak_wset', None)
+    return round(info.rss / 2 ** 20, 1), round(pico / 2 ** 20, 1) if pico else None
+
+
+def tamanho_diretorio_mb(diretorio):
+    total = 0
+    for raiz, _, arquivos in os.walk(diretorio):
+        total += sum(os.path.getsize(os.path.join(raiz, nome)) for nome in arquivos)
+    return round(total / 2 ** 20, 2)
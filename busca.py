@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+
+class GruposPorLivro:
+    # Os builders gravam as linhas livro a livro, então cada livro ocupa
+    # (quase sempre) um único bloco contíguo do índice.
+    def __init__(self, ids_livro):
+        ids = np.asarray(ids_livro)
+        if len(ids):
+            inicios = np.concatenate([[0], np.flatnonzero(ids[1:] != ids[:-1]) + 1])
+            fins = np.append(inicios[1:], len(ids))
+        else:
+            inicios = fins = np.empty(0, dtype=np.int64)
+        self._definir_blocos(inicios, fins, ids[inicios])
+
+    def _definir_blocos(self, inicios, fins, livro_de_cada_bloco):
+        self.inicios = inicios
+        self.fins = fins
+        self.livro_de_cada_bloco = livro_de_cada_bloco
+        self.livros, self.livro_do_bloco = np.unique(livro_de_cada_bloco, return_inverse=True)
+
+    def com_linhas(self, ids_novos, primeira_linha):
+        # Linhas ingeridas no fim do índice viram blocos novos, sem reagrupar
+        # as antigas: o custo é o do número de blocos, não o de linhas.
+        novos = GruposPorLivro(ids_novos)
+        grupos = GruposPorLivro(ids_novos[:0])
+        grupos._definir_blocos(
+            np.concatenate([self.inicios, novos.inicios + primeira_linha]),
+            np.concatenate([self.fins, novos.fins + primeira_linha]),
+            np.concatenate([self.livro_de_cada_bloco, novos.livro_de_cada_bloco]),
+        )
+        return grupos
+
+    def linhas_do_livro(self, posicao_livro):
+        blocos = np.flatnonzero(self.livro_do_bloco == posicao_livro)
+        return np.concatenate([np.arange(self.inicios[b], self.fins[b]) for b in blocos])
+
+
+def ordenar_top_k(scores, linhas, k):
+    k = min(k, len(linhas))
+    if k <= 0:
+        return linhas[:0]
+    top = np.sort(linhas[np.argpartition(-scores[linhas], k - 1)[:k]])
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+def top_k_por_livro(scores, grupos, limite_livros, limite_por_livro, livro_valido=None):
+    if not len(grupos.inicios):
+        return []
+
+    melhor_por_bloco = np.maximum.reduceat(scores, grupos.inicios)
+    melhor_por_livro = np.full(len(grupos.livros), -np.inf)
+    np.maximum.at(melhor_por_livro, grupos.livro_do_bloco, melhor_por_bloco)
+
+    resultado = []
+    for posicao in np.argsort(-melhor_por_livro, kind='stable'):
+        id_livro = int(grupos.livros[posicao])
+        if livro_valido is not None and not livro_valido(id_livro):
+            continue
+        linhas = grupos.linhas_do_livro(posicao)
+        resultado.append((id_livro, ordenar_top_k(scores, linhas, limite_por_livro)))
+        if len(resultado) >= limite_livros:
+            break
+    return resultado
+
+
+def alinhar_frases(resultados_por_frase, id_livro, max_salto=1):
+    # `resultados_por_frase[i]` traz as melhores linhas (e scores) da frase i
+    # da consulta. Como o índice de trechos guarda as frases de cada livro em
+    # ordem, uma citação longa aparece como acertos em linhas consecutivas:
+    # (i, r), (i+1, r+1), ... Cada acerto continua a melhor cadeia que termina
+    # logo antes dele, tolerando até `max_salto` frases puladas na consulta ou
+    # no índice (frases curtas demais que o build descartou, por exemplo).
+    cadeias = {}
+    ordem = []
+    for i, (linhas, scores) in enumerate(resultados_por_frase):
+        for linha, score in zip(linhas.tolist(), scores.tolist()):
+            livro = id_livro(linha)
+            melhor = None
+            for salto_consulta in range(1, max_salto + 2):
+                for salto_linha in range(1, max_salto + 2):
+                    if salto_consulta + salto_linha > max_salto + 2:
+                        continue
+                    anterior = cadeias.get((i - salto_consulta, linha - salto_linha))
+                    if anterior is None or anterior[2] != livro:
+                        continue
+                    if melhor is None or (anterior[0], anterior[1]) > (melhor[0], melhor[1]):
+                        melhor = anterior
+            if melhor is None:
+                cadeia = (1, score, livro, [linha], [score])
+            else:
+                cadeia = (melhor[0] + 1, melhor[1] + score, livro, melhor[3] + [linha], melhor[4] + [score])
+            cadeias[(i, linha)] = cadeia
+            ordem.append(cadeia)
+
+    # Melhor cadeia de cada livro: mais frases alinhadas e, no empate, maior
+    # score médio. A ordenação é estável, então com uma frase só o resultado é
+    # o mesmo da busca por similaridade pura.
+    ordem.sort(key=lambda cadeia: (-cadeia[0], -cadeia[1] / cadeia[0]))
+    melhores = {}
+    for comprimento, soma, livro, linhas, scores in ordem:
+        if livro not in melhores:
+            melhores[livro] = (livro, linhas, scores, soma / comprimento)
+    return list(melhores.values())
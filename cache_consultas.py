@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+MAX_MB_CONSULTAS = float(os.environ.get('SCRIPTURA_CACHE_CONSULTAS_MB', 64))
+TTL_CONSULTAS = float(os.environ.get('SCRIPTURA_CACHE_CONSULTAS_TTL', 3600))
+
+RE_CONTROLE_INVISIVEL = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]')
+
+
+def normalizar_consulta(texto):
+    return " ".join(RE_CONTROLE_INVISIVEL.sub('', texto).split())
+
+
+def estimar_tamanho(valor):
+    if isinstance(valor, np.ndarray):
+        return valor.nbytes
+    if isinstance(valor, str):
+        return sys.getsizeof(valor)
+    if isinstance(valor, (bytes, bytearray)):
+        return len(valor)
+    if isinstance(valor, dict):
+        return sum(estimar_tamanho(k) + estimar_tamanho(v) for k, v in valor.items())
+    if isinstance(valor, (list, tuple)):
+        return sum(estimar_tamanho(v) for v in valor)
+    return sys.getsizeof(valor)
+
+
+class CacheLRU:
+    def __init__(self, max_bytes, ttl=None, nome='cache'):
+        self.max_bytes = int(max_bytes)
+        self.ttl = ttl
+        self.nome = nome
+        self.hits = 0
+        self.misses = 0
+        self.bytes_usados = 0
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._itens)
+
+    def obter(self, chave):
+        with self._lock:
+            entrada = self._itens.get(chave)
+            if entrada is not None and self.ttl and time.monotonic() - entrada[2] > self.ttl:
+                self._remover(chave)
+                entrada = None
+            if entrada is None:
+                self.misses += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.hits += 1
+            return entrada[0]
+
+    def guardar(self, chave, valor, tamanho_valor=None):
+        if tamanho_valor is None:
+            tamanho_valor = estimar_tamanho(valor)
+        tamanho = estimar_tamanho(chave) + tamanho_valor
+        if tamanho > self.max_bytes:
+            return
+        with self._lock:
+            if chave in self._itens:
+                self._remover(chave)
+            self._itens[chave] = (valor, tamanho, time.monotonic())
+            self.bytes_usados += tamanho
+            while self.bytes_usados > self.max_bytes:
+                self._remover(next(iter(self._itens)))
+
+    def _remover(self, chave):
+        _, tamanho, _ = self._itens.pop(chave)
+        self.bytes_usados -= tamanho
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+            self.bytes_usados = 0
+
+    def estatisticas(self):
+        total = self.hits + self.misses
+        return {
+            'nome': self.nome,
+            'itens': len(self._itens),
+            'bytes_usados': self.bytes_usados,
+            'max_bytes': self.max_bytes,
+            'ttl_segundos': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'taxa_acerto': round(self.hits / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import sqlite3
+
+import numpy as np
+
+DB_CACHE_EMBEDDINGS = os.environ.get('SCRIPTURA_CACHE_EMBEDDINGS_DB', 'cache_embeddings.db')
+MAX_PARAMETROS_SQL = 900
+
+SQL_TABELA_EMBEDDINGS = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    modelo TEXT NOT NULL,
+    hash BLOB NOT NULL,
+    vetor BLOB NOT NULL,
+    PRIMARY KEY (modelo, hash)
+) WITHOUT ROWID;
+"""
+
+
+def hash_texto(texto):
+    return hashlib.sha256(texto.encode('utf-8')).digest()
+
+
+class CacheEmbeddings:
+    # Vetores endereçados pelo conteúdo: (nome do modelo, sha256 do texto do
+    # chunk). Os vetores são guardados exatamente como saem do `encode`
+    # (float32, sem normalizar), então um acerto é indistinguível de recalcular.
+    def __init__(self, caminho_db, modelo):
+        self.caminho_db = caminho_db
+        self.modelo = modelo
+        self.hits = 0
+        self.misses = 0
+        self.duplicados = 0
+        conn = sqlite3.connect(caminho_db)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SQL_TABELA_EMBEDDINGS)
+        finally:
+            conn.close()
+
+    def obter_muitos(self, hashes):
+        encontrados = {}
+        conn = sqlite3.connect(self.caminho_db)
+        try:
+            for i in range(0, len(hashes), MAX_PARAMETROS_SQL):
+                parte = hashes[i : i + MAX_PARAMETROS_SQL]
+                marcadores = ", ".join("?" for _ in parte)
+                for hash_chunk, vetor in conn.execute(
+                    f"SELECT hash, vetor FROM embeddings WHERE modelo = ? AND hash IN ({marcadores})",
+                    (self.modelo, *parte),
+                ):
+                    encontrados[bytes(hash_chunk)] = np.frombuffer(vetor, dtype=np.float32)
+        finally:
+            conn.close()
+        return encontrados
+
+    def guardar_muitos(self, vetores_por_hash):
+        conn = sqlite3.connect(self.caminho_db)
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (modelo, hash, vetor) VALUES (?, ?, ?)",
+                (
+                    (self.modelo, hash_chunk, np.ascontiguousarray(vetor, dtype=np.float32).tobytes())
+                    for hash_chunk, vetor in vetores_por_hash.items()
+                ),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def codificar(self, textos, codificar_lote, tamanho_lote):
+        # Devolve a matriz (len(textos), dim) na ordem de `textos`. Textos
+        # repetidos são codificados uma vez só, e só o que não está no cache
+        # chega a `codificar_lote`, em lotes de `tamanho_lote`.
+        hashes = [hash_texto(texto) for texto in textos]
+        unicos = {}
+        for texto, hash_chunk in zip(textos, hashes):
+            unicos.setdefault(hash_chunk, texto)
+        self.duplicados += len(textos) - len(unicos)
+
+        vetores = self.obter_muitos(list(unicos))
+        faltantes = [hash_chunk for hash_chunk in unicos if hash_chunk not in vetores]
+        self.hits += len(unicos) - len(faltantes)
+        self.misses += len(faltantes)
+
+        for i in range(0, len(faltantes), tamanho_lote):
+            lote = faltantes[i : i + tamanho_lote]
+            novos = codificar_lote([unicos[hash_chunk] for hash_chunk in lote])
+            if novos is None:
+                continue
+            novos = dict(zip(lote, np.asarray(novos, dtype=np.float32)))
+            self.guardar_muitos(novos)
+            vetores.update(novos)
+
+        sem_vetor = sum(1 for hash_chunk in unicos if hash_chunk not in vetores)
+        if sem_vetor:
+            raise RuntimeError(f"{sem_vetor} chunks ficaram sem vetor.")
+        return np.vstack([vetores[hash_chunk] for hash_chunk in hashes])
+
+    @property
+    def taxa_acerto(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def resumo(self):
+        return (
+            f"Cache de embeddings: {self.hits} reaproveitados, {self.misses} codificados, "
+            f"{self.duplicados} duplicados na mesma execução (taxa de acerto {self.taxa_acerto:.1%})."
+        )
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sqlite3
+import threading
+import time
+
+INTERVALO_VERIFICACAO = 1.0
+
+# Gatilhos mantêm um contador de versão que muda a cada INSERT/UPDATE/DELETE em
+# `livros`, venha a alteração da API, de outro worker ou de um script.
+SQL_CONTADOR_VERSAO = """
+CREATE TABLE IF NOT EXISTS versao_metadados (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    versao INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO versao_metadados (id, versao) VALUES (1, 0);
+CREATE TRIGGER IF NOT EXISTS livros_versao_insert AFTER INSERT ON livros
+BEGIN UPDATE versao_metadados SET versao = versao + 1 WHERE id = 1; END;
+CREATE TRIGGER IF NOT EXISTS livros_versao_update AFTER UPDATE ON livros
+BEGIN UPDATE versao_metadados SET versao = versao + 1 WHERE id = 1; END;
+CREATE TRIGGER IF NOT EXISTS livros_versao_delete AFTER DELETE ON livros
+BEGIN UPDATE versao_metadados SET versao = versao + 1 WHERE id = 1; END;
+"""
+
+
+def garantir_contador_versao(conn):
+    conn.executescript(SQL_CONTADOR_VERSAO)
+    conn.commit()
+
+
+def ler_versao(conn):
+    row = conn.execute("SELECT versao FROM versao_metadados WHERE id = 1").fetchone()
+    return row[0] if row else 0
+
+
+class CacheMetadados:
+    def __init__(self, db_path, formatar, intervalo_verificacao=INTERVALO_VERIFICACAO):
+        self.db_path = db_path
+        self.formatar = formatar
+        self.intervalo_verificacao = intervalo_verificacao
+        self.livros = {}
+        self.versao = None
+        self.recargas = 0
+        self._lock = threading.Lock()
+        self._assinatura_arquivo = None
+        self._ultima_verificacao = 0.0
+
+    def _assinatura(self):
+        try:
+            stat = os.stat(self.db_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def carregar(self):
+        with self._lock:
+            assinatura = self._assinatura()
+            conn = sqlite3.connect(self.db_path)
+            try:
+                garantir_contador_versao(conn)
+                conn.row_factory = sqlite3.Row
+                livros = {row['id']: self.formatar(row) for row in conn.execute("SELECT * FROM livros")}
+                versao = ler_versao(conn)
+            finally:
+                conn.close()
+            self.livros = livros
+            self.versao = versao
+            self.recargas += 1
+            self._assinatura_arquivo = assinatura
+            self._ultima_verificacao = time.monotonic()
+        return len(livros)
+
+    def invalidar(self):
+        return self.carregar()
+
+    def verificar_mudancas(self):
+        agora = time.monotonic()
+        if agora - self._ultima_verificacao < self.intervalo_verificacao:
+            return False
+        self._ultima_verificacao = agora
+
+        assinatura = self._assinatura()
+        if assinatura == self._assinatura_arquivo:
+            return False
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            versao = ler_versao(conn)
+        finally:
+            conn.close()
+        if versao == self.versao:
+            self._assinatura_arquivo = assinatura
+            return False
+        self.carregar()
+        return True
+
+    def instantaneo(self):
+        # O dicionário nunca é alterado no lugar, só substituído por inteiro.
+        self.verificar_mudancas()
+        return self.livros
+
+    def obter(self, id_livro):
+        return self.instantaneo().get(id_livro)
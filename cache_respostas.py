@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from cache_consultas import CacheLRU
+
+MAX_MB_RESPOSTAS = float(os.environ.get('SCRIPTURA_CACHE_RESPOSTAS_MB', 64))
+TTL_RESPOSTAS = float(os.environ.get('SCRIPTURA_CACHE_RESPOSTAS_TTL', 86400))
+DB_RESPOSTAS = os.environ.get('SCRIPTURA_CACHE_RESPOSTAS_DB', '')
+
+SQL_TABELA_RESPOSTAS = """
+CREATE TABLE IF NOT EXISTS respostas (
+    chave TEXT PRIMARY KEY,
+    versao_indices TEXT NOT NULL,
+    versao_metadados INTEGER NOT NULL,
+    corpo BLOB NOT NULL,
+    criado_em REAL NOT NULL
+);
+"""
+
+
+class CacheRespostas:
+    # As versões dos índices e dos metadados fazem parte da chave: depois de um
+    # rebuild ou de uma edição no acervo, as entradas antigas simplesmente deixam
+    # de ser encontradas (e são removidas do disco por `purgar`).
+    def __init__(self, max_bytes, ttl=None, caminho_db=''):
+        self.memoria = CacheLRU(max_bytes, ttl, nome='respostas')
+        self.ttl = ttl
+        self.caminho_db = caminho_db
+        self.hits_disco = 0
+        if caminho_db:
+            conn = sqlite3.connect(caminho_db)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(SQL_TABELA_RESPOSTAS)
+            finally:
+                conn.close()
+
+    @property
+    def tem_disco(self):
+        return bool(self.caminho_db)
+
+    @staticmethod
+    def chave(endpoint, consulta, parametros, versao_indices, versao_metadados):
+        bruto = json.dumps(
+            [endpoint, consulta, parametros, versao_indices, versao_metadados],
+            ensure_ascii=False, sort_keys=True,
+        )
+        return hashlib.sha256(bruto.encode('utf-8')).hexdigest()
+
+    def obter(self, chave):
+        return self.memoria.obter(chave)
+
+    def obter_disco(self, chave):
+        conn = sqlite3.connect(self.caminho_db)
+        try:
+            row = conn.execute("SELECT corpo, criado_em FROM respostas WHERE chave = ?", (chave,)).fetchone()
+        finally:
+            conn.close()
+        if row is None or (self.ttl and time.time() - row[1] > self.ttl):
+            return None
+        corpo = bytes(row[0])
+        self.hits_disco += 1
+        self.memoria.guardar(chave, corpo)
+        return corpo
+
+    def guardar(self, chave, corpo):
+        self.memoria.guardar(chave, corpo)
+
+    def guardar_disco(self, chave, corpo, versao_indices, versao_metadados):
+        conn = sqlite3.connect(self.caminho_db)
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO respostas VALUES (?, ?, ?, ?, ?)",
+                (chave, versao_indices, versao_metadados, corpo, time.time()),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def purgar(self, versoes_indices_validas, versao_metadados):
+        self.memoria.limpar()
+        if not self.tem_disco:
+            return 0
+        marcadores = ", ".join("?" for _ in versoes_indices_validas) or "NULL"
+        conn = sqlite3.connect(self.caminho_db)
+        try:
+            cursor = conn.execute(
+                f"DELETE FROM respostas WHERE versao_indices NOT IN ({marcadores}) OR versao_metadados != ?",
+                (*versoes_indices_validas, versao_metadados),
+            )
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+    def estatisticas(self):
+        estatisticas = self.memoria.estatisticas()
+        estatisticas['disco'] = self.caminho_db or None
+        estatisticas['hits_disco'] = self.hits_disco
+        return estatisticas
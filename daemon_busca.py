@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import os
+import socket
+import stat
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from fastapi import HTTPException
+
+from mensagens import enviar, receber
+from metricas import REGISTRO, requisicao, requisicao_atual
+
+# Com SCRIPTURA_DAEMON=<endereço>, `python daemon_busca.py` sobe o único
+# processo que carrega o modelo, o spaCy e os índices (e que roda a fila de
+# ingestão e a troca de gerações); os workers da API (`uvicorn main:app
+# --workers N`, com a mesma variável) só cuidam do HTTP, da validação e do
+# cache de respostas, e pedem ao daemon as buscas. O endereço é o caminho de
+# um socket unix (no Windows, um named pipe `\\.\pipe\<nome>`) ou host:porta.
+# A conexão é uma `multiprocessing.connection` autenticada, mas as mensagens
+# não são pickle (que executaria código de quem tivesse a chave): cada uma é um
+# cabeçalho JSON seguido dos bytes crus dos arrays e blobs que ele cita. A
+# chave só autentica; nada é cifrado. Por isso, um endereço host:porta só é
+# aceito com SCRIPTURA_DAEMON_CHAVE definida, e só deve ser usado em rede
+# confiável.
+ENDERECO_DAEMON = os.environ.get('SCRIPTURA_DAEMON', '')
+TIMEOUT_DAEMON = float(os.environ.get('SCRIPTURA_DAEMON_TIMEOUT_S', 600))
+# Sem SCRIPTURA_DAEMON_CHAVE, o daemon sorteia a chave a cada subida e a grava
+# (só para o dono) neste arquivo, que os workers leem ao conectar.
+ARQUIVO_CHAVE = os.environ.get('SCRIPTURA_DAEMON_CHAVE_ARQUIVO', 'daemon_busca.chave')
+INTERVALO_ESPERA = 1.0
+
+# True no processo do daemon, que importa o main como se fosse a API inteira.
+servindo = False
+
+
+def endereco(valor=ENDERECO_DAEMON):
+    host, _, porta = valor.rpartition(':')
+    if host and porta.isdigit():
+        return (host, int(porta))
+    return valor
+
+
+def ler_chave():
+    chave = os.environ.get('SCRIPTURA_DAEMON_CHAVE')
+    if chave:
+        return chave.encode('utf-8')
+    with open(ARQUIVO_CHAVE, 'r', encoding='utf-8') as f:
+        return bytes.fromhex(f.read().strip())
+
+
+def gerar_chave():
+    chave = os.environ.get('SCRIPTURA_DAEMON_CHAVE')
+    if chave:
+        return chave.encode('utf-8')
+    chave = os.urandom(16)
+    descritor = os.open(ARQUIVO_CHAVE + '.tmp', os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descritor, 'w', encoding='utf-8') as f:
+        f.write(chave.hex())
+    os.replace(ARQUIVO_CHAVE + '.tmp', ARQUIVO_CHAVE)
+    return chave
+
+
+# --- Lado dos workers ---------------------------------------------------------
+
+class ClienteDaemon:
+    # Conexões reaproveitadas entre chamadas, uma por chamada em andamento
+    # (as buscas de um worker correm nas threads do executor).
+    def __init__(self, endereco_daemon):
+        self.endereco = endereco_daemon
+        self._livres = []
+        self._trava = threading.Lock()
+
+    def _conexao(self):
+        with self._trava:
+            if self._livres:
+                return self._livres.pop()
+        return Client(self.endereco, authkey=ler_chave())
+
+    def _descartar_livres(self):
+        with self._trava:
+            livres, self._livres = self._livres, []
+        for conexao in livres:
+            conexao.close()
+
+    def _enviar(self, mensagem):
+        conexao = self._conexao()
+        try:
+            enviar(conexao, mensagem)
+            if not conexao.poll(TIMEOUT_DAEMON):
+                raise TimeoutError(f"sem resposta em {TIMEOUT_DAEMON:.0f} s")
+            resposta = receber(conexao)
+        except BaseException:
+            conexao.close()
+            raise
+        with self._trava:
+            self._livres.append(conexao)
+        return resposta
+
+    def chamar(self, operacao, *argumentos):
+        tempos = requisicao_atual()
+        mensagem = (operacao, argumentos, tempos.endpoint if tempos is not None else None)
+        try:
+            try:
+                status, valor, etapas = self._enviar(mensagem)
+            except TimeoutError:
+                raise
+            except (OSError, EOFError):
+                # Conexões de antes de o daemon reiniciar: tenta uma vez com uma nova.
+                self._descartar_livres()
+                status, valor, etapas = self._enviar(mensagem)
+        except (OSError, EOFError, AuthenticationError) as e:
+            raise HTTPException(
+                status_code=503,
+                detail=f"O daemon de busca não está disponível ({type(e).__name__}: {e}).",
+                headers={"Retry-After": "5"},
+            )
+        if tempos is not None:
+            for etapa, segundos in etapas.items():
+                tempos.adicionar(etapa, segundos)
+        if status == 'http':
+            codigo, detalhe = valor
+            raise HTTPException(status_code=codigo, detail=detalhe)
+        if status != 'ok':
+            raise HTTPException(status_code=500, detail=valor)
+        return valor
+
+    def aguardar(self):
+        # Etapa da inicialização dos workers: espera o daemon terminar a dele.
+        avisado = False
+        while True:
+            try:
+                estado = self.chamar('inicializacao')
+            except HTTPException as e:
+                estado = {'status': 'indisponivel', 'erro': e.detail}
+            if estado['status'] == 'pronto':
+                print(f"Conectado ao daemon de busca em '{ENDERECO_DAEMON}'.")
+                return
+            if estado['status'] == 'erro':
+                raise RuntimeError(f"a inicialização do daemon de busca falhou ({estado['erro']})")
+            if not avisado:
+                print(f"Aguardando o daemon de busca em '{ENDERECO_DAEMON}' ({estado['etapa'] if estado['status'] == 'inicializando' else estado['erro']})...")
+                avisado = True
+            time.sleep(INTERVALO_ESPERA)
+
+
+def cliente():
+    # O cliente que o main usa no lugar dos modelos e índices, ou None sem
+    # SCRIPTURA_DAEMON (e no próprio daemon).
+    if not ENDERECO_DAEMON or servindo:
+        return None
+    return ClienteDaemon(endereco())
+
+
+# --- Processo do daemon -------------------------------------------------------
+
+def _operacoes(main):
+    from microlote import executar
+
+    def sincronizar_metadados(versao_metadados):
+        # O worker já viu esta versão do acervo (é a da chave do cache de
+        # respostas dele); as obras dos resultados não podem ser mais antigas.
+        main.cache_metadados.verificar_mudancas()
+        if versao_metadados is not None and (main.cache_metadados.versao or 0) < versao_metadados:
+            main.cache_metadados.carregar()
+
+    def busca(funcao, modelo):
+        async def operacao(versao_metadados, campos):
+            main.exigir_pronto()
+            sincronizar_metadados(versao_metadados)
+            return await funcao(modelo.model_validate(campos))
+        return operacao
+
+    async def tema_paginado(item):
+        pagina = await main.primeira_pagina_tema(item)
+        if item.formato == "ndjson":
+            # As linhas do streaming são montadas aqui, onde estão os textos.
+            return await executar(list, pagina)
+        return pagina
+
+    def pagina_tema(versao_metadados, cursor):
+        main.exigir_pronto()
+        sincronizar_metadados(versao_metadados)
+        return main.montar_pagina_tema(cursor)
+
+    return {
+        'inicializacao': main.inicializacao.estado,
+        'estado': main.estado_busca,
+        'caches': main.estatisticas_caches_busca,
+        'metricas': lambda: (REGISTRO.instantaneo(), list(main.metricas_indices())),
+        'recarregar': main.recarregar_indices,
+        'trecho': busca(main.buscar_trecho, main.TextoParaAnalisar),
+        'tema': busca(main.buscar_tema, main.BuscaTema),
+        'tema_paginado': busca(tema_paginado, main.BuscaTema),
+        'lote_trecho': busca(main.calcular_lote_trecho, main.LoteTextos),
+        'lote_tema': busca(main.calcular_lote_tema, main.LoteTema),
+        'pagina_tema': pagina_tema,
+    }
+
+
+async def _rodar_no_loop(funcao, argumentos, endpoint):
+    with requisicao(endpoint or 'daemon') as tempos:
+        return await funcao(*argumentos), tempos.etapas
+
+
+def _rodar(funcao, argumentos, endpoint, loop):
+    # As buscas rodam no event loop do daemon, onde os micro-lotes juntam os
+    # pedidos de todos os workers; o resto, na thread da conexão.
+    if asyncio.iscoroutinefunction(funcao):
+        return asyncio.run_coroutine_threadsafe(_rodar_no_loop(funcao, argumentos, endpoint), loop).result()
+    with requisicao(endpoint or 'daemon') as tempos:
+        return funcao(*argumentos), tempos.etapas
+
+
+def _atender(conexao, operacoes, loop):
+    with conexao:
+        while True:
+            try:
+                operacao, argumentos, endpoint = receber(conexao)
+            except (OSError, EOFError):
+                return
+            except (ValueError, TypeError) as e:
+                print(f"AVISO: Mensagem inválida recebida pelo daemon de busca ({e}); conexão encerrada.")
+                return
+            try:
+                if operacao not in operacoes:
+                    raise ValueError(f"operação desconhecida: {operacao}")
+                resultado, etapas = _rodar(operacoes[operacao], argumentos, endpoint, loop)
+                resposta = ('ok', resultado, etapas)
+            except HTTPException as e:
+                resposta = ('http', (e.status_code, e.detail), {})
+            except Exception as e:
+                print(f"ERRO: A operação '{operacao}' do daemon de busca falhou: {type(e).__name__}: {e}")
+                resposta = ('erro', f"{type(e).__name__}: {e}", {})
+            try:
+                enviar(conexao, resposta)
+            except TypeError as e:
+                print(f"ERRO: A resposta da operação '{operacao}' do daemon de busca não pôde ser enviada: {e}")
+                enviar(conexao, ('erro', f"TypeError: {e}", {}))
+            except OSError:
+                return
+
+
+def _socket_atendendo(caminho):
+    with socket.socket(socket.AF_UNIX) as conexao:
+        try:
+            conexao.connect(caminho)
+            return True
+        except OSError:
+            return False
+
+
+def servir():
+    global servindo
+    if not ENDERECO_DAEMON:
+        raise SystemExit("Defina SCRIPTURA_DAEMON com o endereço do daemon (ex.: /tmp/scriptura.sock).")
+    alvo = endereco()
+    if isinstance(alvo, tuple) and not os.environ.get('SCRIPTURA_DAEMON_CHAVE'):
+        # O arquivo de chave só serve a workers da mesma máquina, e um endereço
+        # de rede precisa de uma chave escolhida (e guardada) por quem o expõe.
+        raise SystemExit(
+            f"O endereço '{ENDERECO_DAEMON}' é de rede: defina SCRIPTURA_DAEMON_CHAVE com uma chave "
+            "longa e aleatória nos workers e no daemon, e exponha a porta só em rede confiável."
+        )
+    if isinstance(alvo, str) and os.path.exists(alvo) and stat.S_ISSOCK(os.stat(alvo).st_mode):
+        if _socket_atendendo(alvo):
+            raise SystemExit(f"Já existe um daemon de busca atendendo em '{ENDERECO_DAEMON}'.")
+        os.remove(alvo)  # socket de um daemon que não saiu direito
+    servindo = True
+    # Sobe como uma API de um worker só (modelos, índices, fila de ingestão,
+    # vigia de gerações), mas sem HTTP.
+    import main
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name='scriptura-daemon-loop', daemon=True).start()
+    operacoes = _operacoes(main)
+
+    with Listener(alvo, authkey=gerar_chave()) as listener:
+        print(f"Daemon de busca ouvindo em '{ENDERECO_DAEMON}'.")
+        while True:
+            try:
+                conexao = listener.accept()
+            except (OSError, EOFError, AuthenticationError) as e:
+                print(f"AVISO: Conexão recusada pelo daemon de busca ({type(e).__name__}: {e}).")
+                continue
+            threading.Thread(target=_atender, args=(conexao, operacoes, loop), name='scriptura-daemon-conexao', daemon=True).start()
+
+
+if __name__ == '__main__':
+    # Pelo módulo importado (e não por este __main__), para que o
+    # `daemon_busca.servindo` que o main consulta seja o mesmo.
+    import daemon_busca
+    daemon_busca.servir()
@@ -47,12 +47,10 @@
                 return;
             }
 
+            // Em NDJSON cada livro chega em uma linha e já é desenhado,
+            // sem esperar pelos demais.
             const endpoint = `${API_URL}/recomendar-por-tema`;
-            const data = await fetchData(endpoint, { texto: query });
-
-            if (data) {
-                displayResults(data, 'contexto');
-            }
+            await streamTema(endpoint, { texto: query, formato: 'ndjson' });
         });
     }
 
@@ -145,6 +143,61 @@
         }
     }
 
+    async function streamTema(endpoint, bodyPayload) {
+        const resultsSidebar = document.getElementById('results-sidebar');
+        const metadataSidebar = document.getElementById('metadata-sidebar');
+        const resultsContainer = document.getElementById('results-container');
+
+        resultsContainer.innerHTML = '<h4>Buscando...</h4>';
+
+        resultsSidebar.classList.remove('hidden');
+        metadataSidebar.classList.add('hidden');
+
+        try {
+            const response = await fetch(endpoint, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(bodyPayload)
+            });
+
+            if (!response.ok) {
+                const errorData = await response.json();
+                throw new Error(errorData.detail || `Erro HTTP: ${response.status}`);
+            }
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let livros = 0;
+
+            const renderLine = (line) => {
+                if (!line.trim()) return;
+                const item = JSON.parse(line);
+                if (!item.obra) return; // primeira linha: ranking e cursor da próxima página
+                if (livros === 0) resultsContainer.innerHTML = '';
+                appendGroup(resultsContainer, { obra: item.obra, trechos: item.chunks.map(chunk => chunk.texto) }, 'contexto');
+                livros++;
+            };
+
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                const lines = buffer.split('\n');
+                buffer = lines.pop();
+                lines.forEach(renderLine);
+            }
+            renderLine(buffer + decoder.decode());
+
+            if (livros === 0) {
+                resultsContainer.innerHTML = '<p>Nenhum resultado encontrado.</p>';
+            }
+
+        } catch (error) {
+            resultsContainer.innerHTML = `<p class="message-error"><b>Erro:</b> ${error.message}</p>`;
+        }
+    }
+
     function displayResults(results, type) {
         const resultsContainer = document.getElementById('results-container');
         resultsContainer.innerHTML = '';
@@ -170,34 +223,36 @@
 
         const allGroups = Object.values(groups);
 
-        allGroups.forEach(group => {
-            const groupDiv = document.createElement('div');
-            groupDiv.className = 'result-group';
-
-            const title = document.createElement('h4');
-            title.innerText = group.obra.titulo;
+        allGroups.forEach(group => appendGroup(resultsContainer, group, type));
+    }
 
-            title.addEventListener('click', () => {
-                if (type === 'contexto') {
-                    displayMetadata(group);
-                } else {
-                    displayMetadata(group.obra);
-                }
-            });
+    function appendGroup(resultsContainer, group, type) {
+        const groupDiv = document.createElement('div');
+        groupDiv.className = 'result-group';
 
-            groupDiv.appendChild(title);
+        const title = document.createElement('h4');
+        title.innerText = group.obra.titulo;
 
-            if (type === 'trecho') {
-                const trechosLimitados = group.trechos.slice(0, 5);
-                trechosLimitados.forEach(texto => {
-                    const trechoP = document.createElement('p');
-                    trechoP.innerText = `"${texto}"`;
-                    groupDiv.appendChild(trechoP);
-                });
+        title.addEventListener('click', () => {
+            if (type === 'contexto') {
+                displayMetadata(group);
+            } else {
+                displayMetadata(group.obra);
             }
-
-            resultsContainer.appendChild(groupDiv);
         });
+
+        groupDiv.appendChild(title);
+
+        if (type === 'trecho') {
+            const trechosLimitados = group.trechos.slice(0, 5);
+            trechosLimitados.forEach(texto => {
+                const trechoP = document.createElement('p');
+                trechoP.innerText = `"${texto}"`;
+                groupDiv.appendChild(trechoP);
+            });
+        }
+
+        resultsContainer.appendChild(groupDiv);
     }
 
     function displayMetadata(data) {
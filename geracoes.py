@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import threading
+
+from armazenamento_vetores import nova_versao_build
+
+PASTA_GERACOES = os.environ.get('SCRIPTURA_PASTA_INDICES', 'indices')
+GERACOES_MANTIDAS = int(os.environ.get('SCRIPTURA_GERACOES_MANTIDAS', 3))
+INTERVALO_VIGIA = float(os.environ.get('SCRIPTURA_RECARGA_AUTOMATICA_S', 10))
+
+# Cada build grava uma geração completa em `indices/<versão>/` e só no fim troca
+# o ponteiro `indices/ATUAL` (escrita atômica). Um leitor sempre vê uma geração
+# inteira: a anterior ou a nova, nunca arquivos pela metade.
+
+
+def caminho_ponteiro(pasta=PASTA_GERACOES):
+    return os.path.join(pasta, 'ATUAL')
+
+
+def geracao_atual(pasta=PASTA_GERACOES):
+    try:
+        with open(caminho_ponteiro(pasta), 'r', encoding='utf-8') as f:
+            nome = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return nome or None
+
+
+def diretorio_atual(pasta=PASTA_GERACOES):
+    # Sem ponteiro, vale o layout antigo: arquivos soltos na raiz do projeto.
+    nome = geracao_atual(pasta)
+    return os.path.join(pasta, nome) if nome else '.'
+
+
+def criar_geracao(pasta=PASTA_GERACOES):
+    nome = nova_versao_build()
+    caminho = os.path.join(pasta, nome)
+    os.makedirs(caminho)
+    return nome, caminho
+
+
+def herdar_arquivos(origem, destino, nomes_alvos):
+    # Copia da geração atual os arquivos dos alvos que este build não refez
+    # (por exemplo, o tema quando só o processar_textos.py rodou).
+    herdados = 0
+    for nome_arquivo in os.listdir(origem):
+        caminho = os.path.join(origem, nome_arquivo)
+        if not os.path.isfile(caminho) or not any(f'_{alvo}' in nome_arquivo for alvo in nomes_alvos):
+            continue
+        if nome_arquivo.endswith('.pkl') or nome_arquivo.endswith('.tmp'):
+            continue
+        # Bancos SQLite (fts_TEMA.db) são alterados no lugar pela ingestão: um
+        # hard link faria a geração antiga mudar junto.
+        if nome_arquivo.endswith('.db'):
+            shutil.copy2(caminho, os.path.join(destino, nome_arquivo))
+            herdados += 1
+            continue
+        try:
+            os.link(caminho, os.path.join(destino, nome_arquivo))
+        except OSError:
+            shutil.copy2(caminho, os.path.join(destino, nome_arquivo))
+        herdados += 1
+    return herdados
+
+
+def publicar_geracao(nome, pasta=PASTA_GERACOES, manter=GERACOES_MANTIDAS):
+    ponteiro = caminho_ponteiro(pasta)
+    with open(ponteiro + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(nome)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(ponteiro + '.tmp', ponteiro)
+    return limpar_geracoes_antigas(pasta, manter)
+
+
+def limpar_geracoes_antigas(pasta=PASTA_GERACOES, manter=GERACOES_MANTIDAS):
+    atual = geracao_atual(pasta)
+    geracoes = sorted(
+        nome for nome in os.listdir(pasta)
+        if os.path.isdir(os.path.join(pasta, nome)) and nome != atual
+    )
+    removidas = 0
+    for nome in geracoes[: max(len(geracoes) - max(manter - 1, 1), 0)]:
+        # No Windows uma geração ainda mapeada por um servidor não pode ser
+        # apagada; ela fica para a próxima limpeza.
+        shutil.rmtree(os.path.join(pasta, nome), ignore_errors=True)
+        removidas += 1
+    return removidas
+
+
+class VigiaGeracoes:
+    def __init__(self, ao_mudar, pasta=PASTA_GERACOES, intervalo=INTERVALO_VIGIA):
+        self.ao_mudar = ao_mudar
+        self.pasta = pasta
+        self.intervalo = intervalo
+        self.vista = geracao_atual(pasta)
+        self._parar = threading.Event()
+
+    def iniciar(self):
+        if self.intervalo > 0:
+            threading.Thread(target=self._executar, name='scriptura-vigia-geracoes', daemon=True).start()
+
+    def parar(self):
+        self._parar.set()
+
+    def _executar(self):
+        while not self._parar.wait(self.intervalo):
+            nome = geracao_atual(self.pasta)
+            if nome is None or nome == self.vista:
+                continue
+            self.vista = nome
+            try:
+                self.ao_mudar(nome)
+            except Exception as e:
+                print(f"ERRO: Falha ao carregar a geração de índices '{nome}': {e}")
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import numpy as np
+
+from armazenamento_vetores import normalizar_linhas, similaridade_cosseno, similaridade_cosseno_lote
+
+N_PROBE_PADRAO = 8
+MAX_LISTAS = 4096
+AMOSTRAS_POR_LISTA = 64
+ITERACOES_KMEANS = 10
+TAMANHO_BLOCO = 65536
+
+
+def _atribuir_listas(embeddings, centroides):
+    atribuicao = np.empty(len(embeddings), dtype=np.int32)
+    for inicio in range(0, len(embeddings), TAMANHO_BLOCO):
+        bloco = normalizar_linhas(embeddings[inicio : inicio + TAMANHO_BLOCO])
+        atribuicao[inicio : inicio + len(bloco)] = np.argmax(bloco @ centroides.T, axis=1)
+    return atribuicao
+
+
+def treinar_centroides(embeddings, n_listas, n_iteracoes=ITERACOES_KMEANS, semente=42):
+    rng = np.random.default_rng(semente)
+    n_amostra = min(len(embeddings), n_listas * AMOSTRAS_POR_LISTA)
+    amostra_ids = np.sort(rng.choice(len(embeddings), size=n_amostra, replace=False))
+    amostra = normalizar_linhas(embeddings[amostra_ids])
+
+    centroides = amostra[rng.choice(n_amostra, size=n_listas, replace=False)].copy()
+    for _ in range(n_iteracoes):
+        atribuicao = np.argmax(amostra @ centroides.T, axis=1)
+        somas = np.zeros_like(centroides)
+        np.add.at(somas, atribuicao, amostra)
+        contagens = np.bincount(atribuicao, minlength=n_listas)
+
+        vazias = np.flatnonzero(contagens == 0)
+        if len(vazias):
+            somas[vazias] = amostra[rng.choice(n_amostra, size=len(vazias), replace=False)]
+        centroides = normalizar_linhas(somas)
+    return centroides
+
+
+class IndiceIVF:
+    # `extras`: listas (ordem, offsets) das linhas ingeridas depois do build,
+    # uma parte por ingestão, com os mesmos centróides.
+    def __init__(self, centroides, ordem, offsets, extras=()):
+        self.centroides = np.asarray(centroides, dtype=np.float32)
+        self.ordem = np.asarray(ordem, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.extras = list(extras)
+
+    @property
+    def n_listas(self):
+        return len(self.centroides)
+
+    def linhas_candidatas(self, vetor, n_probe, scores_listas=None):
+        if scores_listas is None:
+            scores_listas = self.centroides @ vetor
+        n_probe = min(n_probe, self.n_listas)
+        listas = np.argpartition(-scores_listas, n_probe - 1)[:n_probe]
+        partes = [(self.ordem, self.offsets)] + self.extras
+        return np.concatenate([ordem[offsets[l] : offsets[l + 1]] for l in listas for ordem, offsets in partes])
+
+    def buscar(self, embeddings, vetor, k, n_probe=N_PROBE_PADRAO):
+        return self.buscar_lote(embeddings, np.atleast_2d(vetor), k, n_probe)[0]
+
+    def buscar_lote(self, embeddings, vetores, k, n_probe=N_PROBE_PADRAO, quantizador=None, fator_refino=10):
+        vetores = normalizar_linhas(vetores)
+        if n_probe <= 0 or n_probe >= self.n_listas:
+            return busca_exata_lote(embeddings, vetores, k)
+
+        scores_listas = vetores @ self.centroides.T
+        resultados = []
+        for vetor, scores_vetor in zip(vetores, scores_listas):
+            linhas = np.sort(self.linhas_candidatas(vetor, n_probe, scores_vetor))
+            if len(linhas) < k:
+                resultados.append(busca_exata(embeddings, vetor, k))
+                continue
+            if quantizador is not None:
+                # As listas são varridas nos códigos compactos; só as melhores
+                # candidatas têm o score exato lido do .vec.
+                aproximados = quantizador.pontuar_linhas(linhas, vetor)
+                linhas = np.sort(linhas[_top_k(aproximados, k * fator_refino)])
+            scores = np.asarray(embeddings[linhas], dtype=np.float32) @ vetor
+            top = _top_k(scores, k)
+            resultados.append((linhas[top], scores[top]))
+        return resultados
+
+    def com_linhas(self, novas_linhas, primeira_linha):
+        # As linhas novas entram na lista do centróide mais próximo, em uma
+        # parte só delas: as listas existentes não são copiadas. Os centróides
+        # não são re-treinados (isso fica para o próximo build).
+        listas = _atribuir_listas(novas_linhas, self.centroides)
+        ordem = np.argsort(listas, kind='stable') + primeira_linha
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(listas, minlength=self.n_listas))])
+        return IndiceIVF(self.centroides, self.ordem, self.offsets, self.extras + [(ordem, offsets)])
+
+    def salvar(self, caminho):
+        with open(caminho + '.tmp', 'wb') as f:
+            np.savez(f, centroides=self.centroides, ordem=self.ordem, offsets=self.offsets)
+        os.replace(caminho + '.tmp', caminho)
+
+    @classmethod
+    def carregar(cls, caminho):
+        with np.load(caminho) as dados:
+            return cls(dados['centroides'], dados['ordem'], dados['offsets'])
+
+
+def _top_k(scores, k):
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+def busca_exata(embeddings, vetor, k):
+    scores = similaridade_cosseno(embeddings, vetor)
+    top = _top_k(scores, k)
+    return top, scores[top]
+
+
+def busca_exata_lote(embeddings, vetores, k):
+    resultados = []
+    for scores in similaridade_cosseno_lote(embeddings, vetores):
+        top = _top_k(scores, k)
+        resultados.append((top, scores[top]))
+    return resultados
+
+
+def construir_indice_ivf(embeddings, n_listas=None):
+    n_linhas = len(embeddings)
+    if n_listas is None:
+        n_listas = int(np.sqrt(n_linhas))
+    n_listas = max(1, min(n_listas, MAX_LISTAS, n_linhas))
+
+    print(f"  Treinando {n_listas} listas invertidas (IVF) sobre {n_linhas} vetores...")
+    centroides = treinar_centroides(embeddings, n_listas)
+    atribuicao = _atribuir_listas(embeddings, centroides)
+
+    ordem = np.argsort(atribuicao, kind='stable')
+    contagens = np.bincount(atribuicao, minlength=n_listas)
+    offsets = np.concatenate([[0], np.cumsum(contagens)])
+    return IndiceIVF(centroides, ordem, offsets)
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+from collections import Counter
+
+import numpy as np
+
+from armazenamento_vetores import carregar_arrays_npy, salvar_arrays_npy
+
+# Mesmos parâmetros padrão do rank_bm25.BM25Okapi, para manter os scores idênticos.
+K1 = 1.5
+B = 0.75
+EPSILON = 0.25
+
+
+def tokenizar_bm25(texto):
+    return texto.lower().split(" ")
+
+
+def _calcular_pesos(indptr, docs, tf, doc_len, k1, b, epsilon):
+    n_docs = len(doc_len)
+    df = np.diff(indptr)
+    idf = np.log(n_docs - df + 0.5) - np.log(df + 0.5)
+    media_idf = idf.mean() if len(idf) else 0.0
+    idf[idf < 0] = epsilon * media_idf
+
+    media_doc_len = doc_len.mean() if n_docs else 1.0
+    idf_postings = np.repeat(idf, df)
+    tf = tf.astype(np.float64)
+    normalizacao = k1 * (1 - b + b * doc_len[docs] / media_doc_len)
+    return (idf_postings * tf * (k1 + 1) / (tf + normalizacao)).astype(np.float32)
+
+
+class IndiceBM25:
+    tipo = 'memoria'
+
+    def __init__(self, vocabulario, indptr, docs, tf, doc_len, pesos=None, k1=K1, b=B, epsilon=EPSILON):
+        self.vocabulario = vocabulario
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.docs = np.asarray(docs, dtype=np.int32)
+        self.tf = np.asarray(tf, dtype=np.int32)
+        self.doc_len = np.asarray(doc_len, dtype=np.int32)
+        self.k1, self.b, self.epsilon = k1, b, epsilon
+        if pesos is None:
+            pesos = _calcular_pesos(self.indptr, self.docs, self.tf, self.doc_len, k1, b, epsilon)
+        self.pesos = pesos
+
+    @property
+    def n_docs(self):
+        return len(self.doc_len)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.indptr, self.docs, self.tf, self.doc_len, self.pesos))
+
+    def pontuar(self, tokens):
+        return self.pontuar_lote([tokens])[0]
+
+    def pontuar_lote(self, consultas):
+        # Uma linha de scores por consulta, na mesma matriz. Cada linha soma as
+        # postings na mesma ordem que uma consulta avulsa, então os scores são
+        # idênticos aos de `pontuar`.
+        scores = np.zeros((len(consultas), self.n_docs), dtype=np.float64)
+        for linha, tokens in zip(scores, consultas):
+            for token, repeticoes in Counter(tokens).items():
+                termo = self.vocabulario.get(token)
+                if termo is None:
+                    continue
+                inicio, fim = self.indptr[termo], self.indptr[termo + 1]
+                linha[self.docs[inicio:fim]] += repeticoes * self.pesos[inicio:fim]
+        return scores
+
+    def com_documentos(self, textos):
+        # Acrescenta documentos ao final. O IDF e o comprimento médio mudam para
+        # o corpus todo, então os pesos são recalculados a partir de tf/doc_len.
+        vocabulario = dict(self.vocabulario)
+        termos_novos, docs_novos, tf_novos, doc_len_novos = _postings(textos, vocabulario, self.n_docs)
+        termos = np.concatenate([np.repeat(np.arange(len(self.vocabulario)), np.diff(self.indptr)), termos_novos])
+        docs = np.concatenate([self.docs, docs_novos])
+        ordem = np.lexsort((docs, termos))
+        return IndiceBM25(
+            vocabulario, _indptr(termos, len(vocabulario)), docs[ordem],
+            np.concatenate([self.tf, tf_novos])[ordem], np.concatenate([self.doc_len, doc_len_novos]),
+            k1=self.k1, b=self.b, epsilon=self.epsilon,
+        )
+
+    def salvar(self, prefixo):
+        salvar_arrays_npy(prefixo, {
+            'indptr': self.indptr,
+            'docs': self.docs,
+            'tf': self.tf,
+            'doc_len': self.doc_len,
+            'pesos': self.pesos,
+        })
+        caminho = f'{prefixo}_vocab.json'
+        with open(caminho + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({
+                'k1': self.k1, 'b': self.b, 'epsilon': self.epsilon,
+                'vocabulario': self.vocabulario,
+            }, f, ensure_ascii=False)
+        os.replace(caminho + '.tmp', caminho)
+
+    @classmethod
+    def carregar(cls, prefixo):
+        with open(f'{prefixo}_vocab.json', 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        arrays = carregar_arrays_npy(prefixo, ['indptr', 'docs', 'tf', 'doc_len', 'pesos'])
+        return cls(
+            meta['vocabulario'], arrays['indptr'], arrays['docs'], arrays['tf'], arrays['doc_len'],
+            pesos=arrays['pesos'], k1=meta['k1'], b=meta['b'], epsilon=meta['epsilon'],
+        )
+
+
+def _postings(textos, vocabulario, primeiro_doc=0):
+    # Devolve (termos, docs, tf, doc_len) em ordem termo-major, acrescentando
+    # os termos novos a `vocabulario`.
+    ids_termos = []
+    doc_len = np.empty(len(textos), dtype=np.int32)
+    for d, texto in enumerate(textos):
+        tokens = tokenizar_bm25(texto)
+        doc_len[d] = len(tokens)
+        ids_termos.extend(vocabulario.setdefault(token, len(vocabulario)) for token in tokens)
+
+    n_docs = max(len(textos), 1)
+    termos = np.array(ids_termos, dtype=np.int64)
+    docs = np.repeat(np.arange(len(textos), dtype=np.int64), doc_len)
+    chaves, tf = np.unique(termos * n_docs + docs, return_counts=True)
+    return chaves // n_docs, chaves % n_docs + primeiro_doc, tf, doc_len
+
+
+def _indptr(termos, n_termos):
+    return np.concatenate([[0], np.cumsum(np.bincount(termos, minlength=n_termos))])
+
+
+def construir_indice_bm25(textos, k1=K1, b=B, epsilon=EPSILON):
+    vocabulario = {}
+    termos, docs, tf, doc_len = _postings(textos, vocabulario)
+    return IndiceBM25(vocabulario, _indptr(termos, len(vocabulario)), docs, tf, doc_len, k1=k1, b=b, epsilon=epsilon)
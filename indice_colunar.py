@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from armazenamento_vetores import carregar_arrays_npy, salvar_arrays_npy
+
+
+class IndiceColunar:
+    def __init__(self, ids_livro, offsets, blob):
+        self.ids_livro = np.asarray(ids_livro, dtype=np.int32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.ids_livro)
+
+    def __getitem__(self, i):
+        return {'id_livro': self.id_livro(i), 'texto': self.texto(i)}
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def id_livro(self, i):
+        return int(self.ids_livro[i])
+
+    def livros(self):
+        # Calculado uma vez: a base não muda depois de carregada.
+        if not hasattr(self, '_livros'):
+            self._livros = frozenset(int(i) for i in np.unique(self.ids_livro))
+        return self._livros
+
+    def texto(self, i):
+        return bytes(self.blob[self.offsets[i] : self.offsets[i + 1]]).decode('utf-8')
+
+    def textos(self, indices=None):
+        if indices is None:
+            indices = range(len(self))
+        return [self.texto(i) for i in indices]
+
+    def salvar(self, prefixo):
+        salvar_arrays_npy(prefixo, {
+            'ids': self.ids_livro,
+            'offsets': self.offsets,
+            'textos': np.frombuffer(bytes(self.blob), dtype=np.uint8),
+        })
+
+    @classmethod
+    def carregar(cls, prefixo):
+        arrays = carregar_arrays_npy(prefixo, ['ids', 'offsets', 'textos'])
+        return cls(arrays['ids'], arrays['offsets'], arrays['textos'])
+
+    @classmethod
+    def vazio(cls):
+        return cls(np.empty(0, dtype=np.int32), np.zeros(1, dtype=np.int64), b'')
+
+    @classmethod
+    def de_registros(cls, registros):
+        construtor = ConstrutorIndiceColunar()
+        for item in registros:
+            construtor.adicionar(item['id_livro'], item['texto'])
+        return construtor.construir()
+
+    @classmethod
+    def concatenar(cls, indices):
+        indices = [indice for indice in indices if len(indice)]
+        if not indices:
+            return cls.vazio()
+        ids = np.concatenate([indice.ids_livro for indice in indices])
+        deslocamentos = np.cumsum([0] + [int(indice.offsets[-1]) for indice in indices[:-1]])
+        offsets = np.concatenate(
+            [[0]] + [indice.offsets[1:] + desloc for indice, desloc in zip(indices, deslocamentos)]
+        )
+        blob = b''.join(bytes(indice.blob[: indice.offsets[-1]]) for indice in indices)
+        return cls(ids, offsets, blob)
+
+
+class IndiceColunarEmPartes:
+    # Mesma interface de leitura do IndiceColunar sobre vários índices em
+    # sequência (a base mapeada em memória + livros ingeridos depois), sem
+    # copiar a base: nem o blob de textos nem os ids.
+    def __init__(self, partes):
+        self.partes = []
+        for parte in partes:
+            if isinstance(parte, IndiceColunarEmPartes):
+                self.partes.extend(parte.partes)
+            elif len(parte):
+                self.partes.append(parte)
+        self.inicios = np.cumsum([0] + [len(parte) for parte in self.partes])
+
+    @property
+    def ids_livro(self):
+        # Cópia de todos os ids (O(corpus)): as buscas usam `id_livro` e `livros`.
+        if not self.partes:
+            return np.empty(0, dtype=np.int32)
+        return np.concatenate([parte.ids_livro for parte in self.partes])
+
+    def __len__(self):
+        return int(self.inicios[-1])
+
+    def __getitem__(self, i):
+        return {'id_livro': self.id_livro(i), 'texto': self.texto(i)}
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def _localizar(self, i):
+        p = int(np.searchsorted(self.inicios, i, side='right')) - 1
+        return self.partes[p], i - int(self.inicios[p])
+
+    def id_livro(self, i):
+        parte, j = self._localizar(i)
+        return parte.id_livro(j)
+
+    def livros(self):
+        return frozenset().union(*(parte.livros() for parte in self.partes))
+
+    def texto(self, i):
+        parte, j = self._localizar(i)
+        return parte.texto(j)
+
+    def textos(self, indices=None):
+        if indices is None:
+            return [texto for parte in self.partes for texto in parte.textos()]
+        return [self.texto(i) for i in indices]
+
+
+def juntar_indices(indice, novas_linhas):
+    return IndiceColunarEmPartes([indice, novas_linhas])
+
+
+class ConstrutorIndiceColunar:
+    def __init__(self):
+        self._ids = []
+        self._offsets = [0]
+        self._partes = []
+
+    def __len__(self):
+        return len(self._ids)
+
+    def adicionar(self, id_livro, texto):
+        dados = texto.encode('utf-8')
+        self._ids.append(id_livro)
+        self._partes.append(dados)
+        self._offsets.append(self._offsets[-1] + len(dados))
+
+    def construir(self):
+        return IndiceColunar(
+            np.array(self._ids, dtype=np.int32),
+            np.array(self._offsets, dtype=np.int64),
+            b''.join(self._partes),
+        )
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import sqlite3
+import threading
+
+import numpy as np
+
+# 'memoria' (padrão): IndiceBM25 em RAM. 'fts5': tabela FTS5 do SQLite em
+# `fts_TEMA.db`, dentro da geração; a API só guarda a conexão.
+BACKEND_BM25 = os.environ.get('SCRIPTURA_BM25', 'memoria')
+CANDIDATOS_FTS = int(os.environ.get('SCRIPTURA_FTS_CANDIDATOS', 2000))
+
+ARQUIVO_FTS = 'fts_TEMA.db'
+# Abaixo disso, pontuar a tabela inteira é barato e o corte por frequência
+# não vale o risco de deixar a busca sem termos.
+MIN_DOCS_CORTE_FTS = 1000
+TABELA = 'chunks_tema'
+
+# Os acentos contam, como no tokenizar_bm25; a pontuação separa as palavras.
+SQL_CRIAR = f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA} USING fts5(texto, tokenize='unicode61 remove_diacritics 0')"
+
+RE_TERMO = re.compile(r'\w+')
+
+# O rowid de cada linha é a posição do chunk em `index_TEMA`. A ingestão
+# acrescenta linhas no fim e cada retrato só enxerga `rowid < n_docs`, então
+# as buscas em andamento não veem os livros que entraram depois delas.
+
+
+def fts5_disponivel():
+    try:
+        sqlite3.connect(':memory:').execute("CREATE VIRTUAL TABLE t USING fts5(texto)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def _inserir(conn, textos, primeiro_doc=0):
+    conn.executemany(
+        f"INSERT INTO {TABELA} (rowid, texto) VALUES (?, ?)",
+        ((primeiro_doc + i, texto) for i, texto in enumerate(textos)),
+    )
+
+
+def construir_indice_fts(caminho, textos):
+    if os.path.exists(caminho + '.tmp'):
+        os.remove(caminho + '.tmp')
+    conn = sqlite3.connect(caminho + '.tmp')
+    try:
+        conn.execute(SQL_CRIAR)
+        _inserir(conn, textos)
+        conn.execute(f"INSERT INTO {TABELA} ({TABELA}) VALUES ('optimize')")
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(caminho + '.tmp', caminho)
+    return IndiceFTS(caminho, len(textos))
+
+
+class IndiceFTS:
+    tipo = 'fts5'
+
+    def __init__(self, caminho, n_docs, candidatos=CANDIDATOS_FTS):
+        self.caminho = caminho
+        self.n_docs = n_docs
+        self.candidatos = candidatos
+        self._local = threading.local()
+
+    @classmethod
+    def carregar(cls, caminho, n_docs):
+        indice = cls(caminho, n_docs)
+        linhas = indice._conexao().execute(f"SELECT count(*) FROM {TABELA} WHERE rowid < ?", (n_docs,)).fetchone()[0]
+        if linhas != n_docs:
+            raise ValueError(f"'{caminho}' tem {linhas} chunks, mas 'index_TEMA' tem {n_docs}")
+        return indice
+
+    def _conexao(self):
+        # Uma conexão por thread (as buscas correm no executor), cada uma com
+        # a tabela `fts5vocab` (só da conexão) que dá o número de chunks de
+        # cada termo.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.caminho, timeout=30, check_same_thread=False)
+            conn.execute(f"CREATE VIRTUAL TABLE temp.vocabulario USING fts5vocab(main, {TABELA}, row)")
+        return conn
+
+    @property
+    def nbytes_disco(self):
+        return os.path.getsize(self.caminho)
+
+    def expressao(self, tokens):
+        # OR dos termos da busca, cada um entre aspas (nada da busca é lido
+        # como operador do FTS5). Termos presentes em metade dos chunks ou mais
+        # ficam de fora: o bm25() do FTS5 dá a eles IDF ~0, e eles obrigariam o
+        # SQLite a pontuar quase a tabela inteira. Se o corte tirasse todos os
+        # termos, a busca usa todos.
+        termos = list(dict.fromkeys(termo for token in tokens for termo in RE_TERMO.findall(token)))
+        if not termos:
+            return ''
+        frequencias = dict(self._conexao().execute(
+            f"SELECT term, doc FROM temp.vocabulario WHERE term IN ({','.join('?' * len(termos))})", termos,
+        ).fetchall())
+        presentes = [termo for termo in termos if frequencias.get(termo, 0) > 0]
+        if self.n_docs >= MIN_DOCS_CORTE_FTS:
+            raros = [termo for termo in presentes if frequencias[termo] * 2 < self.n_docs]
+            presentes = raros or presentes
+        return ' OR '.join(f'"{termo}"' for termo in presentes)
+
+    def pontuar(self, tokens):
+        # Mesmo formato do IndiceBM25: um score por chunk. Só os `candidatos`
+        # melhores saem do SQLite; os demais ficam com 0, como os chunks sem
+        # nenhum termo da busca no BM25 em memória.
+        scores = np.zeros(self.n_docs, dtype=np.float64)
+        expressao = self.expressao(tokens)
+        if not expressao:
+            return scores
+        linhas = self._conexao().execute(
+            f"SELECT rowid, bm25({TABELA}) FROM {TABELA} WHERE {TABELA} MATCH ? AND rowid < ? ORDER BY rank LIMIT ?",
+            (expressao, self.n_docs, self.candidatos),
+        ).fetchall()
+        if linhas:
+            rowids, bm25 = np.array(linhas, dtype=np.float64).T
+            # O bm25() do FTS5 é negativo (quanto menor, melhor).
+            scores[rowids.astype(np.int64)] = -bm25
+        return scores
+
+    def pontuar_lote(self, consultas):
+        return np.stack([self.pontuar(tokens) for tokens in consultas]) if consultas else np.zeros((0, self.n_docs))
+
+    def com_documentos(self, textos):
+        # Linhas acima de n_docs sobraram de uma ingestão que não chegou à
+        # geração carregada (o livro volta para a fila); são substituídas.
+        conn = self._conexao()
+        with conn:
+            conn.execute(f"DELETE FROM {TABELA} WHERE rowid >= ?", (self.n_docs,))
+            _inserir(conn, textos, self.n_docs)
+        return IndiceFTS(self.caminho, self.n_docs + len(textos), self.candidatos)
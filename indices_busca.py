@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import joblib
+import numpy as np
+
+from armazenamento_vetores import carregar_matriz_vetores, juntar_matrizes, normalizar_linhas, similaridade_cosseno_lote
+from busca import GruposPorLivro
+from indice_ann import IndiceIVF, busca_exata_lote
+from indice_bm25 import IndiceBM25, construir_indice_bm25
+from indice_colunar import IndiceColunar, juntar_indices
+from indice_fts import ARQUIVO_FTS, BACKEND_BM25, IndiceFTS, construir_indice_fts, fts5_disponivel
+from quantizacao import FATOR_REFINO, buscar_lote_refinando, carregar_quantizador, com_linhas, pontuar_lote_refinando
+from shards import SHARDS, iniciar_shards
+
+
+def carregar_embeddings(diretorio, sufixo, nome_modelo, versoes):
+    caminho_vec = os.path.join(diretorio, f'embeddings_{sufixo}.vec')
+    if os.path.exists(caminho_vec):
+        matriz, cabecalho = carregar_matriz_vetores(caminho_vec)
+        versoes[sufixo] = cabecalho['versao_build']
+        if cabecalho['modelo'] != nome_modelo:
+            print(f"AVISO: '{caminho_vec}' foi gerado com '{cabecalho['modelo']}', mas a API usa '{nome_modelo}'.")
+        print(f"  '{caminho_vec}' mapeado em memória ({cabecalho['linhas']}x{cabecalho['dimensao']} {cabecalho['dtype']}, build {cabecalho['versao_build']}).")
+        return matriz
+    caminho_pkl = os.path.join(diretorio, f'embeddings_{sufixo}.pkl')
+    print(f"  AVISO: '{caminho_vec}' não encontrado. Usando '{caminho_pkl}' (formato antigo).")
+    versoes[sufixo] = f"pkl-{os.path.getmtime(caminho_pkl):.0f}"
+    return normalizar_linhas(joblib.load(caminho_pkl))
+
+
+def carregar_indice(diretorio, sufixo):
+    prefixo = os.path.join(diretorio, f'index_{sufixo}')
+    if os.path.exists(f'{prefixo}_ids.npy'):
+        return IndiceColunar.carregar(prefixo)
+    print(f"  AVISO: '{prefixo}_*.npy' não encontrado. Usando '{prefixo}.pkl' (formato antigo).")
+    return IndiceColunar.de_registros(joblib.load(f'{prefixo}.pkl'))
+
+
+def carregar_quantizacao(diretorio, sufixo, linhas):
+    prefixo = os.path.join(diretorio, f'quant_{sufixo}')
+    if FATOR_REFINO <= 0 or not os.path.exists(prefixo + '.npz'):
+        return None
+    try:
+        quantizador = carregar_quantizador(prefixo)
+    except Exception as e:
+        print(f"AVISO: Falha ao carregar '{prefixo}' ({e}). Usando os vetores completos.")
+        return None
+    if len(quantizador.codigos) != linhas:
+        print(f"AVISO: '{prefixo}' desatualizado em relação aos embeddings. Usando os vetores completos.")
+        return None
+    print(f"  Códigos {quantizador.tipo} de {sufixo} carregados ({quantizador.codigos.nbytes / 1e6:.1f} MB em RAM; "
+          f"refino exato de {FATOR_REFINO}x candidatas lido do .vec).")
+    return quantizador
+
+
+def carregar_fts(diretorio, index_TEMA):
+    caminho = os.path.join(diretorio, ARQUIVO_FTS)
+    if not fts5_disponivel():
+        print("AVISO: O SQLite deste Python não tem FTS5. Usando o índice BM25 em memória.")
+        return None
+    try:
+        if os.path.exists(caminho):
+            bm25_TEMA = IndiceFTS.carregar(caminho, len(index_TEMA))
+        else:
+            print(f"AVISO: '{caminho}' não encontrado. Construindo índice FTS5 a partir de 'index_TEMA'...")
+            bm25_TEMA = construir_indice_fts(caminho, index_TEMA.textos())
+    except Exception as e:
+        print(f"AVISO: Falha ao carregar '{caminho}' ({e}). Usando o índice BM25 em memória.")
+        return None
+    print(f"Índice FTS5 (Keywords) de Temas pronto. ({bm25_TEMA.nbytes_disco / 1e6:.1f} MB em disco; "
+          f"{bm25_TEMA.candidatos} candidatas por busca)")
+    return bm25_TEMA
+
+
+class IndicesBusca:
+    # Retrato imutável de tudo o que as buscas leem. Quem muda os índices monta
+    # um objeto novo e troca a referência de uma vez; as buscas em andamento
+    # terminam no retrato que pegaram no início.
+    def __init__(self, embeddings_TRECHO, index_TRECHO, ivf_TRECHO, embeddings_TEMA, index_TEMA, bm25_TEMA, versoes,
+                 quant_TRECHO=None, quant_TEMA=None, shards_TRECHO=None, shards_TEMA=None, grupos_TEMA=None):
+        self.embeddings_TRECHO = embeddings_TRECHO
+        self.index_TRECHO = index_TRECHO
+        self.ivf_TRECHO = ivf_TRECHO
+        self.embeddings_TEMA = embeddings_TEMA
+        self.index_TEMA = index_TEMA
+        self.bm25_TEMA = bm25_TEMA
+        self.versoes = versoes
+        self.quant_TRECHO = quant_TRECHO
+        self.quant_TEMA = quant_TEMA
+        self.shards_TRECHO = shards_TRECHO
+        self.shards_TEMA = shards_TEMA
+        if grupos_TEMA is None and index_TEMA is not None:
+            grupos_TEMA = GruposPorLivro(index_TEMA.ids_livro)
+        self.grupos_TEMA = grupos_TEMA
+
+    @property
+    def trecho_pronto(self):
+        return self.embeddings_TRECHO is not None
+
+    @property
+    def tema_pronto(self):
+        return self.embeddings_TEMA is not None and self.bm25_TEMA is not None
+
+    def buscar_trechos_lote(self, vetores, k, n_probe):
+        if self.shards_TRECHO is not None:
+            resultados = self.shards_TRECHO.buscar_trechos_lote(self.embeddings_TRECHO, vetores, k, n_probe)
+            if resultados is not None:
+                return resultados
+        if self.ivf_TRECHO is not None and (self.quant_TRECHO is None or 0 < n_probe < self.ivf_TRECHO.n_listas):
+            return self.ivf_TRECHO.buscar_lote(self.embeddings_TRECHO, vetores, k, n_probe, self.quant_TRECHO, FATOR_REFINO)
+        if self.quant_TRECHO is not None:
+            return buscar_lote_refinando(self.quant_TRECHO, self.embeddings_TRECHO, vetores, k)
+        return busca_exata_lote(self.embeddings_TRECHO, vetores, k)
+
+    def pontuar_temas_lote(self, vetores):
+        if self.shards_TEMA is not None:
+            scores = self.shards_TEMA.pontuar_temas_lote(self.embeddings_TEMA, vetores)
+            if scores is not None:
+                return scores
+        if self.quant_TEMA is not None:
+            return list(pontuar_lote_refinando(self.quant_TEMA, self.embeddings_TEMA, vetores))
+        return list(similaridade_cosseno_lote(self.embeddings_TEMA, vetores))
+
+    @property
+    def shards(self):
+        return {
+            sufixo: len(grupo)
+            for sufixo, grupo in (('TRECHO', self.shards_TRECHO), ('TEMA', self.shards_TEMA))
+            if grupo is not None and grupo.ativo
+        }
+
+    @property
+    def quantizacao(self):
+        return {
+            sufixo: quantizador.tipo
+            for sufixo, quantizador in (('TRECHO', self.quant_TRECHO), ('TEMA', self.quant_TEMA))
+            if quantizador is not None
+        }
+
+    def livros_indexados(self):
+        livros = set()
+        for indice in (self.index_TRECHO, self.index_TEMA):
+            if indice is not None:
+                livros.update(indice.livros())
+        return livros
+
+    def com_livro(self, livro_id, trechos, embeddings_trechos, temas, embeddings_temas):
+        embeddings_TRECHO, index_TRECHO, ivf_TRECHO = self.embeddings_TRECHO, self.index_TRECHO, self.ivf_TRECHO
+        quant_TRECHO, quant_TEMA = self.quant_TRECHO, self.quant_TEMA
+        if len(trechos):
+            novas_linhas = normalizar_linhas(embeddings_trechos)
+            if ivf_TRECHO is not None:
+                ivf_TRECHO = ivf_TRECHO.com_linhas(novas_linhas, len(index_TRECHO))
+            if quant_TRECHO is not None:
+                quant_TRECHO = com_linhas(quant_TRECHO, novas_linhas)
+            embeddings_TRECHO = juntar_matrizes(embeddings_TRECHO, novas_linhas)
+            index_TRECHO = juntar_indices(index_TRECHO, trechos)
+
+        embeddings_TEMA, index_TEMA, bm25_TEMA = self.embeddings_TEMA, self.index_TEMA, self.bm25_TEMA
+        grupos_TEMA = self.grupos_TEMA
+        if len(temas):
+            grupos_TEMA = grupos_TEMA.com_linhas(temas.ids_livro, len(index_TEMA))
+            novas_linhas = normalizar_linhas(embeddings_temas)
+            if quant_TEMA is not None:
+                quant_TEMA = com_linhas(quant_TEMA, novas_linhas)
+            embeddings_TEMA = juntar_matrizes(embeddings_TEMA, novas_linhas)
+            index_TEMA = juntar_indices(index_TEMA, temas)
+            bm25_TEMA = bm25_TEMA.com_documentos(temas.textos())
+
+        # A versão muda junto com o conteúdo, então o cache de respostas não
+        # devolve resultados calculados antes da ingestão.
+        versoes = {sufixo: f'{versao}+{livro_id}' for sufixo, versao in self.versoes.items()}
+        return IndicesBusca(
+            embeddings_TRECHO, index_TRECHO, ivf_TRECHO, embeddings_TEMA, index_TEMA, bm25_TEMA, versoes,
+            quant_TRECHO, quant_TEMA, self.shards_TRECHO, self.shards_TEMA, grupos_TEMA,
+        )
+
+
+def carregar_indices_busca(nome_modelo, diretorio='.'):
+    versoes = {}
+    print(f"Carregando índices de '{os.path.abspath(diretorio)}'...")
+
+    print("Carregando 'Cérebro de Trecho' (index_TRECHO)...")
+    try:
+        embeddings_TRECHO = carregar_embeddings(diretorio, 'TRECHO', nome_modelo, versoes)
+        index_TRECHO = carregar_indice(diretorio, 'TRECHO')
+        print(f"Cérebro de Trecho carregado. ({len(index_TRECHO)} frases)")
+    except FileNotFoundError:
+        print("ERRO FATAL: Cérebro de Trecho (index_TRECHO) não encontrado.")
+        print("           Execute 'processar_textos.py' (v9.1) primeiro.")
+        embeddings_TRECHO = index_TRECHO = None
+    except Exception as e:
+        print(f"ERRO CRÍTICO AO CARREGAR 'index_TRECHO': {e}")
+        embeddings_TRECHO = index_TRECHO = None
+
+    ivf_TRECHO = None
+    if embeddings_TRECHO is not None:
+        try:
+            ivf_TRECHO = IndiceIVF.carregar(os.path.join(diretorio, 'ivf_TRECHO.npz'))
+            if ivf_TRECHO.offsets[-1] != len(embeddings_TRECHO):
+                raise ValueError("índice IVF desatualizado em relação aos embeddings de trecho")
+            print(f"Índice IVF de trecho carregado. ({ivf_TRECHO.n_listas} listas)")
+        except FileNotFoundError:
+            ivf_TRECHO = None
+            print("AVISO: 'ivf_TRECHO.npz' não encontrado. Usando busca exata de trechos.")
+        except Exception as e:
+            ivf_TRECHO = None
+            print(f"AVISO: Falha ao carregar 'ivf_TRECHO.npz' ({e}). Usando busca exata de trechos.")
+
+    quant_TRECHO = carregar_quantizacao(diretorio, 'TRECHO', len(embeddings_TRECHO)) if embeddings_TRECHO is not None else None
+
+    print("Carregando 'Cérebro de Tema' (index_TEMA)...")
+    try:
+        embeddings_TEMA = carregar_embeddings(diretorio, 'TEMA', nome_modelo, versoes)
+        index_TEMA = carregar_indice(diretorio, 'TEMA')
+        print(f"Cérebro de Tema carregado. ({len(index_TEMA)} chunks)")
+    except FileNotFoundError:
+        print("ERRO FATAL: Cérebro de Tema (index_TEMA) não encontrado.")
+        print("           Execute 'processar_temas.py' (v2.1) primeiro.")
+        embeddings_TEMA = index_TEMA = None
+    except Exception as e:
+        print(f"ERRO CRÍTICO AO CARREGAR 'index_TEMA': {e}")
+        embeddings_TEMA = index_TEMA = None
+
+    bm25_TEMA = None
+    if index_TEMA and BACKEND_BM25 == 'fts5':
+        bm25_TEMA = carregar_fts(diretorio, index_TEMA)
+    if index_TEMA and bm25_TEMA is None:
+        if os.path.exists(os.path.join(diretorio, 'bm25_TEMA_vocab.json')):
+            print("Carregando índice BM25 (Keywords) para Temas...")
+            bm25_TEMA = IndiceBM25.carregar(os.path.join(diretorio, 'bm25_TEMA'))
+            if bm25_TEMA.n_docs != len(index_TEMA):
+                print("AVISO: Índice BM25 desatualizado em relação a 'index_TEMA'. Reconstruindo em memória...")
+                bm25_TEMA = construir_indice_bm25(index_TEMA.textos())
+        else:
+            print("AVISO: 'bm25_TEMA' não encontrado. Construindo índice BM25 em memória...")
+            bm25_TEMA = construir_indice_bm25(index_TEMA.textos())
+        print(f"Índice BM25 pronto. ({len(bm25_TEMA.vocabulario)} termos)")
+
+    quant_TEMA = carregar_quantizacao(diretorio, 'TEMA', len(embeddings_TEMA)) if embeddings_TEMA is not None else None
+
+    shards_TRECHO = shards_TEMA = None
+    if SHARDS > 1:
+        print(f"Iniciando {SHARDS} processos de busca (shards) por índice...")
+        if embeddings_TRECHO is not None:
+            shards_TRECHO = iniciar_shards(diretorio, 'TRECHO', index_TRECHO.ids_livro, usar_ivf=ivf_TRECHO is not None)
+        if embeddings_TEMA is not None:
+            shards_TEMA = iniciar_shards(diretorio, 'TEMA', index_TEMA.ids_livro)
+
+    return IndicesBusca(
+        embeddings_TRECHO, index_TRECHO, ivf_TRECHO, embeddings_TEMA, index_TEMA, bm25_TEMA, versoes,
+        quant_TRECHO, quant_TEMA, shards_TRECHO, shards_TEMA,
+    )
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sqlite3
+import threading
+import time
+
+INTERVALO_POLLING = float(os.environ.get('SCRIPTURA_INGESTAO_POLLING', 5))
+
+SQL_TABELA_JOBS = """
+CREATE TABLE IF NOT EXISTS jobs_ingestao (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    livro_id INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'PENDENTE',
+    etapa TEXT,
+    mensagem TEXT,
+    criado_em REAL NOT NULL,
+    atualizado_em REAL NOT NULL
+);
+"""
+
+
+class FilaIngestao:
+    # Fila persistente (tabela `jobs_ingestao`) consumida por uma thread. Jobs
+    # que estavam EXECUTANDO quando o processo caiu voltam para PENDENTE.
+    def __init__(self, db_path, processar, intervalo_polling=INTERVALO_POLLING):
+        self.db_path = db_path
+        self.processar = processar
+        self.intervalo_polling = intervalo_polling
+        self._evento = threading.Event()
+        self._parar = False
+        self._thread = None
+
+    def _conectar(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def iniciar(self, consumir=True):
+        # Com `consumir=False` (workers do modo daemon), só enfileira: quem
+        # executa os jobs é o processo que tem os índices.
+        conn = self._conectar()
+        try:
+            conn.executescript(SQL_TABELA_JOBS)
+            if consumir:
+                conn.execute(
+                    "UPDATE jobs_ingestao SET status = 'PENDENTE', etapa = NULL, atualizado_em = ? WHERE status = 'EXECUTANDO'",
+                    (time.time(),),
+                )
+            conn.commit()
+        finally:
+            conn.close()
+        if not consumir:
+            return
+        self._thread = threading.Thread(target=self._executar, name='scriptura-ingestao', daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar = True
+        self._evento.set()
+
+    def enfileirar(self, livro_id):
+        conn = self._conectar()
+        try:
+            row = conn.execute(
+                "SELECT id FROM jobs_ingestao WHERE livro_id = ? AND status = 'PENDENTE'", (livro_id,)
+            ).fetchone()
+            if row is not None:
+                return row['id']
+            agora = time.time()
+            cursor = conn.execute(
+                "INSERT INTO jobs_ingestao (livro_id, criado_em, atualizado_em) VALUES (?, ?, ?)",
+                (livro_id, agora, agora),
+            )
+            conn.commit()
+            job_id = cursor.lastrowid
+        finally:
+            conn.close()
+        self._evento.set()
+        return job_id
+
+    def listar(self, limite=50):
+        conn = self._conectar()
+        try:
+            rows = conn.execute("SELECT * FROM jobs_ingestao ORDER BY id DESC LIMIT ?", (limite,)).fetchall()
+        finally:
+            conn.close()
+        return [dict(row) for row in rows]
+
+    def _atualizar(self, job_id, **campos):
+        campos['atualizado_em'] = time.time()
+        set_clause = ", ".join(f"{campo} = ?" for campo in campos)
+        conn = self._conectar()
+        try:
+            conn.execute(f"UPDATE jobs_ingestao SET {set_clause} WHERE id = ?", (*campos.values(), job_id))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _proximo(self):
+        conn = self._conectar()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, livro_id FROM jobs_ingestao WHERE status = 'PENDENTE' ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs_ingestao SET status = 'EXECUTANDO', atualizado_em = ? WHERE id = ?",
+                    (time.time(), row['id']),
+                )
+            conn.commit()
+        finally:
+            conn.close()
+        return (row['id'], row['livro_id']) if row is not None else None
+
+    def _executar(self):
+        while not self._parar:
+            try:
+                job = self._proximo()
+            except sqlite3.Error as e:
+                print(f"ERRO (ingestão): Não foi possível ler a fila de jobs: {e}")
+                job = None
+            if job is None:
+                self._evento.wait(self.intervalo_polling)
+                self._evento.clear()
+                continue
+
+            job_id, livro_id = job
+            print(f"[INGESTÃO] Job {job_id}: iniciando livro {livro_id}...")
+            try:
+                mensagem = self.processar(livro_id, lambda etapa: self._atualizar(job_id, etapa=etapa))
+                self._atualizar(job_id, status='CONCLUIDO', etapa=None, mensagem=mensagem)
+                print(f"[INGESTÃO] Job {job_id}: concluído. {mensagem}")
+            except Exception as e:
+                self._atualizar(job_id, status='ERRO', mensagem=str(e))
+                print(f"ERRO (ingestão): Job {job_id} (livro {livro_id}) falhou: {e}")
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import time
+import traceback
+
+INICIALIZACAO_SINCRONA = os.environ.get('SCRIPTURA_INICIALIZACAO_SINCRONA', '0') == '1'
+
+
+class Inicializacao:
+    # Executa as etapas pesadas da subida (modelos, índices, aquecimento) em uma
+    # thread, para que o servidor já aceite conexões e responda /health/live
+    # enquanto carrega. /health/ready só fica verde quando todas terminam.
+    def __init__(self, etapas):
+        self.etapas = etapas
+        self.pronto = threading.Event()
+        self.etapa = None
+        self.erro = None
+        self.duracoes = {}
+        self._inicio = time.perf_counter()
+        self._fim = None
+
+    def iniciar(self, sincrona=INICIALIZACAO_SINCRONA):
+        if sincrona:
+            self._executar()
+        else:
+            threading.Thread(target=self._executar, name='scriptura-inicializacao', daemon=True).start()
+
+    def _executar(self):
+        for nome, funcao in self.etapas:
+            self.etapa = nome
+            inicio = time.perf_counter()
+            try:
+                funcao()
+            except Exception as e:
+                self.erro = f"{nome}: {e}"
+                print(f"ERRO FATAL: A inicialização falhou na etapa '{nome}': {e}")
+                traceback.print_exc()
+                return
+            self.duracoes[nome] = round(time.perf_counter() - inicio, 3)
+        self.etapa = None
+        self._fim = time.perf_counter()
+        self.pronto.set()
+        print(f"API pronta em {self._fim - self._inicio:.1f}s.")
+
+    def estado(self):
+        if self.pronto.is_set():
+            status = 'pronto'
+        elif self.erro is not None:
+            status = 'erro'
+        else:
+            status = 'inicializando'
+        return {
+            'status': status,
+            'etapa': self.etapa,
+            'erro': self.erro,
+            'segundos': round((self._fim or time.perf_counter()) - self._inicio, 3),
+            'etapas': dict(self.duracoes),
+        }
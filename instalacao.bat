@@ -17,7 +17,7 @@ python.exe -m pip install --upgrade pip
 
 echo.
 echo 4. Instalando bibliotecas (requirements.txt)...
-pip install fastapi uvicorn sqlite3 spacy sentence-transformers scikit-learn numpy rank_bm25 pdfplumber python-multipart
+pip install fastapi uvicorn sqlite3 spacy sentence-transformers scikit-learn numpy pdfplumber python-multipart
 
 echo.
 echo 5. Baixando modelo de linguagem do SpaCy (pt_core_news_lg)...
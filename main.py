@@ -1,20 +1,36 @@
 import sqlite3
-import joblib
+import threading
 import numpy as np
-import spacy
 import re
 import string
 import os
+import json
 import shutil
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+import time
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from fastapi.staticfiles import StaticFiles
-from typing import List, Optional
-from sklearn.metrics.pairwise import cosine_similarity
-from sentence_transformers import SentenceTransformer
-from rank_bm25 import BM25Okapi
+from typing import List, Literal, Optional
 from fastapi.middleware.cors import CORSMiddleware
-from collections import defaultdict
+from indice_bm25 import tokenizar_bm25
+from indices_busca import IndicesBusca, carregar_indices_busca
+from busca import alinhar_frases, top_k_por_livro
+from cache_metadados import CacheMetadados
+from microlote import MicroLote, executar
+from cache_consultas import CacheLRU, MAX_MB_CONSULTAS, TTL_CONSULTAS, normalizar_consulta
+from cache_respostas import CacheRespostas, MAX_MB_RESPOSTAS, TTL_RESPOSTAS, DB_RESPOSTAS
+from ingestao import FilaIngestao
+from geracoes import VigiaGeracoes, diretorio_atual, geracao_atual
+from inicializacao import Inicializacao
+from metricas import METRICA_REQUISICAO, REGISTRO, carregar_metricas_build, medir, requisicao
+from paginacao_tema import (
+    MAX_CHUNKS_RANKING, MAX_LIVROS_RANKING, MAX_MB_RANKINGS, RankingTema, RankingsTema,
+    ler_cursor, linhas_ndjson, pagina_chunks, pagina_livros,
+)
+import daemon_busca
+import pipeline_corpus
 
 class ObraBase(BaseModel):
     id: int
@@ -29,6 +45,7 @@ class ResultadoTrecho(BaseModel):
     pontuacao: float
     texto_encontrado: str 
     obra: ObraBase
+    frases_alinhadas: int = 1
 
 class ResultadoTema(BaseModel):
     score_fusao_multiplicativa: float
@@ -40,48 +57,33 @@ class ResultadoTema(BaseModel):
 class TextoParaAnalisar(BaseModel):
     texto: str = Field(min_length=5)
 
+class BuscaTema(TextoParaAnalisar):
+    limite_livros: int = Field(default=5, ge=1, le=MAX_LIVROS_RANKING)
+    limite_chunks_por_livro: int = Field(default=25, ge=1, le=MAX_CHUNKS_RANKING)
+    # 'compacto': cada obra uma vez, chunks com o id do livro e cursores de
+    # paginação; 'ndjson': o mesmo conteúdo, um livro por linha, em streaming.
+    formato: Literal["completo", "compacto", "ndjson"] = "completo"
+
 DB_PATH = 'literatura.db'
+NOME_MODELO = 'paraphrase-multilingual-MiniLM-L12-v2'
+IVF_N_PROBE = int(os.environ.get('SCRIPTURA_IVF_NPROBE', 8))
+SEGMENTADOR_CONSULTAS = os.environ.get('SCRIPTURA_SEGMENTADOR_CONSULTAS', 'pt_core_news_lg')
+MAX_FRASES_TRECHO = int(os.environ.get('SCRIPTURA_TRECHO_MAX_FRASES', 32))
 RE_CONTROLE_INVISIVEL = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]')
 
-print("Carregando modelo SentenceTransformer (MiniLM)...")
-model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
-print("Carregando modelo spaCy (pt_core_news_lg)...")
-nlp_main = spacy.load('pt_core_news_lg', disable=['parser', 'ner', 'tagger'])
-nlp_main.add_pipe('sentencizer')
+# Modelos e índices são carregados em segundo plano (ver `inicializacao`); até
+# lá as buscas respondem 503 e /health/ready indica a etapa em andamento.
+model = None
+nlp_main = None
+geracao_carregada = None
+indices = IndicesBusca(None, None, None, None, None, None, {})
+trava_indices = threading.Lock()
+trava_recarga = threading.Lock()
 
-print("Carregando 'Cérebro de Trecho' (index_TRECHO.pkl)...")
-try:
-    embeddings_matrix_TRECHO = joblib.load('embeddings_TRECHO.pkl')
-    index_TRECHO = joblib.load('index_TRECHO.pkl')
-    print(f"Cérebro de Trecho carregado. ({len(index_TRECHO)} frases)")
-except FileNotFoundError:
-    print("ERRO FATAL: Cérebro de Trecho (index_TRECHO.pkl) não encontrado.")
-    print("           Execute 'processar_textos.py' (v9.1) primeiro.")
-    embeddings_matrix_TRECHO = index_TRECHO = None
-except Exception as e:
-    print(f"ERRO CRÍTICO AO CARREGAR 'index_TRECHO.pkl': {e}")
-    embeddings_matrix_TRECHO = index_TRECHO = None
-
-print("Carregando 'Cérebro de Tema' (index_TEMA.pkl)...")
-try:
-    embeddings_matrix_TEMA = joblib.load('embeddings_TEMA.pkl')
-    index_TEMA = joblib.load('index_TEMA.pkl')
-    print(f"Cérebro de Tema carregado. ({len(index_TEMA)} chunks)")
-except FileNotFoundError:
-    print("ERRO FATAL: Cérebro de Tema (index_TEMA.pkl) não encontrado.")
-    print("           Execute 'processar_temas.py' (v2.1) primeiro.")
-    embeddings_matrix_TEMA = index_TEMA = None
-except Exception as e:
-    print(f"ERRO CRÍTICO AO CARREGAR 'index_TEMA.pkl': {e}")
-    embeddings_matrix_TEMA = index_TEMA = None
-
-bm25_TEMA = None
-if index_TEMA:
-    print("Construindo índice BM25 (Keywords) para Temas...")
-    corpus_textos_tema = [item['texto'] for item in index_TEMA]
-    tokenized_corpus_tema = [doc.lower().split(" ") for doc in corpus_textos_tema]
-    bm25_TEMA = BM25Okapi(tokenized_corpus_tema)
-    print("Índice BM25 construído com sucesso.")
+# Com SCRIPTURA_DAEMON, este processo é só um worker HTTP: modelos, índices,
+# ingestão e trocas de geração ficam no daemon de busca (ver daemon_busca.py),
+# e as buscas vão para lá. O cache de respostas continua em cada worker.
+daemon = daemon_busca.cliente()
 
 app = FastAPI(
     title="Scriptura"
@@ -110,22 +112,359 @@ def formatar_livro_saida(row):
         livro["url_download"] = None
     return livro
 
-def limpar_texto_busca(texto_sujo: str):
+cache_metadados = CacheMetadados(DB_PATH, formatar_livro_saida)
+try:
+    print(f"Cache de metadados carregado. ({cache_metadados.carregar()} livros)")
+except sqlite3.Error as e:
+    print(f"ERRO: Não foi possível carregar os metadados de '{DB_PATH}': {e}")
+
+def normalizar_texto_busca(texto_sujo: str):
     texto_limpo = RE_CONTROLE_INVISIVEL.sub('', texto_sujo)
     texto_limpo = texto_limpo.lstrip(string.whitespace)
-    texto_limpo = re.sub(r'(\n|\s){2,}', ' \n', texto_limpo)
-    doc_spacy = nlp_main(texto_limpo)
-    frases_busca = [s.text.strip() for s in doc_spacy.sents if s.text.strip()]
+    return re.sub(r'(\n|\s){2,}', ' \n', texto_limpo)
+
+def frases_do_documento(doc_spacy):
+    return [s.text.strip() for s in doc_spacy.sents if s.text.strip()]
+
+def limpar_texto_busca(texto_sujo: str):
+    frases_busca = frases_do_documento(nlp_main(normalizar_texto_busca(texto_sujo)))
     if not frases_busca:
         raise HTTPException(status_code=422, detail="Nenhuma frase válida encontrada na busca.")
     return frases_busca
 
+def segmentar_lote(textos):
+    # `nlp.pipe` passa todos os textos pelo pipeline de uma vez.
+    return [frases_do_documento(doc) for doc in nlp_main.pipe([normalizar_texto_busca(t) for t in textos])]
+
+def codificar_lote(listas_de_frases):
+    vetores = model.encode([frase for frases in listas_de_frases for frase in frases])
+    resultados, inicio = [], 0
+    for frases in listas_de_frases:
+        resultados.append(np.array(vetores[inicio : inicio + len(frases)], dtype=np.float32))
+        inicio += len(frases)
+    return resultados
+
+# Cada lote devolve, junto com o resultado, o retrato dos índices em que foi
+# calculado, para que as linhas sejam lidas no mesmo retrato.
+def buscar_trechos_lote(matrizes):
+    # Cada item é a matriz com as frases de uma busca; as frases de todas as
+    # buscas do lote são pontuadas juntas e depois devolvidas a cada busca.
+    atual = indices
+    resultados = atual.buscar_trechos_lote(np.concatenate(matrizes), 20, IVF_N_PROBE)
+    saida, inicio = [], 0
+    for matriz in matrizes:
+        saida.append((atual, resultados[inicio : inicio + len(matriz)]))
+        inicio += len(matriz)
+    return saida
+
+def pontuar_temas_lote(vetores):
+    atual = indices
+    return [(atual, scores) for scores in atual.pontuar_temas_lote(np.stack(vetores))]
+
+lote_encode = MicroLote(codificar_lote, nome='encode')
+lote_busca_TRECHO = MicroLote(buscar_trechos_lote, nome='busca_trecho')
+lote_vetor_TEMA = MicroLote(pontuar_temas_lote, nome='vetor_tema')
+
+cache_consultas = CacheLRU(MAX_MB_CONSULTAS * 1024 * 1024, TTL_CONSULTAS, nome='consultas')
+
+async def preparar_consulta(texto):
+    chave = normalizar_consulta(texto)
+    consulta = cache_consultas.obter(chave)
+    if consulta is None:
+        with medir("segmentacao"):
+            frases_busca = await executar(limpar_texto_busca, texto)
+        with medir("encode"):
+            vetores_busca = await lote_encode.submeter(frases_busca)
+        vetores_busca.flags.writeable = False
+        consulta = (frases_busca, vetores_busca)
+        cache_consultas.guardar(chave, consulta)
+    return consulta
+
+cache_respostas = CacheRespostas(MAX_MB_RESPOSTAS * 1024 * 1024, TTL_RESPOSTAS, DB_RESPOSTAS)
+
+def serializar_resposta(modelo, resultados):
+    conteudo = jsonable_encoder([modelo(**resultado) for resultado in resultados])
+    return json.dumps(conteudo, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+async def responder_com_cache(endpoint, texto, versao_indices, parametros, modelo, calcular):
+    # Cada etapa medida vai para os histogramas de /metrics e, desta
+    # requisição, para o cabeçalho Server-Timing da resposta.
+    with requisicao(endpoint) as tempos:
+        with medir("metadados"):
+            cache_metadados.verificar_mudancas()
+        versao_metadados = cache_metadados.versao
+        chave = cache_respostas.chave(endpoint, normalizar_consulta(texto), parametros, versao_indices, versao_metadados)
+
+        with medir("cache_respostas"):
+            corpo = cache_respostas.obter(chave)
+            if corpo is None and cache_respostas.tem_disco:
+                corpo = await executar(cache_respostas.obter_disco, chave)
+        acerto_cache = corpo is not None
+        if corpo is None:
+            resultados = await calcular()
+            with medir("serializacao"):
+                corpo = await executar(serializar_resposta, modelo, resultados)
+            cache_respostas.guardar(chave, corpo)
+            if cache_respostas.tem_disco:
+                await executar(cache_respostas.guardar_disco, chave, corpo, versao_indices, versao_metadados)
+        server_timing = tempos.server_timing()
+        REGISTRO.observar(
+            METRICA_REQUISICAO, time.perf_counter() - tempos.inicio,
+            endpoint=endpoint, cache="acerto" if acerto_cache else "falta",
+        )
+    return Response(content=corpo, media_type="application/json", headers={"Server-Timing": server_timing})
+
+def invalidar_caches_de_acervo():
+    cache_metadados.invalidar()
+    try:
+        versoes = estado_busca()["versoes"]
+    except HTTPException:
+        # Daemon fora do ar: as entradas antigas do disco saem na próxima limpeza.
+        return
+    cache_respostas.purgar(list(versoes.values()), cache_metadados.versao)
+
+def estado_busca():
+    # O que as rotas precisam saber dos índices carregados (e o que
+    # /admin/indices mostra); no modo daemon, os índices são os do daemon.
+    if daemon is not None:
+        return daemon.chamar("estado")
+    atual = indices
+    return {
+        "geracao": geracao_carregada,
+        "versoes": atual.versoes,
+        "trecho_pronto": atual.trecho_pronto,
+        "tema_pronto": atual.tema_pronto,
+        "trechos": len(atual.index_TRECHO) if atual.trecho_pronto else 0,
+        "chunks_tema": len(atual.index_TEMA) if atual.tema_pronto else 0,
+        "ivf": atual.ivf_TRECHO is not None,
+        "quantizacao": atual.quantizacao,
+        "bm25": atual.bm25_TEMA.tipo if atual.tema_pronto else None,
+        "shards": atual.shards,
+    }
+
+async def obter_estado_busca():
+    if daemon is None:
+        return estado_busca()
+    return await executar(estado_busca)
+
+async def no_daemon(operacao, item):
+    # Uma busca feita pelo daemon, com os campos já validados aqui e a versão
+    # do acervo que esta requisição viu.
+    return await executar(daemon.chamar, operacao, cache_metadados.versao, item.model_dump())
+
+def ingerir_livro(livro_id, etapa):
+    global indices
+    if not inicializacao.pronto.is_set():
+        etapa("aguardando a inicialização da API")
+        inicializacao.pronto.wait()
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        row = conn.execute(
+            "SELECT titulo, caminho_arquivo, caminho_pdf, status FROM livros WHERE id = ?", (livro_id,)
+        ).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        raise ValueError("O livro não existe mais no banco de dados.")
+    titulo, caminho_txt, caminho_pdf, status = row
+    if status != 'PROCESSADO':
+        raise ValueError(f"O livro não está aprovado (status atual: {status}).")
+    if not indices.trecho_pronto or not indices.tema_pronto:
+        raise RuntimeError("Os índices de busca não estão carregados.")
+    if livro_id in indices.livros_indexados():
+        return "O livro já estava indexado."
+
+    if caminho_pdf and os.path.exists(caminho_pdf):
+        etapa("convertendo PDF")
+        # Só a ingestão converte PDFs: a API, o daemon e os benchmarks sobem sem o pdfplumber.
+        from auto_converter import converter_pdf_para_txt_limpo
+        if not converter_pdf_para_txt_limpo(caminho_pdf, caminho_txt):
+            raise RuntimeError(f"Falha ao converter '{caminho_pdf}'.")
+
+    etapa("fatiando e vetorizando")
+    partes = pipeline_corpus.indexar_livro((livro_id, caminho_txt, titulo))
+    trechos, embeddings_trechos = partes['TRECHO']
+    temas, embeddings_temas = partes['TEMA']
+    if not len(trechos) and not len(temas):
+        raise ValueError("Nenhum chunk válido foi gerado para o livro.")
+
+    etapa("publicando nos índices")
+    with trava_indices:
+        if livro_id in indices.livros_indexados():
+            return "O livro já estava indexado."
+        indices = indices.com_livro(livro_id, trechos, embeddings_trechos, temas, embeddings_temas)
+    rankings_tema.limpar()
+    invalidar_caches_de_acervo()
+    return f"{len(trechos)} trechos e {len(temas)} chunks de tema adicionados aos índices."
+
+fila_ingestao = FilaIngestao(DB_PATH, ingerir_livro)
+
+def recarregar_indices():
+    # A geração nova é carregada inteira fora da trava; as buscas seguem na
+    # antiga até a troca da referência, e as que já começaram terminam nela.
+    global indices, geracao_carregada
+    if not trava_recarga.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="Já existe uma recarga de índices em andamento.")
+    try:
+        nome = geracao_atual()
+        novos = carregar_indices_busca(NOME_MODELO, diretorio_atual())
+        if not novos.trecho_pronto or not novos.tema_pronto:
+            raise HTTPException(status_code=500, detail=f"A geração '{nome}' está incompleta; mantendo a geração atual.")
+        with trava_indices:
+            antigos, indices = indices, novos
+            geracao_carregada = nome
+        rankings_tema.limpar()
+        invalidar_caches_de_acervo()
+    finally:
+        trava_recarga.release()
+
+    # Livros ingeridos depois que o build começou ainda não estão na geração nova.
+    reenfileirados = []
+    for livro_id in sorted(antigos.livros_indexados() - novos.livros_indexados()):
+        livro = cache_metadados.obter(livro_id)
+        if livro is not None and livro.get("status") == "PROCESSADO":
+            reenfileirados.append(fila_ingestao.enfileirar(livro_id))
+
+    print(f"Geração de índices '{nome}' carregada ({len(novos.index_TRECHO)} trechos, {len(novos.index_TEMA)} chunks de tema).")
+    return {
+        "geracao": nome,
+        "trechos": len(novos.index_TRECHO),
+        "chunks_tema": len(novos.index_TEMA),
+        "jobs_reenfileirados": reenfileirados,
+    }
+
+vigia_geracoes = VigiaGeracoes(lambda nome: recarregar_indices())
+
+def carregar_modelo():
+    global model
+    model = pipeline_corpus.carregar_modelo()
+
+def carregar_segmentador():
+    # Com o parser desligado, quem separa as frases é só o sentencizer (regras de
+    # pontuação); 'sentencizer' dispensa o pt_core_news_lg e usa um pipeline
+    # 'pt' vazio, que carrega em milissegundos.
+    global nlp_main
+    import spacy
+    if SEGMENTADOR_CONSULTAS == 'sentencizer':
+        print("Carregando segmentador de frases (spaCy 'pt' vazio + sentencizer)...")
+        nlp = spacy.blank('pt')
+    else:
+        print(f"Carregando modelo spaCy ({SEGMENTADOR_CONSULTAS})...")
+        nlp = spacy.load(SEGMENTADOR_CONSULTAS, disable=['parser', 'ner', 'tagger'])
+    nlp.add_pipe('sentencizer')
+    nlp_main = nlp
+
+def carregar_indices():
+    global indices, geracao_carregada
+    geracao_carregada = geracao_atual()
+    indices = carregar_indices_busca(NOME_MODELO, diretorio_atual())
+    if indices.ivf_TRECHO is not None:
+        print(f"Busca de trechos via IVF (n_probe={IVF_N_PROBE}).")
+    if cache_respostas.tem_disco:
+        removidas = cache_respostas.purgar(list(indices.versoes.values()), cache_metadados.versao)
+        print(f"Cache de respostas em disco: '{DB_RESPOSTAS}' ({removidas} entradas antigas removidas).")
+    restaurar_ingeridos()
+    vigia_geracoes.vista = geracao_carregada
+    vigia_geracoes.iniciar()
+
+def restaurar_ingeridos():
+    # Livros aprovados depois do build da geração só existem nos segmentos:
+    # voltam para os índices ao subir, ou vão para a fila se o segmento não
+    # estiver em dia com o .txt.
+    global indices
+    if not indices.trecho_pronto or not indices.tema_pronto:
+        return
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            livros = conn.execute(
+                "SELECT id, caminho_arquivo, titulo FROM livros WHERE status = 'PROCESSADO' ORDER BY id"
+            ).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"AVISO: Não foi possível listar os livros aprovados ({e}).")
+        return
+    indexados = indices.livros_indexados()
+    restaurados, reenfileirados = 0, 0
+    for livro in livros:
+        livro_id = livro[0]
+        if livro_id in indexados:
+            continue
+        try:
+            partes = pipeline_corpus.segmentos_do_livro(livro)
+        except Exception as e:
+            print(f"AVISO: Segmento do livro {livro_id} ilegível ({e}); reenfileirando.")
+            partes = None
+        if partes is None:
+            fila_ingestao.enfileirar(livro_id)
+            reenfileirados += 1
+            continue
+        trechos, embeddings_trechos = partes['TRECHO']
+        temas, embeddings_temas = partes['TEMA']
+        if not len(trechos) and not len(temas):
+            continue
+        with trava_indices:
+            indices = indices.com_livro(livro_id, trechos, embeddings_trechos, temas, embeddings_temas)
+        restaurados += 1
+    if restaurados or reenfileirados:
+        print(f"Livros ingeridos fora da geração: {restaurados} restaurados dos segmentos, {reenfileirados} reenfileirados.")
+
+def aquecer():
+    # Uma busca de mentira passa por todo o caminho quente (spaCy, encode,
+    # varredura dos índices) para que a primeira busca real não pague o custo
+    # de alocação do torch nem as primeiras faltas de página dos arquivos mapeados.
+    frases = limpar_texto_busca("Aquecimento da API. O sol nasceu sobre o mar.")
+    vetores = codificar_lote([frases])[0]
+    if indices.trecho_pronto:
+        indices.buscar_trechos_lote(vetores, 20, IVF_N_PROBE)
+    if indices.tema_pronto:
+        indices.pontuar_temas_lote(np.mean(vetores, axis=0, keepdims=True))
+        indices.bm25_TEMA.pontuar(tokenizar_bm25(" ".join(frases)))
+
+if daemon is None:
+    inicializacao = Inicializacao([
+        ("modelo", carregar_modelo),
+        ("segmentador", carregar_segmentador),
+        ("indices", carregar_indices),
+        ("aquecimento", aquecer),
+    ])
+else:
+    inicializacao = Inicializacao([("daemon", daemon.aguardar)])
+
+def exigir_pronto():
+    if not inicializacao.pronto.is_set():
+        raise HTTPException(
+            status_code=503,
+            detail="A API ainda está carregando os modelos e os índices.",
+            headers={"Retry-After": "5"},
+        )
+
+@app.get("/health/live")
+def health_live():
+    return {"status": "vivo"}
+
+@app.get("/health/ready")
+def health_ready():
+    estado = inicializacao.estado()
+    estado["geracao"] = geracao_carregada
+    if daemon is not None and estado["status"] == "pronto":
+        try:
+            estado["geracao"] = estado_busca()["geracao"]
+        except HTTPException as e:
+            estado["status"], estado["erro"] = "erro", e.detail
+    return Response(
+        content=json.dumps(estado, ensure_ascii=False),
+        media_type="application/json",
+        status_code=200 if estado["status"] == "pronto" else 503,
+    )
+
 @app.get("/")
 def read_root():
     return {"message": "Bem-vindo à API Scriptura (v18.1 - TESTE DE VERIFICACAO)!"}
 
 @app.post("/upload-livro")
-async def upload_livro(
+def upload_livro(
     titulo: str = Form(...),
     autor: str = Form(...),
     ano_lancamento: Optional[int] = Form(None),
@@ -167,6 +506,7 @@ async def upload_livro(
         conn.commit()
         novo_id = cursor.lastrowid
         conn.close()
+        invalidar_caches_de_acervo()
     except sqlite3.IntegrityError:
         raise HTTPException(status_code=400, detail="Um livro com este título/caminho já existe.")
     except Exception as e:
@@ -179,125 +519,358 @@ async def upload_livro(
         "status": "EM_REVISAO"
     }
 
+def pontuar_tema(frases_busca, atual, similaridades_vetor, similaridades_bm25=None):
+    if similaridades_bm25 is None:
+        query_texto = " ".join(frases_busca) 
+        query_tokenizada = tokenizar_bm25(query_texto)
+        with medir("bm25"):
+            similaridades_bm25 = atual.bm25_TEMA.pontuar(query_tokenizada)
+    with medir("fusao"):
+        epsilon = 1e-9 
+        norm_vetor = (similaridades_vetor - np.min(similaridades_vetor)) / (np.max(similaridades_vetor) - np.min(similaridades_vetor) + epsilon)
+        norm_bm25 = (similaridades_bm25 - np.min(similaridades_bm25)) / (np.max(similaridades_bm25) - np.min(similaridades_bm25) + epsilon)
+        
+        W_VETOR = 0.4
+        W_BM25  = 0.6
+        score_final_hibrido = (W_VETOR * norm_vetor) + (W_BM25 * norm_bm25)
+        
+        score_final_hibrido = np.nan_to_num(score_final_hibrido, nan=0.0, posinf=0.0, neginf=0.0)
+    return score_final_hibrido, norm_vetor, norm_bm25
+
+def ranquear_tema(item, frases_busca, atual, similaridades_vetor, similaridades_bm25=None):
+    score_final_hibrido, norm_vetor, norm_bm25 = pontuar_tema(frases_busca, atual, similaridades_vetor, similaridades_bm25)
+    dados_dos_livros = cache_metadados.instantaneo()
+    with medir("ranking"):
+        livros_selecionados = top_k_por_livro(
+            score_final_hibrido, atual.grupos_TEMA,
+            item.limite_livros, item.limite_chunks_por_livro, dados_dos_livros.__contains__
+        )
+
+    resultados_finais = []
+    with medir("montagem"):
+        for id_livro, linhas in livros_selecionados:
+            for i in linhas:
+                resultados_finais.append({
+                    "score_fusao_multiplicativa": round(float(score_final_hibrido[i]), 6),
+                    "score_vetor_normalizado": round(float(norm_vetor[i]), 6),
+                    "score_bm25_normalizado": round(float(norm_bm25[i]), 6),
+                    "obra": dados_dos_livros[id_livro],
+                    "texto_chunk_encontrado": atual.index_TEMA.texto(i)
+                })
+        
+    return resultados_finais
+
+async def buscar_tema(item):
+    if daemon is not None:
+        return await no_daemon("tema", item)
+    frases_busca, vetores_busca = await preparar_consulta(item.texto)
+    with medir("vetor"):
+        atual, similaridades_vetor = await lote_vetor_TEMA.submeter(np.mean(vetores_busca, axis=0))
+    return await executar(ranquear_tema, item, frases_busca, atual, similaridades_vetor)
+
 @app.post("/recomendar-por-tema", response_model=List[ResultadoTema])
-async def recomendar_por_tema(item: TextoParaAnalisar):
-    if embeddings_matrix_TEMA is None or bm25_TEMA is None:
+async def recomendar_por_tema(item: BuscaTema):
+    exigir_pronto()
+    estado = await obter_estado_busca()
+    if not estado["tema_pronto"]:
         raise HTTPException(status_code=500, detail="Cérebro de Tema (Vetor ou BM25) não está carregado.")
 
-    frases_busca = limpar_texto_busca(item.texto)
-    query_texto = " ".join(frases_busca) 
+    parametros = {
+        "limite_livros": item.limite_livros,
+        "limite_chunks_por_livro": item.limite_chunks_por_livro,
+        "quantizacao": estado["quantizacao"].get("TEMA"),
+        "bm25": estado["bm25"],
+    }
+    if item.formato != "completo":
+        return await recomendar_por_tema_paginado(item)
+    return await responder_com_cache(
+        "tema", item.texto, estado["versoes"].get("TEMA", ""), parametros, ResultadoTema, lambda: buscar_tema(item)
+    )
 
-    vetor_medio_busca = np.array([np.mean(model.encode(frases_busca), axis=0)])
-    similaridades_vetor = cosine_similarity(vetor_medio_busca, embeddings_matrix_TEMA)[0]
-    query_tokenizada = query_texto.lower().split(" ")
-    similaridades_bm25 = bm25_TEMA.get_scores(query_tokenizada)
-    epsilon = 1e-9 
-    norm_vetor = (similaridades_vetor - np.min(similaridades_vetor)) / (np.max(similaridades_vetor) - np.min(similaridades_vetor) + epsilon)
-    norm_bm25 = (similaridades_bm25 - np.min(similaridades_bm25)) / (np.max(similaridades_bm25) - np.min(similaridades_bm25) + epsilon)
-    
-    W_VETOR = 0.4
-    W_BM25  = 0.6
-    score_final_hibrido = (W_VETOR * norm_vetor) + (W_BM25 * norm_bm25)
-    
-    score_final_hibrido = np.nan_to_num(score_final_hibrido, nan=0.0, posinf=0.0, neginf=0.0)
-    
-    LIMITE_LIVROS_DIFERENTES = 5
-    LIMITE_CHUNKS_POR_LIVRO = 25
-    
-    livros_chunks = defaultdict(list)
-    dados_dos_livros = {}
-    
+rankings_tema = RankingsTema(MAX_MB_RANKINGS * 1024 * 1024)
+
+def montar_ranking_tema(frases_busca, atual, similaridades_vetor):
+    # Guarda o ranking até os tetos de livros e de chunks por livro, para que
+    # as próximas páginas não refaçam a busca.
+    score_final_hibrido, norm_vetor, norm_bm25 = pontuar_tema(frases_busca, atual, similaridades_vetor)
+    with medir("ranking"):
+        livros_selecionados = top_k_por_livro(
+            score_final_hibrido, atual.grupos_TEMA,
+            MAX_LIVROS_RANKING, MAX_CHUNKS_RANKING, cache_metadados.instantaneo().__contains__
+        )
+        return RankingTema.montar(atual, livros_selecionados, score_final_hibrido, norm_vetor, norm_bm25)
+
+async def obter_ranking_tema(texto):
+    cache_metadados.verificar_mudancas()
+    identificador = RankingsTema.identificador(
+        normalizar_consulta(texto), indices.versoes.get("TEMA", ""), cache_metadados.versao
+    )
+    ranking = rankings_tema.obter(identificador)
+    if ranking is None:
+        frases_busca, vetores_busca = await preparar_consulta(texto)
+        with medir("vetor"):
+            atual, similaridades_vetor = await lote_vetor_TEMA.submeter(np.mean(vetores_busca, axis=0))
+        ranking = await executar(montar_ranking_tema, frases_busca, atual, similaridades_vetor)
+        rankings_tema.guardar(identificador, ranking)
+    return identificador, ranking
+
+CAMPOS_OBRA = tuple(ObraBase.model_fields)
+
+def obra_publica(dados_dos_livros):
+    def obra_de(id_livro):
+        livro = dados_dos_livros.get(id_livro)
+        return None if livro is None else {campo: livro.get(campo) for campo in CAMPOS_OBRA}
+    return obra_de
+
+def serializar_pagina(pagina):
+    return json.dumps(pagina, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+async def primeira_pagina_tema(item):
+    # A primeira página da busca ou, em NDJSON, o gerador das linhas. Quem
+    # guarda os rankings (e atende os cursores) é o processo com os índices.
+    if daemon is not None:
+        return await no_daemon("tema_paginado", item)
+    identificador, ranking = await obter_ranking_tema(item.texto)
+    obra_de = obra_publica(cache_metadados.instantaneo())
+    if item.formato == "ndjson":
+        return linhas_ndjson(ranking, identificador, obra_de, item.limite_livros, item.limite_chunks_por_livro)
+    with medir("montagem"):
+        return await executar(
+            pagina_livros, ranking, identificador, obra_de, 0, item.limite_livros, item.limite_chunks_por_livro
+        )
+
+async def recomendar_por_tema_paginado(item):
+    with requisicao(f"tema_{item.formato}") as tempos:
+        pagina = await primeira_pagina_tema(item)
+        if item.formato == "ndjson":
+            server_timing = tempos.server_timing()
+            return StreamingResponse(
+                pagina,
+                media_type="application/x-ndjson",
+                headers={"Server-Timing": server_timing},
+            )
+        with medir("serializacao"):
+            corpo = serializar_pagina(pagina)
+        server_timing = tempos.server_timing()
+    return Response(content=corpo, media_type="application/json", headers={"Server-Timing": server_timing})
+
+@app.get("/recomendar-por-tema/pagina")
+def pagina_tema(cursor: str):
+    # Próximos livros ("proximo") ou próximos chunks de um livro
+    # ("proximos_chunks") de uma busca feita com formato compacto ou ndjson.
+    exigir_pronto()
+    if daemon is not None:
+        pagina = daemon.chamar("pagina_tema", cache_metadados.versao, cursor)
+    else:
+        pagina = montar_pagina_tema(cursor)
+    return Response(content=serializar_pagina(pagina), media_type="application/json")
+
+def montar_pagina_tema(cursor):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        for i, score in enumerate(score_final_hibrido):
-            item_index = index_TEMA[i]
-            id_livro = item_index['id_livro']
-            
+        identificador, tipo, numeros = ler_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    ranking = rankings_tema.obter(identificador)
+    if ranking is None:
+        raise HTTPException(status_code=410, detail="O ranking desta busca expirou. Refaça a busca.")
+
+    obra_de = obra_publica(cache_metadados.instantaneo())
+    if tipo == "l":
+        inicio, limite_livros, limite_chunks = numeros
+        pagina = pagina_livros(ranking, identificador, obra_de, inicio, limite_livros, limite_chunks)
+    else:
+        id_livro, inicio, limite_chunks = numeros
+        try:
+            pagina = pagina_chunks(ranking, identificador, obra_de, id_livro, inicio, limite_chunks)
+        except KeyError:
+            raise HTTPException(status_code=404, detail="O livro não faz parte deste ranking.")
+    return pagina
+
+def montar_resultados_trecho(atual, resultados_por_frase):
+    resultados_finais = []
+    dados_dos_livros = cache_metadados.instantaneo()
+
+    with medir("alinhamento"):
+        alinhados = alinhar_frases(resultados_por_frase, atual.index_TRECHO.id_livro)
+    with medir("montagem"):
+        for id_livro, linhas, scores, media in alinhados:
             if id_livro not in dados_dos_livros:
-                cursor.execute("SELECT * FROM livros WHERE id = ?", (id_livro,))
-                livro_row = cursor.fetchone()
-                dados_dos_livros[id_livro] = formatar_livro_saida(livro_row) if livro_row else None
-            
-            if dados_dos_livros[id_livro] is None:
                 continue
-
-            resultado = {
-                "score_fusao_multiplicativa": round(float(score), 6),
-                "score_vetor_normalizado": round(float(norm_vetor[i]), 6),
-                "score_bm25_normalizado": round(float(norm_bm25[i]), 6),
+            resultados_finais.append({
+                "pontuacao": round(float(media), 4),
+                "texto_encontrado": " ".join(atual.index_TRECHO.texto(i) for i in linhas),
                 "obra": dados_dos_livros[id_livro],
-                "texto_chunk_encontrado": item_index['texto']
-            }
-            livros_chunks[id_livro].append(resultado)
-        
-        conn.close()
+                "frases_alinhadas": len(linhas),
+            })
+            if len(resultados_finais) >= 5:
+                break
 
-        livros_melhor_score = []
-        for id_livro, chunks in livros_chunks.items():
-            chunks.sort(key=lambda x: x['score_fusao_multiplicativa'], reverse=True)
-            melhor_score = chunks[0]['score_fusao_multiplicativa']
-            livros_melhor_score.append((id_livro, melhor_score, chunks[:LIMITE_CHUNKS_POR_LIVRO]))
+    return resultados_finais
 
-        livros_melhor_score.sort(key=lambda x: x[1], reverse=True)
-        
-        resultados_finais = []
-        for id_livro, score, chunks in livros_melhor_score[:LIMITE_LIVROS_DIFERENTES]:
-            resultados_finais.extend(chunks)
-            
-        return resultados_finais
-        
-    except sqlite3.Error as e:
-        raise HTTPException(status_code=500, detail=f"Erro no banco de dados: {e}")
+async def buscar_trecho(item):
+    if daemon is not None:
+        return await no_daemon("trecho", item)
+    frases_busca, vetores_busca = await preparar_consulta(item.texto)
+    with medir("vetor"):
+        atual, resultados_por_frase = await lote_busca_TRECHO.submeter(vetores_busca[:MAX_FRASES_TRECHO])
+    return await executar(montar_resultados_trecho, atual, resultados_por_frase)
 
 @app.post("/encontrar-por-trecho", response_model=List[ResultadoTrecho])
 async def encontrar_por_trecho(item: TextoParaAnalisar):
-    if embeddings_matrix_TRECHO is None:
+    exigir_pronto()
+    estado = await obter_estado_busca()
+    if not estado["trecho_pronto"]:
         raise HTTPException(status_code=500, detail="Cérebro de Trecho (Frases) não está carregado.")
-        
-    frases_busca = limpar_texto_busca(item.texto)
-    texto_busca_final = frases_busca[0]
-    
-    texto_vetorizado = model.encode([texto_busca_final])
-    similaridades = cosine_similarity(texto_vetorizado, embeddings_matrix_TRECHO)[0]
-    
-    indices_top_20 = np.argsort(similaridades)[:-21:-1]
-    
-    resultados_finais = []
-    ids_de_livros_ja_adicionados = set()
-    
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        for i in indices_top_20:
-            item_index = index_TRECHO[i]
-            id_livro = item_index['id_livro']
-            texto_encontrado = item_index['texto']
-            
-            if id_livro not in ids_de_livros_ja_adicionados:
-                cursor.execute("SELECT * FROM livros WHERE id = ?", (id_livro,))
-                livro_row = cursor.fetchone()
-                
-                if livro_row:
-                    resultado = {
-                        "pontuacao": round(float(similaridades[i]), 4),
-                        "texto_encontrado": texto_encontrado,
-                        "obra": formatar_livro_saida(livro_row)
-                    }
-                    resultados_finais.append(resultado)
-                    ids_de_livros_ja_adicionados.add(id_livro)
 
-            if len(resultados_finais) >= 5:
-                break 
-                
-        conn.close()
-        return resultados_finais
-    except sqlite3.Error as e:
-        raise HTTPException(status_code=500, detail=f"Erro no banco de dados: {e}")
+    parametros = {
+        "n_probe": IVF_N_PROBE if estado["ivf"] else 0,
+        "max_frases": MAX_FRASES_TRECHO,
+        "quantizacao": estado["quantizacao"].get("TRECHO"),
+    }
+    return await responder_com_cache(
+        "trecho", item.texto, estado["versoes"].get("TRECHO", ""), parametros, ResultadoTrecho, lambda: buscar_trecho(item)
+    )
+
+# --- Buscas em lote: muitos textos em uma requisição (atribuição de citações,
+# classificação de redações). Um `nlp.pipe`, um `model.encode` e, a cada
+# BLOCO_BATCH textos, uma varredura de matriz (e um BM25) para todos juntos.
+
+MAX_TEXTOS_BATCH = int(os.environ.get('SCRIPTURA_BATCH_MAX_TEXTOS', 256))
+BLOCO_BATCH = int(os.environ.get('SCRIPTURA_BATCH_BLOCO', 32))
+
+class LoteTextos(BaseModel):
+    textos: List[str] = Field(min_length=1, max_length=MAX_TEXTOS_BATCH)
+
+class LoteTema(LoteTextos):
+    limite_livros: int = Field(default=5, ge=1, le=MAX_LIVROS_RANKING)
+    limite_chunks_por_livro: int = Field(default=25, ge=1, le=MAX_CHUNKS_RANKING)
+    # 'compacto': cada item no formato compacto da busca por tema (sem
+    # cursores), serializado sem o pydantic.
+    formato: Literal["completo", "compacto"] = "completo"
+
+class ItemLoteTrecho(BaseModel):
+    resultados: List[ResultadoTrecho] = []
+    erro: Optional[str] = None
+
+class ItemLoteTema(BaseModel):
+    resultados: List[ResultadoTema] = []
+    erro: Optional[str] = None
+
+async def preparar_consultas_lote(textos):
+    # Como `preparar_consulta`, para vários textos: os que já estão no cache
+    # de consultas não são segmentados nem vetorizados de novo. Textos sem
+    # nenhuma frase válida ficam como None.
+    chaves = [normalizar_consulta(texto) for texto in textos]
+    consultas = [cache_consultas.obter(chave) if len(texto) >= 5 else None for chave, texto in zip(chaves, textos)]
+    faltando = [i for i, consulta in enumerate(consultas) if consulta is None and len(textos[i]) >= 5]
+    if faltando:
+        with medir("segmentacao"):
+            frases = await executar(segmentar_lote, [textos[i] for i in faltando])
+        validos = [(i, frases_busca) for i, frases_busca in zip(faltando, frases) if frases_busca]
+        if validos:
+            with medir("encode"):
+                vetores = await executar(codificar_lote, [frases_busca for _, frases_busca in validos])
+            for (i, frases_busca), vetores_busca in zip(validos, vetores):
+                vetores_busca.flags.writeable = False
+                consultas[i] = (frases_busca, vetores_busca)
+                cache_consultas.guardar(chaves[i], consultas[i])
+    return consultas
+
+def erro_item_lote(texto):
+    if len(texto) < 5:
+        return "O texto deve ter pelo menos 5 caracteres."
+    return "Nenhuma frase válida encontrada na busca."
+
+def buscar_trechos_em_blocos(consultas):
+    resultados = []
+    for inicio in range(0, len(consultas), BLOCO_BATCH):
+        bloco = consultas[inicio : inicio + BLOCO_BATCH]
+        with medir("vetor"):
+            por_consulta = buscar_trechos_lote([vetores[:MAX_FRASES_TRECHO] for _, vetores in bloco])
+        for atual, resultados_por_frase in por_consulta:
+            resultados.append(montar_resultados_trecho(atual, resultados_por_frase))
+    return resultados
+
+def ranquear_temas_em_blocos(item, consultas):
+    resultados = []
+    for inicio in range(0, len(consultas), BLOCO_BATCH):
+        bloco = consultas[inicio : inicio + BLOCO_BATCH]
+        atual = indices
+        with medir("vetor"):
+            similaridades_vetor = atual.pontuar_temas_lote(np.stack([np.mean(vetores, axis=0) for _, vetores in bloco]))
+        with medir("bm25"):
+            similaridades_bm25 = atual.bm25_TEMA.pontuar_lote([tokenizar_bm25(" ".join(frases)) for frases, _ in bloco])
+        for (frases, _), vetor, bm25 in zip(bloco, similaridades_vetor, similaridades_bm25):
+            resultados.append(ranquear_tema(item, frases, atual, vetor, bm25))
+    return resultados
+
+def compactar_resultados_tema(resultados, obra_de):
+    obras, chunks = {}, []
+    for resultado in resultados:
+        id_livro = resultado["obra"]["id"]
+        if id_livro not in obras:
+            obras[id_livro] = obra_de(id_livro)
+        chunks.append({
+            "id_livro": id_livro,
+            "texto": resultado["texto_chunk_encontrado"],
+            "fusao": resultado["score_fusao_multiplicativa"],
+            "vetor": resultado["score_vetor_normalizado"],
+            "bm25": resultado["score_bm25_normalizado"],
+        })
+    return {"obras": list(obras.values()), "chunks": chunks}
+
+def serializar_lote_compacto(itens):
+    obra_de = obra_publica(cache_metadados.instantaneo())
+    return serializar_pagina([
+        compactar_resultados_tema(item["resultados"], obra_de) if "resultados" in item else item for item in itens
+    ])
+
+async def calcular_lote(textos, calcular):
+    consultas = await preparar_consultas_lote(textos)
+    validas = [consulta for consulta in consultas if consulta is not None]
+    resultados = iter(await executar(calcular, validas) if validas else [])
+    return [
+        {"resultados": next(resultados)} if consulta is not None else {"erro": erro_item_lote(texto)}
+        for texto, consulta in zip(textos, consultas)
+    ]
+
+async def calcular_lote_trecho(item):
+    if daemon is not None:
+        return await no_daemon("lote_trecho", item)
+    return await calcular_lote(item.textos, buscar_trechos_em_blocos)
+
+async def calcular_lote_tema(item):
+    if daemon is not None:
+        return await no_daemon("lote_tema", item)
+    return await calcular_lote(item.textos, lambda consultas: ranquear_temas_em_blocos(item, consultas))
+
+async def responder_lote(endpoint, modelo_item, calcular, compacto=False):
+    with requisicao(endpoint) as tempos:
+        itens = await calcular()
+        with medir("serializacao"):
+            if compacto:
+                corpo = await executar(serializar_lote_compacto, itens)
+            else:
+                corpo = await executar(serializar_resposta, modelo_item, itens)
+        server_timing = tempos.server_timing()
+    return Response(content=corpo, media_type="application/json", headers={"Server-Timing": server_timing})
+
+@app.post("/encontrar-por-trecho/batch", response_model=List[ItemLoteTrecho])
+async def encontrar_por_trecho_batch(item: LoteTextos):
+    exigir_pronto()
+    if not (await obter_estado_busca())["trecho_pronto"]:
+        raise HTTPException(status_code=500, detail="Cérebro de Trecho (Frases) não está carregado.")
+    return await responder_lote("trecho_batch", ItemLoteTrecho, lambda: calcular_lote_trecho(item))
+
+@app.post("/recomendar-por-tema/batch", response_model=List[ItemLoteTema])
+async def recomendar_por_tema_batch(item: LoteTema):
+    exigir_pronto()
+    if not (await obter_estado_busca())["tema_pronto"]:
+        raise HTTPException(status_code=500, detail="Cérebro de Tema (Vetor ou BM25) não está carregado.")
+    return await responder_lote(
+        "tema_batch", ItemLoteTema, lambda: calcular_lote_tema(item), compacto=item.formato == "compacto",
+    )
+
 class LivroUpdate(BaseModel):
     titulo: Optional[str] = None
     autor: Optional[str] = None
@@ -306,8 +879,99 @@ class LivroUpdate(BaseModel):
     movimento_literario: Optional[str] = None
     status: Optional[str] = None
 
+def estatisticas_caches_busca():
+    # Os caches de quem faz as buscas (no modo daemon, os do daemon).
+    if daemon is not None:
+        return daemon.chamar("caches")
+    return {"consultas": cache_consultas.estatisticas(), "rankings_tema": rankings_tema.cache.estatisticas()}
+
+@app.get("/admin/cache")
+def estatisticas_cache():
+    caches = estatisticas_caches_busca()
+    return {
+        "consultas": caches["consultas"],
+        "respostas": cache_respostas.estatisticas(),
+        "rankings_tema": caches["rankings_tema"],
+    }
+
+@app.post("/admin/recarregar-indices")
+def recarregar_indices_endpoint():
+    if daemon is not None:
+        return daemon.chamar("recarregar")
+    return recarregar_indices()
+
+@app.get("/admin/indices")
+def estado_indices():
+    estado = estado_busca()
+    return {campo: valor for campo, valor in estado.items() if campo not in ("trecho_pronto", "tema_pronto")}
+
+def metricas_indices():
+    # Amostras de quem tem os índices e os micro-lotes (no modo daemon, o
+    # /metrics dos workers as pede ao daemon).
+    atual = indices
+    for nome, embeddings, indice, quantizador in (
+        ("TRECHO", atual.embeddings_TRECHO, atual.index_TRECHO, atual.quant_TRECHO),
+        ("TEMA", atual.embeddings_TEMA, atual.index_TEMA, atual.quant_TEMA),
+    ):
+        if embeddings is None:
+            continue
+        yield ("scriptura_indice_linhas", "gauge", "Linhas (trechos ou chunks) de cada índice carregado.", {"indice": nome}, len(indice))
+        yield ("scriptura_indice_bytes", "gauge", "Bytes de cada índice carregado, por tipo de dado.", {"indice": nome, "tipo": "vetores"}, embeddings.nbytes)
+        if quantizador is not None:
+            yield ("scriptura_indice_bytes", "gauge", "", {"indice": nome, "tipo": "codigos"}, quantizador.codigos.nbytes)
+    for nome, n_shards in atual.shards.items():
+        yield ("scriptura_shards", "gauge", "Processos de busca (shards) ativos de cada índice.", {"indice": nome}, n_shards)
+    if atual.bm25_TEMA is not None:
+        if atual.bm25_TEMA.tipo == "fts5":
+            yield ("scriptura_indice_bytes", "gauge", "", {"indice": "TEMA", "tipo": "fts5_disco"}, atual.bm25_TEMA.nbytes_disco)
+        else:
+            yield ("scriptura_indice_bytes", "gauge", "", {"indice": "TEMA", "tipo": "bm25"}, atual.bm25_TEMA.nbytes)
+
+    yield (
+        "scriptura_indices_info", "gauge", "Geração e versões dos índices carregados (valor sempre 1).",
+        {"geracao": geracao_carregada or "", "versao_trecho": atual.versoes.get("TRECHO", ""), "versao_tema": atual.versoes.get("TEMA", "")},
+        1,
+    )
+
+    for lote in (lote_encode, lote_busca_TRECHO, lote_vetor_TEMA):
+        yield ("scriptura_lote_tamanho_medio", "gauge", "Itens por micro-lote, em média, desde a subida.", {"lote": lote.nome}, lote.tamanho_medio_lote)
+
+    # Tempos do build que gerou a geração servida (gravados pelos builders).
+    if geracao_carregada:
+        for etapa in carregar_metricas_build(diretorio_atual()):
+            yield (
+                "scriptura_geracao_build_etapa_segundos", "gauge", "Tempo gasto em cada etapa do build da geração carregada.",
+                {"etapa": etapa["etapa"], "alvo": etapa["alvo"]}, etapa["segundos"],
+            )
+
+def coletar_metricas(amostras_indices):
+    yield from amostras_indices
+    yield ("scriptura_pronto", "gauge", "1 quando a inicialização terminou (/health/ready).", {}, int(inicializacao.pronto.is_set()))
+
+    for cache in estatisticas_cache().values():
+        rotulos = {"cache": cache["nome"]}
+        yield ("scriptura_cache_taxa_acerto", "gauge", "Fração das consultas atendidas por cada cache desde a subida.", rotulos, cache["taxa_acerto"])
+        yield ("scriptura_cache_acertos_total", "counter", "Acertos de cada cache desde a subida.", rotulos, cache["hits"])
+        yield ("scriptura_cache_faltas_total", "counter", "Faltas de cada cache desde a subida.", rotulos, cache["misses"])
+        yield ("scriptura_cache_bytes", "gauge", "Bytes ocupados por cada cache em memória.", rotulos, cache["bytes_usados"])
+
+@app.get("/metrics")
+def metricas_prometheus():
+    # No modo daemon, os histogramas das etapas de busca (medidas no daemon)
+    # são somados aos deste worker.
+    if daemon is not None:
+        histogramas_daemon, amostras_indices = daemon.chamar("metricas")
+    else:
+        histogramas_daemon, amostras_indices = None, metricas_indices()
+    conteudo = REGISTRO.exportar(coletar_metricas(amostras_indices), somar=histogramas_daemon)
+    return Response(content=conteudo, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/admin/jobs")
+def listar_jobs_ingestao(limite: int = 50):
+    return fila_ingestao.listar(limite)
+
 @app.get("/admin/listar-todos")
-async def listar_todos_livros():
+def listar_todos_livros():
     try:
         conn = sqlite3.connect(DB_PATH)
         conn.row_factory = sqlite3.Row
@@ -320,7 +984,7 @@ async def listar_todos_livros():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/admin/excluir-livro/{livro_id}")
-async def excluir_livro(livro_id: int):
+def excluir_livro(livro_id: int):
     try:
         conn = sqlite3.connect(DB_PATH)
         cursor = conn.cursor()
@@ -331,13 +995,14 @@ async def excluir_livro(livro_id: int):
         cursor.execute("DELETE FROM livros WHERE id = ?", (livro_id,))
         conn.commit()
         conn.close()
+        invalidar_caches_de_acervo()
                 
         return {"mensagem": "Livro excluído com sucesso."}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.put("/admin/atualizar-livro/{livro_id}")
-async def atualizar_livro(livro_id: int, dados: LivroUpdate):
+def atualizar_livro(livro_id: int, dados: LivroUpdate):
     try:
         conn = sqlite3.connect(DB_PATH)
         cursor = conn.cursor()
@@ -354,7 +1019,15 @@ async def atualizar_livro(livro_id: int, dados: LivroUpdate):
         cursor.execute(f"UPDATE livros SET {set_clause} WHERE id = ?", valores)
         conn.commit()
         conn.close()
+        invalidar_caches_de_acervo()
+
+        if campos_para_atualizar.get("status") == "PROCESSADO":
+            job_id = fila_ingestao.enfileirar(livro_id)
+            return {"mensagem": "Livro atualizado com sucesso. Indexação iniciada em segundo plano.", "job_ingestao": job_id}
         
         return {"mensagem": "Livro atualizado com sucesso."}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+fila_ingestao.iniciar(consumir=daemon is None)
+inicializacao.iniciar()
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+import numpy as np
+
+# Mensagens entre processos do Scriptura (API e daemon, API e shards) sobre uma
+# `multiprocessing.connection`, sem pickle: um cabeçalho JSON seguido dos
+# bytes crus dos arrays e blobs que ele cita.
+#
+# Tipos aceitos: os do JSON, tuplas, dicts com chaves que não são str, bytes,
+# arrays numéricos do NumPy e escalares do NumPy (que viram os do Python). As
+# marcas começam com \x00, que não aparece nos nomes de campos.
+
+def _empacotar(valor, blobs):
+    if valor is None or isinstance(valor, (bool, int, float, str)):
+        return valor
+    if isinstance(valor, list):
+        return [_empacotar(v, blobs) for v in valor]
+    if isinstance(valor, tuple):
+        return {'\x00t': [_empacotar(v, blobs) for v in valor]}
+    if isinstance(valor, dict):
+        if all(isinstance(chave, str) for chave in valor):
+            return {chave: _empacotar(v, blobs) for chave, v in valor.items()}
+        return {'\x00d': [[_empacotar(chave, blobs), _empacotar(v, blobs)] for chave, v in valor.items()]}
+    if isinstance(valor, (bytes, bytearray)):
+        blobs.append(valor)
+        return {'\x00b': len(blobs) - 1}
+    if isinstance(valor, np.ndarray) and valor.dtype.kind in 'biufc':
+        blobs.append(np.ascontiguousarray(valor).tobytes())
+        return {'\x00a': len(blobs) - 1, 'dtype': valor.dtype.str, 'shape': list(valor.shape)}
+    if isinstance(valor, np.generic):
+        return _empacotar(valor.item(), blobs)
+    raise TypeError(f"tipo não suportado nas mensagens: {type(valor).__name__}")
+
+
+def _desempacotar(objeto, blobs):
+    if '\x00t' in objeto:
+        return tuple(objeto['\x00t'])
+    if '\x00d' in objeto:
+        return {chave: valor for chave, valor in objeto['\x00d']}
+    if '\x00b' in objeto:
+        return blobs[objeto['\x00b']]
+    if '\x00a' in objeto:
+        dtype = np.dtype(objeto['dtype'])
+        if dtype.kind not in 'biufc':
+            raise ValueError(f"dtype não suportado nas mensagens: {dtype}")
+        return np.frombuffer(blobs[objeto['\x00a']], dtype=dtype).reshape(objeto['shape']).copy()
+    return objeto
+
+
+def enviar(conexao, mensagem):
+    # "<número de blobs>\n<JSON>", e depois cada blob em um frame.
+    blobs = []
+    cabecalho = json.dumps(_empacotar(mensagem, blobs), ensure_ascii=False, separators=(',', ':'))
+    conexao.send_bytes(f'{len(blobs)}\n{cabecalho}'.encode('utf-8'))
+    for blob in blobs:
+        conexao.send_bytes(blob)
+
+
+def receber(conexao):
+    n_blobs, _, cabecalho = conexao.recv_bytes().partition(b'\n')
+    blobs = [conexao.recv_bytes() for _ in range(int(n_blobs))]
+    # O object_hook roda de dentro para fora: as marcas internas já estão
+    # resolvidas quando a de fora é lida.
+    return json.loads(cabecalho, object_hook=lambda objeto: _desempacotar(objeto, blobs))
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Limites (em segundos) dos buckets dos histogramas: de 1 ms, para as etapas de
+# uma busca, até 10 min, para as etapas de um build completo.
+BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0,
+)
+
+METRICA_ETAPA_BUSCA = 'scriptura_busca_etapa_segundos'
+METRICA_REQUISICAO = 'scriptura_requisicao_segundos'
+METRICA_ETAPA_BUILD = 'scriptura_build_etapa_segundos'
+METRICA_LOTE = 'scriptura_lote_segundos'
+
+AJUDA = {
+    METRICA_ETAPA_BUSCA: 'Duração de cada etapa das buscas (inclui a espera na fila do executor e dos micro-lotes).',
+    METRICA_REQUISICAO: 'Duração total das buscas, por endpoint e por acerto no cache de respostas.',
+    METRICA_ETAPA_BUILD: 'Duração de cada etapa dos builders e da ingestão de livros.',
+    METRICA_LOTE: 'Duração do processamento de cada micro-lote (encode e varreduras).',
+}
+
+ARQUIVO_METRICAS_BUILD = 'metricas_build.json'
+
+
+class Histograma:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.contagens = [0] * (len(buckets) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.contagens[bisect.bisect_left(self.buckets, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+
+class RegistroMetricas:
+    # Histogramas indexados por (nome, rótulos). Valores lidos de outros
+    # objetos (tamanho dos índices, caches, geração carregada) não ficam aqui:
+    # quem exporta os calcula na hora e os passa para `exportar`.
+    def __init__(self):
+        self._histogramas = {}
+        self._lock = threading.Lock()
+
+    def observar(self, nome, segundos, **rotulos):
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self._lock:
+            histograma = self._histogramas.get(chave)
+            if histograma is None:
+                histograma = self._histogramas[chave] = Histograma()
+            histograma.observar(segundos)
+
+    def resumo(self, nome):
+        # {rótulos: (observações, soma em segundos)}, para os builders imprimirem.
+        with self._lock:
+            return {
+                rotulos: (histograma.total, histograma.soma)
+                for (nome_hist, rotulos), histograma in self._histogramas.items() if nome_hist == nome
+            }
+
+    def instantaneo(self):
+        # Cópia dos histogramas, para outro processo somar aos dele (`exportar`).
+        with self._lock:
+            return {
+                chave: (histograma.buckets, list(histograma.contagens), histograma.soma, histograma.total)
+                for chave, histograma in self._histogramas.items()
+            }
+
+    def exportar(self, amostras=(), somar=None):
+        # Formato de texto do Prometheus (0.0.4). `amostras`: tuplas
+        # (nome, tipo, ajuda, rótulos, valor), com tipo 'gauge' ou 'counter'.
+        # `somar`: um `instantaneo()` de outro processo (o daemon de busca),
+        # somado série a série aos histogramas deste.
+        linhas = []
+        with self._lock:
+            histogramas = dict(self._histogramas)
+            for chave, (buckets, contagens, soma, total) in (somar or {}).items():
+                histograma = Histograma(buckets)
+                if chave in histogramas:
+                    local = histogramas[chave]
+                    contagens = [a + b for a, b in zip(contagens, local.contagens)]
+                    soma, total = soma + local.soma, total + local.total
+                histograma.contagens, histograma.soma, histograma.total = contagens, soma, total
+                histogramas[chave] = histograma
+            por_nome = {}
+            for (nome, rotulos), histograma in sorted(histogramas.items()):
+                por_nome.setdefault(nome, []).append((rotulos, histograma))
+            for nome, series in por_nome.items():
+                linhas.append(f'# HELP {nome} {AJUDA.get(nome, nome)}')
+                linhas.append(f'# TYPE {nome} histogram')
+                for rotulos, histograma in series:
+                    acumulado = 0
+                    for limite, contagem in zip(histograma.buckets + (float('inf'),), histograma.contagens):
+                        acumulado += contagem
+                        le = '+Inf' if limite == float('inf') else repr(limite)
+                        linhas.append(f'{nome}_bucket{_rotulos(rotulos + (("le", le),))} {acumulado}')
+                    linhas.append(f'{nome}_sum{_rotulos(rotulos)} {histograma.soma:.6f}')
+                    linhas.append(f'{nome}_count{_rotulos(rotulos)} {histograma.total}')
+
+        # As amostras de uma mesma métrica precisam sair juntas.
+        familias = {}
+        for nome, tipo, ajuda, rotulos, valor in amostras:
+            if valor is not None:
+                familias.setdefault(nome, (tipo, ajuda, []))[2].append((rotulos, valor))
+        for nome, (tipo, ajuda, valores) in familias.items():
+            linhas.append(f'# HELP {nome} {ajuda}')
+            linhas.append(f'# TYPE {nome} {tipo}')
+            for rotulos, valor in valores:
+                linhas.append(f'{nome}{_rotulos(tuple(rotulos.items()))} {float(valor):g}')
+        return '\n'.join(linhas) + '\n'
+
+
+def _rotulos(rotulos):
+    if not rotulos:
+        return ''
+    pares = []
+    for nome, valor in rotulos:
+        valor = str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pares.append(f'{nome}="{valor}"')
+    return '{' + ','.join(pares) + '}'
+
+
+REGISTRO = RegistroMetricas()
+
+# Tempos da requisição em andamento. O `microlote.executar` copia o contexto
+# para a thread do executor, então as etapas medidas lá também entram aqui.
+_requisicao_atual = contextvars.ContextVar('requisicao_atual', default=None)
+
+
+class TemposRequisicao:
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.etapas = {}
+        self.inicio = time.perf_counter()
+
+    def adicionar(self, etapa, segundos):
+        self.etapas[etapa] = self.etapas.get(etapa, 0.0) + segundos
+
+    def server_timing(self):
+        total = time.perf_counter() - self.inicio
+        partes = [f'{etapa};dur={segundos * 1000:.2f}' for etapa, segundos in self.etapas.items()]
+        partes.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(partes)
+
+
+@contextmanager
+def requisicao(endpoint):
+    tempos = TemposRequisicao(endpoint)
+    token = _requisicao_atual.set(tempos)
+    try:
+        yield tempos
+    finally:
+        _requisicao_atual.reset(token)
+
+
+def requisicao_atual():
+    # Os `TemposRequisicao` da requisição em andamento (ou None). O cliente do
+    # daemon de busca manda o endpoint junto com o pedido e soma as etapas
+    # medidas lá (que já entraram nos histogramas do daemon) ao Server-Timing.
+    return _requisicao_atual.get()
+
+
+@contextmanager
+def medir(etapa):
+    # Etapa de uma busca: vai para o histograma e para o Server-Timing.
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        decorrido = time.perf_counter() - inicio
+        tempos = _requisicao_atual.get()
+        if tempos is not None:
+            tempos.adicionar(etapa, decorrido)
+            REGISTRO.observar(METRICA_ETAPA_BUSCA, decorrido, endpoint=tempos.endpoint, etapa=etapa)
+
+
+@contextmanager
+def medir_build(etapa, alvo=''):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRO.observar(METRICA_ETAPA_BUILD, time.perf_counter() - inicio, etapa=etapa, alvo=alvo)
+
+
+def resumo_build():
+    # {(etapa, alvo): (execuções, segundos)}, na ordem em que as etapas aparecem.
+    return {
+        (dict(rotulos)['etapa'], dict(rotulos)['alvo']): valores
+        for rotulos, valores in REGISTRO.resumo(METRICA_ETAPA_BUILD).items()
+    }
+
+
+def salvar_metricas_build(diretorio, anterior=None):
+    # Grava na geração só o que este build mediu: `anterior` é o resumo_build()
+    # do início (o registro é do processo e pode já ter visto outros builds).
+    anterior = anterior or {}
+    etapas = []
+    for (etapa, alvo), (total, soma) in resumo_build().items():
+        total_antes, soma_antes = anterior.get((etapa, alvo), (0, 0.0))
+        if total > total_antes:
+            etapas.append({'etapa': etapa, 'alvo': alvo, 'execucoes': total - total_antes, 'segundos': round(soma - soma_antes, 3)})
+    caminho = os.path.join(diretorio, ARQUIVO_METRICAS_BUILD)
+    with open(caminho + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'etapas': etapas}, f, ensure_ascii=False, indent=1)
+    os.replace(caminho + '.tmp', caminho)
+    return etapas
+
+
+def carregar_metricas_build(diretorio):
+    try:
+        with open(os.path.join(diretorio, ARQUIVO_METRICAS_BUILD), 'r', encoding='utf-8') as f:
+            return json.load(f).get('etapas', [])
+    except (OSError, ValueError):
+        return []
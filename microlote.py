@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import contextvars
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metricas import METRICA_LOTE, REGISTRO
+
+MAX_WORKERS = int(os.environ.get('SCRIPTURA_MAX_WORKERS', min(4, os.cpu_count() or 1)))
+JANELA_MS = float(os.environ.get('SCRIPTURA_LOTE_JANELA_MS', 5))
+MAX_ITENS_LOTE = int(os.environ.get('SCRIPTURA_LOTE_MAX', 32))
+
+# Todo trabalho pesado de CPU (spaCy, encode, varreduras de matriz) roda aqui,
+# fora do event loop, com concorrência limitada.
+EXECUTOR = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='scriptura-cpu')
+
+
+async def executar(funcao, *args, **kwargs):
+    # O contexto é copiado para a thread (como no asyncio.to_thread), para que
+    # as etapas medidas lá sejam atribuídas à requisição que as pediu.
+    loop = asyncio.get_running_loop()
+    contexto = contextvars.copy_context()
+    return await loop.run_in_executor(EXECUTOR, functools.partial(contexto.run, funcao, *args, **kwargs))
+
+
+class MicroLote:
+    # Junta as chamadas concorrentes que chegam dentro de `janela_ms` (ou até
+    # `max_itens`) e as entrega de uma vez a `processar_lote`, que recebe a
+    # lista de itens e devolve a lista de resultados na mesma ordem.
+    def __init__(self, processar_lote, janela_ms=JANELA_MS, max_itens=MAX_ITENS_LOTE, nome='lote'):
+        self.processar_lote = processar_lote
+        self.janela = janela_ms / 1000.0
+        self.max_itens = max_itens
+        self.nome = nome
+        self.lotes_processados = 0
+        self.itens_processados = 0
+        self._pendentes = []
+        self._temporizador = None
+
+    @property
+    def tamanho_medio_lote(self):
+        return self.itens_processados / self.lotes_processados if self.lotes_processados else 0.0
+
+    async def submeter(self, item):
+        loop = asyncio.get_running_loop()
+        futuro = loop.create_future()
+        self._pendentes.append((item, futuro))
+        if len(self._pendentes) >= self.max_itens:
+            self._disparar()
+        elif self._temporizador is None:
+            self._temporizador = loop.call_later(self.janela, self._disparar)
+        return await futuro
+
+    def _disparar(self):
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+        lote, self._pendentes = self._pendentes, []
+        if lote:
+            asyncio.get_running_loop().create_task(self._processar(lote))
+
+    async def _processar(self, lote):
+        itens = [item for item, _ in lote]
+        inicio = time.perf_counter()
+        try:
+            resultados = await executar(self.processar_lote, itens)
+        except Exception as e:
+            for _, futuro in lote:
+                if not futuro.done():
+                    futuro.set_exception(e)
+            return
+
+        REGISTRO.observar(METRICA_LOTE, time.perf_counter() - inicio, lote=self.nome)
+        self.lotes_processados += 1
+        self.itens_processados += len(lote)
+        for (_, futuro), resultado in zip(lote, resultados):
+            if not futuro.done():
+                futuro.set_result(resultado)
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from cache_consultas import CacheLRU
+
+TTL_RANKINGS = float(os.environ.get('SCRIPTURA_RANKING_TTL', 300))
+MAX_MB_RANKINGS = float(os.environ.get('SCRIPTURA_CACHE_RANKINGS_MB', 32))
+
+# Quanto do ranking fica guardado para as páginas seguintes: os mesmos tetos
+# aceitos por `limite_livros` e `limite_chunks_por_livro`.
+MAX_LIVROS_RANKING = 50
+MAX_CHUNKS_RANKING = 200
+
+# As respostas compactas e em NDJSON não repetem a obra em cada chunk: a
+# primeira página devolve um `ranking` (o resultado completo da busca, guardado
+# por alguns minutos) e cursores para os próximos livros e para os próximos
+# chunks de cada livro. O ranking guarda o retrato dos índices em que foi
+# calculado; como esse retrato prende a geração inteira na memória, os
+# rankings são descartados quando os índices mudam (recarga ou ingestão), e
+# os cursores deles passam a responder que o ranking expirou.
+
+
+class RankingTema:
+    def __init__(self, atual, livros, inicios, linhas, fusao, vetor, bm25):
+        self.atual = atual
+        self.livros = livros
+        self.inicios = inicios
+        self.linhas = linhas
+        self.fusao = fusao
+        self.vetor = vetor
+        self.bm25 = bm25
+
+    @classmethod
+    def montar(cls, atual, livros_selecionados, fusao, vetor, bm25):
+        # Achata (id_livro, linhas) em arrays: linhas[inicios[p]:inicios[p+1]]
+        # são os chunks do p-ésimo livro, já em ordem de score.
+        livros = np.array([id_livro for id_livro, _ in livros_selecionados], dtype=np.int64)
+        tamanhos = [len(linhas) for _, linhas in livros_selecionados]
+        inicios = np.concatenate([[0], np.cumsum(tamanhos)]).astype(np.int64)
+        if livros_selecionados:
+            linhas = np.concatenate([linhas for _, linhas in livros_selecionados]).astype(np.int64)
+        else:
+            linhas = np.empty(0, dtype=np.int64)
+        return cls(
+            atual, livros, inicios, linhas,
+            fusao[linhas], vetor[linhas], bm25[linhas],
+        )
+
+    def __len__(self):
+        return len(self.livros)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.livros, self.inicios, self.linhas, self.fusao, self.vetor, self.bm25))
+
+    def posicao(self, id_livro):
+        encontrados = np.flatnonzero(self.livros == id_livro)
+        return int(encontrados[0]) if len(encontrados) else None
+
+    def total_chunks(self, posicao):
+        return int(self.inicios[posicao + 1] - self.inicios[posicao])
+
+    def chunks(self, posicao, inicio, limite):
+        id_livro = int(self.livros[posicao])
+        de = int(self.inicios[posicao]) + inicio
+        ate = min(de + limite, int(self.inicios[posicao + 1]))
+        return [
+            {
+                "id_livro": id_livro,
+                "texto": self.atual.index_TEMA.texto(int(linha)),
+                "fusao": round(float(fusao), 6),
+                "vetor": round(float(vetor), 6),
+                "bm25": round(float(bm25), 6),
+            }
+            for linha, fusao, vetor, bm25 in zip(self.linhas[de:ate], self.fusao[de:ate], self.vetor[de:ate], self.bm25[de:ate])
+        ]
+
+
+class RankingsTema:
+    def __init__(self, max_bytes, ttl=TTL_RANKINGS):
+        self.cache = CacheLRU(max_bytes, ttl, nome='rankings_tema')
+
+    @staticmethod
+    def identificador(texto_normalizado, versao_indices, versao_metadados):
+        chave = json.dumps([texto_normalizado, versao_indices, versao_metadados], ensure_ascii=False)
+        return hashlib.sha1(chave.encode('utf-8')).hexdigest()[:20]
+
+    def obter(self, identificador):
+        return self.cache.obter(identificador)
+
+    def guardar(self, identificador, ranking):
+        self.cache.guardar(identificador, ranking, ranking.nbytes)
+
+    def limpar(self):
+        self.cache.limpar()
+
+
+# --- Cursores: "<ranking>.l.<inicio>.<livros>.<chunks>" (próximos livros) e
+# "<ranking>.c.<id_livro>.<inicio>.<chunks>" (próximos chunks de um livro).
+
+def cursor_livros(identificador, inicio, limite_livros, limite_chunks):
+    return f"{identificador}.l.{inicio}.{limite_livros}.{limite_chunks}"
+
+
+def cursor_chunks(identificador, id_livro, inicio, limite_chunks):
+    return f"{identificador}.c.{id_livro}.{inicio}.{limite_chunks}"
+
+
+def ler_cursor(cursor):
+    partes = cursor.split('.')
+    if len(partes) != 5 or partes[1] not in ('l', 'c'):
+        raise ValueError("Cursor inválido.")
+    try:
+        numeros = [int(p) for p in partes[2:]]
+    except ValueError:
+        raise ValueError("Cursor inválido.") from None
+    if min(numeros) < 0 or numeros[2] < 1 or (partes[1] == 'l' and numeros[1] < 1):
+        raise ValueError("Cursor inválido.")
+    # Os cursores chegam do cliente: os limites valem o mesmo que na busca.
+    numeros[2] = min(numeros[2], MAX_CHUNKS_RANKING)
+    if partes[1] == 'l':
+        numeros[1] = min(numeros[1], MAX_LIVROS_RANKING)
+    return partes[0], partes[1], numeros
+
+
+# --- Páginas ------------------------------------------------------------------
+
+# `obra_de(id_livro)` devolve os campos públicos da obra, ou None se ela saiu
+# do acervo depois da busca.
+
+def pagina_livros(ranking, identificador, obra_de, inicio, limite_livros, limite_chunks):
+    obras_pagina, chunks, proximos_chunks = [], [], {}
+    fim = min(inicio + limite_livros, len(ranking))
+    for posicao in range(inicio, fim):
+        id_livro = int(ranking.livros[posicao])
+        obra = obra_de(id_livro)
+        if obra is None:
+            continue
+        obras_pagina.append(obra)
+        chunks.extend(ranking.chunks(posicao, 0, limite_chunks))
+        if ranking.total_chunks(posicao) > limite_chunks:
+            proximos_chunks[str(id_livro)] = cursor_chunks(identificador, id_livro, limite_chunks, limite_chunks)
+    return {
+        "ranking": identificador,
+        "obras": obras_pagina,
+        "chunks": chunks,
+        "proximos_chunks": proximos_chunks,
+        "proximo": cursor_livros(identificador, fim, limite_livros, limite_chunks) if fim < len(ranking) else None,
+    }
+
+
+def pagina_chunks(ranking, identificador, obra_de, id_livro, inicio, limite_chunks):
+    posicao = ranking.posicao(id_livro)
+    obra = obra_de(id_livro) if posicao is not None else None
+    if obra is None:
+        raise KeyError(id_livro)
+    proximo = None
+    if ranking.total_chunks(posicao) > inicio + limite_chunks:
+        proximo = cursor_chunks(identificador, id_livro, inicio + limite_chunks, limite_chunks)
+    return {
+        "ranking": identificador,
+        "obras": [obra],
+        "chunks": ranking.chunks(posicao, inicio, limite_chunks),
+        "proximos_chunks": {str(id_livro): proximo} if proximo else {},
+        "proximo": None,
+    }
+
+
+def linhas_ndjson(ranking, identificador, obra_de, limite_livros, limite_chunks):
+    # Uma linha de cabeçalho e uma por livro, montadas sob demanda: o cliente
+    # desenha o primeiro livro antes de os textos dos outros serem lidos.
+    def linha(objeto):
+        return json.dumps(objeto, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+    fim = min(limite_livros, len(ranking))
+    yield linha({
+        "ranking": identificador,
+        "proximo": cursor_livros(identificador, fim, limite_livros, limite_chunks) if fim < len(ranking) else None,
+    })
+    for posicao in range(fim):
+        id_livro = int(ranking.livros[posicao])
+        obra = obra_de(id_livro)
+        if obra is None:
+            continue
+        proximo = None
+        if ranking.total_chunks(posicao) > limite_chunks:
+            proximo = cursor_chunks(identificador, id_livro, limite_chunks, limite_chunks)
+        yield linha({"obra": obra, "chunks": ranking.chunks(posicao, 0, limite_chunks), "proximo_chunk": proximo})
@@ -0,0 +1,465 @@
+# -*- coding: utf-8 -*-
+
+import glob
+import math
+import os
+import re
+import shutil
+import sqlite3
+import string
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from armazenamento_vetores import salvar_matriz_vetores
+from cache_embeddings import CacheEmbeddings, DB_CACHE_EMBEDDINGS
+from geracoes import criar_geracao, diretorio_atual, geracao_atual, herdar_arquivos, publicar_geracao
+from indice_ann import construir_indice_ivf
+from indice_bm25 import construir_indice_bm25
+from indice_colunar import ConstrutorIndiceColunar
+from indice_fts import ARQUIVO_FTS, BACKEND_BM25, construir_indice_fts
+from metricas import METRICA_ETAPA_BUILD, REGISTRO, medir_build, resumo_build, salvar_metricas_build
+from quantizacao import QUANTIZACAO, quantizar_e_salvar
+from segmentos import SegmentosLivros, assinatura_configuracao, hash_arquivo
+from shards import SHARDS, particionar_por_livro, salvar_particao
+
+DB_PATH = 'literatura.db'
+
+JUNK_KEYWORDS = [
+    '(cid:', 'www.', 'http:', 'https:', '.br', '.com', '.org', '.pdf',
+    'bibvirt', 'ciberfil', 'hpg.ig.com.br', 'nead', 'unama',
+    'adobe acrobat', 'e-mail:', 'email:', 'digitalizado por:',
+    'isbn:', 'cep:', 'alcindo cacela', 'série bom livro', 'usp.br',
+    'ministério da cultura', 'biblioteca nacional', 'departamento nacional do livro'
+]
+
+RE_CONTROLE_INVISIVEL = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]')
+
+NOME_MODELO = 'paraphrase-multilingual-MiniLM-L12-v2'
+EMBEDDINGS_DTYPE = os.environ.get('SCRIPTURA_EMBEDDINGS_DTYPE', 'float32')
+# Cada processo de segmentação carrega o próprio spaCy (~500 MB).
+PROCESSOS = int(os.environ.get('SCRIPTURA_BUILD_PROCESSOS', min(os.cpu_count() or 1, 4)))
+
+MANUAL_BATCH_SIZE = 512
+MAX_CHUNK_LENGTH = 10000
+MIN_CHUNK_LENGTH_TRECHO = 10
+MIN_CHUNK_LENGTH_TEMA = 100
+
+CHUNK_SIZE = 5
+CHUNK_STEP = 3
+
+ARQUIVOS_LEGADOS = {
+    'TRECHO': ['embeddings.pkl', 'ids_documentos.pkl', 'embeddings_TRECHO.pkl', 'index_TRECHO.pkl'],
+    'TEMA': ['embeddings_CONTEXTO.pkl', 'ids_documentos_CONTEXTO.pkl', 'embeddings_TEMA.pkl', 'index_TEMA.pkl'],
+}
+
+ARQUIVOS_LAYOUT_ANTIGO = [
+    'embeddings_TRECHO.vec', 'index_TRECHO_*.npy', 'ivf_TRECHO.npz',
+    'embeddings_TEMA.vec', 'index_TEMA_*.npy', 'bm25_TEMA_*.npy', 'bm25_TEMA_vocab.json', 'fts_TEMA.db',
+]
+
+NLP = None
+MODEL = None
+CACHE_EMBEDDINGS = None
+
+
+def carregar_nlp():
+    global NLP
+    if NLP is None:
+        import spacy
+        NLP = spacy.load('pt_core_news_lg', disable=['parser', 'ner', 'tagger'])
+        NLP.max_length = 5000000
+        NLP.add_pipe('sentencizer')
+    return NLP
+
+
+def carregar_modelo():
+    global MODEL
+    if MODEL is None:
+        # Importado aqui para que os processos de segmentação (spawn no Windows)
+        # não precisem carregar o torch.
+        from sentence_transformers import SentenceTransformer
+        print("Carregando modelo SentenceTransformer (MiniLM)...")
+        MODEL = SentenceTransformer(NOME_MODELO)
+    return MODEL
+
+
+def ler_texto_livro(caminho_arquivo):
+    try:
+        with open(caminho_arquivo, 'r', encoding='utf-8') as f:
+            return f.read()
+    except UnicodeDecodeError:
+        print(f"    AVISO: Falha no UTF-8. Tentando como 'latin-1'...")
+        with open(caminho_arquivo, 'r', encoding='latin-1') as f:
+            return f.read()
+
+
+def limpar_texto(texto_original):
+    texto_limpo = RE_CONTROLE_INVISIVEL.sub('', texto_original)
+    texto_limpo = texto_limpo.lstrip(string.whitespace + '\x0c')
+    return re.sub(r'(\n|\s){2,}', ' \n', texto_limpo)
+
+
+def segmentar_livro(livro):
+    # None quando a segmentação falha (e não um livro sem frases): quem chama não
+    # grava segmento para o livro, que é tentado de novo no próximo build.
+    livro_id, caminho_arquivo, titulo = livro
+    nlp = carregar_nlp()
+    print(f"  Segmentando: {titulo} (ID: {livro_id})", flush=True)
+    try:
+        doc_spacy = nlp(limpar_texto(ler_texto_livro(caminho_arquivo)))
+        return [re.sub(r'\s+', ' ', s.text).strip() for s in doc_spacy.sents if s.text.strip()]
+    except FileNotFoundError:
+        print(f"    AVISO: Arquivo '{caminho_arquivo}' não foi encontrado. Pulando.")
+    except Exception as e:
+        print(f"    ERRO: Falha ao processar '{caminho_arquivo}': {e}. Pulando.")
+    return None
+
+
+def segmentar_livros(livros, processos=PROCESSOS):
+    # Devolve (livro, frases) na ordem de `livros`. Com mais de um processo, os
+    # livros seguintes são segmentados enquanto o chamador vetoriza os anteriores.
+    if processos <= 1 or len(livros) <= 1:
+        for livro in livros:
+            yield livro, segmentar_livro(livro)
+        return
+    with ProcessPoolExecutor(max_workers=min(processos, len(livros))) as executor:
+        yield from zip(livros, executor.map(segmentar_livro, livros))
+
+
+def filtrar_chunks(livro_id, chunks, min_chunk_length):
+    index_data_livro = ConstrutorIndiceColunar()
+    chunks_descartados_lixo = 0
+    chunks_descartados_veneno = 0
+    chunks_descartados_curtos = 0
+
+    for chunk_texto_original in chunks:
+        if len(chunk_texto_original) > MAX_CHUNK_LENGTH:
+            chunks_descartados_veneno += 1
+            continue
+        if len(chunk_texto_original) < min_chunk_length:
+            chunks_descartados_curtos += 1
+            continue
+
+        chunk_texto_lower = chunk_texto_original.lower()
+        is_junk = any(keyword.lower() in chunk_texto_lower for keyword in JUNK_KEYWORDS)
+
+        if is_junk:
+            chunks_descartados_lixo += 1
+        else:
+            index_data_livro.adicionar(livro_id, chunk_texto_original)
+
+    return index_data_livro.construir(), chunks_descartados_lixo, chunks_descartados_veneno, chunks_descartados_curtos
+
+
+def fatiar_trechos(livro_id, frases):
+    return filtrar_chunks(livro_id, frases, MIN_CHUNK_LENGTH_TRECHO)
+
+
+def fatiar_temas(livro_id, frases):
+    janelas = [
+        " ".join(frases[i : i + CHUNK_SIZE])
+        for i in range(0, len(frases) - CHUNK_SIZE + 1, CHUNK_STEP)
+    ]
+    return filtrar_chunks(livro_id, janelas, MIN_CHUNK_LENGTH_TEMA)
+
+
+def carregar_cache_embeddings():
+    global CACHE_EMBEDDINGS
+    if CACHE_EMBEDDINGS is None and DB_CACHE_EMBEDDINGS:
+        CACHE_EMBEDDINGS = CacheEmbeddings(DB_CACHE_EMBEDDINGS, NOME_MODELO)
+    return CACHE_EMBEDDINGS
+
+
+def codificar_lote(batch_chunks):
+    try:
+        return carregar_modelo().encode(batch_chunks, show_progress_bar=False)
+    except Exception as e:
+        print(f"    ERRO: Falha ao processar um lote de {len(batch_chunks)} chunks: {e}")
+        return None
+
+
+def gerar_embeddings_em_lotes(chunks_de_texto_puro):
+    print(f"\nGerando vetores semânticos para {len(chunks_de_texto_puro)} chunks em batches...")
+    cache = carregar_cache_embeddings()
+    if cache is not None:
+        return cache.codificar(chunks_de_texto_puro, codificar_lote, MANUAL_BATCH_SIZE)
+
+    all_embeddings = []
+    total_batches = math.ceil(len(chunks_de_texto_puro) / MANUAL_BATCH_SIZE)
+    for i in range(0, len(chunks_de_texto_puro), MANUAL_BATCH_SIZE):
+        batch_num = (i // MANUAL_BATCH_SIZE) + 1
+        print(f"  Processando lote {batch_num}/{total_batches}...")
+        batch_embeddings = codificar_lote(chunks_de_texto_puro[i : i + MANUAL_BATCH_SIZE])
+        if batch_embeddings is None:
+            # Pular o lote desalinharia os vetores de todos os chunks seguintes.
+            raise RuntimeError(f"o lote {batch_num}/{total_batches} não foi vetorizado")
+        all_embeddings.append(batch_embeddings)
+    print("\nProcessamento de lotes concluído. Juntando os resultados...")
+    return np.vstack(all_embeddings)
+
+
+def salvar_particao_shards(diretorio, sufixo, all_index_data):
+    if SHARDS > 1:
+        limites = particionar_por_livro(all_index_data.ids_livro, SHARDS)
+        salvar_particao(diretorio, sufixo, limites, SHARDS)
+        print(f"  {len(limites) - 1} shards de {sufixo} (linhas por shard: {', '.join(str(n) for n in np.diff(limites))}).")
+
+
+def finalizar_trecho(diretorio, versao, all_index_data, embeddings):
+    print("\nSalvando os novos arquivos de índice de trecho...")
+    with medir_build('gravacao', 'TRECHO'):
+        salvar_matriz_vetores(os.path.join(diretorio, 'embeddings_TRECHO.vec'), embeddings, NOME_MODELO, EMBEDDINGS_DTYPE, versao)
+        all_index_data.salvar(os.path.join(diretorio, 'index_TRECHO'))
+        salvar_particao_shards(diretorio, 'TRECHO', all_index_data)
+
+    print("\nConstruindo índice aproximado (IVF) de trechos...")
+    with medir_build('ivf', 'TRECHO'):
+        indice_ivf = construir_indice_ivf(embeddings)
+        indice_ivf.salvar(os.path.join(diretorio, 'ivf_TRECHO.npz'))
+
+    if QUANTIZACAO:
+        print("\nGerando códigos quantizados de trechos...")
+        with medir_build('quantizacao', 'TRECHO'):
+            quantizar_e_salvar(os.path.join(diretorio, 'quant_TRECHO'), embeddings)
+
+
+def finalizar_tema(diretorio, versao, all_index_data, embeddings):
+    print("\nSalvando os novos arquivos de índice de Temas...")
+    with medir_build('gravacao', 'TEMA'):
+        salvar_matriz_vetores(os.path.join(diretorio, 'embeddings_TEMA.vec'), embeddings, NOME_MODELO, EMBEDDINGS_DTYPE, versao)
+        all_index_data.salvar(os.path.join(diretorio, 'index_TEMA'))
+        salvar_particao_shards(diretorio, 'TEMA', all_index_data)
+
+    print("\nConstruindo índice invertido BM25 (Keywords) para Temas...")
+    with medir_build('bm25', 'TEMA'):
+        indice_bm25 = construir_indice_bm25(all_index_data.textos())
+        indice_bm25.salvar(os.path.join(diretorio, 'bm25_TEMA'))
+    print(f"  {len(indice_bm25.vocabulario)} termos, {len(indice_bm25.docs)} postings.")
+
+    if BACKEND_BM25 == 'fts5':
+        print("\nConstruindo índice FTS5 (Keywords) para Temas...")
+        with medir_build('fts', 'TEMA'):
+            indice_fts = construir_indice_fts(os.path.join(diretorio, ARQUIVO_FTS), all_index_data.textos())
+        print(f"  {indice_fts.nbytes_disco / 1e6:.1f} MB em disco.")
+
+    if QUANTIZACAO:
+        print("\nGerando códigos quantizados de Temas...")
+        with medir_build('quantizacao', 'TEMA'):
+            quantizar_e_salvar(os.path.join(diretorio, 'quant_TEMA'), embeddings)
+
+
+class AlvoIndice:
+    def __init__(self, nome, fatiar, finalizar, *configuracao):
+        self.nome = nome
+        self.fatiar = fatiar
+        self.finalizar = finalizar
+        self.segmentos = SegmentosLivros(f'segmentos_{nome}', assinatura_configuracao(NOME_MODELO, *configuracao))
+        self.totais = {'retidos': 0, 'lixo': 0, 'veneno': 0, 'curtos': 0}
+        # Livros que falharam neste build: ficam fora da geração e sem segmento novo.
+        self.falhas = set()
+
+    def processar(self, livro_id, hash_txt, frases):
+        with medir_build('fatiamento', self.nome):
+            indice, lixo, veneno, curtos = self.fatiar(livro_id, frases)
+        self.totais['retidos'] += len(indice)
+        self.totais['lixo'] += lixo
+        self.totais['veneno'] += veneno
+        self.totais['curtos'] += curtos
+        if indice:
+            with medir_build('embeddings', self.nome):
+                embeddings = gerar_embeddings_em_lotes(indice.textos())
+        else:
+            embeddings = np.zeros((0, 0), dtype=np.float32)
+        with medir_build('segmento', self.nome):
+            self.segmentos.salvar(livro_id, hash_txt, indice, embeddings)
+        return indice, embeddings
+
+
+def criar_alvo(nome):
+    if nome == 'TRECHO':
+        return AlvoIndice(
+            'TRECHO', fatiar_trechos, finalizar_trecho,
+            MIN_CHUNK_LENGTH_TRECHO, MAX_CHUNK_LENGTH, JUNK_KEYWORDS,
+        )
+    if nome == 'TEMA':
+        return AlvoIndice(
+            'TEMA', fatiar_temas, finalizar_tema,
+            CHUNK_SIZE, CHUNK_STEP, MIN_CHUNK_LENGTH_TEMA, MAX_CHUNK_LENGTH, JUNK_KEYWORDS,
+        )
+    raise ValueError(f"Alvo de índice desconhecido: {nome}")
+
+
+def indexar_livro(livro, nomes_alvos=('TRECHO', 'TEMA')):
+    # Um único livro, fora do build completo (ingestão em segundo plano). Os
+    # segmentos ficam gravados, então o próximo build reaproveita o trabalho.
+    livro_id, caminho_arquivo, titulo = livro
+    hash_txt = hash_arquivo(caminho_arquivo)
+    if hash_txt is None:
+        raise FileNotFoundError(f"Arquivo '{caminho_arquivo}' não foi encontrado.")
+    salvos = segmentos_do_livro(livro, nomes_alvos, hash_txt)
+    if salvos is not None:
+        return salvos
+    with medir_build('segmentacao'):
+        frases = segmentar_livro(livro)
+    if frases is None:
+        raise RuntimeError(f"Falha ao segmentar '{titulo}'.")
+    return {nome: criar_alvo(nome).processar(livro_id, hash_txt, frases) for nome in nomes_alvos}
+
+
+def segmentos_do_livro(livro, nomes_alvos=('TRECHO', 'TEMA'), hash_txt=None):
+    # Os segmentos já gravados do livro, se estiverem em dia com o .txt e com a
+    # configuração de todos os alvos; None se algum precisar ser refeito.
+    livro_id, caminho_arquivo, _ = livro
+    if hash_txt is None:
+        hash_txt = hash_arquivo(caminho_arquivo)
+    if hash_txt is None:
+        return None
+    alvos = [criar_alvo(nome) for nome in nomes_alvos]
+    if not all(alvo.segmentos.atualizado(livro_id, hash_txt) for alvo in alvos):
+        return None
+    return {alvo.nome: alvo.segmentos.carregar(livro_id) for alvo in alvos}
+
+
+def remover_arquivos_legados(nomes_alvos=tuple(ARQUIVOS_LEGADOS)):
+    # Só depois de publicar uma geração: até lá são eles que a API serve.
+    print("Limpando arquivos de índice antigos...")
+    for nome in nomes_alvos:
+        for f in ARQUIVOS_LEGADOS[nome]:
+            if os.path.exists(f):
+                os.remove(f)
+
+
+def remover_layout_antigo():
+    # Depois que existe uma geração publicada, a API não lê mais os índices
+    # soltos na raiz do projeto.
+    for padrao in ARQUIVOS_LAYOUT_ANTIGO:
+        for f in glob.glob(padrao):
+            try:
+                os.remove(f)
+            except OSError as e:
+                print(f"  AVISO: Não foi possível remover '{f}': {e}")
+
+
+def carregar_livros_aprovados():
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, caminho_arquivo, titulo FROM livros WHERE status = 'PROCESSADO'")
+        livros = cursor.fetchall()
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"ERRO: Banco de dados '{DB_PATH}' não encontrado. Execute 'scripts_db.py' primeiro.")
+        return []
+    if not livros:
+        print(f"ERRO: O banco de dados '{DB_PATH}' está vazio. Execute 'scripts_db.py' primeiro.")
+    return livros
+
+
+def rodar_pipeline(nomes_alvos=('TRECHO', 'TEMA'), reconstruir_tudo=False, processos=PROCESSOS):
+    livros = carregar_livros_aprovados()
+    if not livros:
+        return False
+    metricas_anteriores = resumo_build()
+
+    faltantes = [nome for nome in ARQUIVOS_LEGADOS if nome not in nomes_alvos]
+    if faltantes and geracao_atual() is None:
+        # Primeira geração: não há de onde herdar os alvos que este build não
+        # refaria (os índices soltos na raiz são de outro formato).
+        print(f"AVISO: Ainda não existe geração publicada; {', '.join(faltantes)} também será gerado.")
+        nomes_alvos = list(nomes_alvos) + faltantes
+
+    alvos = [criar_alvo(nome) for nome in nomes_alvos]
+    if reconstruir_tudo:
+        print("Descartando todos os segmentos existentes (reconstrução completa)...")
+        for alvo in alvos:
+            alvo.segmentos.limpar()
+
+    hashes = {}
+    for livro_id, caminho_arquivo, titulo in livros:
+        hash_txt = hash_arquivo(caminho_arquivo)
+        if hash_txt is None:
+            print(f"  AVISO: Arquivo '{caminho_arquivo}' não foi encontrado. Pulando '{titulo}'.")
+            continue
+        hashes[livro_id] = hash_txt
+
+    pendentes = [
+        livro for livro in livros
+        if livro[0] in hashes and any(not alvo.segmentos.atualizado(livro[0], hashes[livro[0]]) for alvo in alvos)
+    ]
+    print(f"\n{len(pendentes)} de {len(hashes)} obras precisam ser (re)processadas "
+          f"({', '.join(nomes_alvos)}; {min(processos, max(len(pendentes), 1))} processo(s) de segmentação)...")
+
+    if pendentes:
+        try:
+            # Falha aqui, antes de começar, e não no primeiro livro de cada processo.
+            carregar_nlp()
+        except OSError:
+            print("ERRO: Modelo 'pt_core_news_lg' do spaCy não encontrado.")
+            return False
+
+    # Com vários processos, conta só o tempo em que o laço esperou pelo
+    # próximo livro segmentado.
+    inicio = time.perf_counter()
+    for (livro_id, _, titulo), frases in segmentar_livros(pendentes, processos):
+        REGISTRO.observar(METRICA_ETAPA_BUILD, time.perf_counter() - inicio, etapa='segmentacao', alvo='')
+        if frases is not None and not frases:
+            print(f"    Aviso: Livro '{titulo}' é muito curto, pulando.")
+        for alvo in alvos:
+            if alvo.segmentos.atualizado(livro_id, hashes[livro_id]):
+                continue
+            if frases is None:
+                alvo.falhas.add(livro_id)
+                continue
+            try:
+                alvo.processar(livro_id, hashes[livro_id], frases)
+            except RuntimeError as e:
+                print(f"    ERRO: Falha ao vetorizar '{titulo}' ({alvo.nome}): {e}. Pulando.")
+                alvo.falhas.add(livro_id)
+        inicio = time.perf_counter()
+
+    versao, diretorio = criar_geracao()
+    concluido = True
+    for alvo in alvos:
+        removidos = alvo.segmentos.remover_ausentes(hashes)
+        with medir_build('juntar_segmentos', alvo.nome):
+            all_index_data, embeddings = alvo.segmentos.juntar([livro_id for livro_id in hashes if livro_id not in alvo.falhas])
+        print(f"\nFiltro de {alvo.nome} concluído (livros reprocessados nesta execução):")
+        print(f"  {alvo.totais['retidos']} chunks puros retidos.")
+        print(f"  {alvo.totais['lixo']} chunks de lixo descartados.")
+        print(f"  {alvo.totais['veneno']} chunks muito longos descartados.")
+        print(f"  {alvo.totais['curtos']} chunks curtos descartados.")
+        print(f"  {removidos} segmentos de livros fora do acervo removidos.")
+        if alvo.falhas:
+            print(f"  {len(alvo.falhas)} livros com falha ficaram fora desta geração (serão tentados no próximo build).")
+        print(f"  {len(all_index_data)} chunks no índice final.")
+        if not all_index_data:
+            print("\nERRO FATAL: Nenhum chunk puro foi gerado.")
+            concluido = False
+            continue
+        alvo.finalizar(diretorio, versao, all_index_data, embeddings)
+
+    if CACHE_EMBEDDINGS is not None:
+        print(f"\n{CACHE_EMBEDDINGS.resumo()}")
+    etapas = salvar_metricas_build(diretorio, metricas_anteriores)
+    print("\nTempo por etapa:")
+    for etapa in etapas:
+        print(f"  {etapa['etapa']:<18} {etapa['alvo'] or '-':<7} {etapa['segundos']:>9.2f}s ({etapa['execucoes']}x)")
+    if not concluido:
+        print(f"\nERRO: A geração '{versao}' não foi publicada; a API continua com a geração anterior.")
+        shutil.rmtree(diretorio, ignore_errors=True)
+        return False
+
+    outros_alvos = [nome for nome in ARQUIVOS_LEGADOS if nome not in nomes_alvos]
+    if outros_alvos:
+        origem = diretorio_atual()
+        herdados = herdar_arquivos(origem, diretorio, outros_alvos)
+        print(f"\n{herdados} arquivos de {', '.join(outros_alvos)} reaproveitados de '{origem}'.")
+    removidas = publicar_geracao(versao)
+    remover_layout_antigo()
+    remover_arquivos_legados()
+    print(f"\nGeração de índices '{versao}' publicada em '{diretorio}' ({removidas} gerações antigas removidas).")
+    print("A API carrega a nova geração sozinha (ou via POST /admin/recarregar-indices).")
+    print("\n--- Processamento concluído! ---")
+    return True
@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+
+import sys
+from pipeline_corpus import rodar_pipeline
+
+# Gera os índices de trecho e de tema em uma única passada: cada livro é lido e
+# segmentado pelo spaCy uma vez só, e as duas fatias saem da mesma lista de frases.
+if __name__ == '__main__':
+    rodar_pipeline(['TRECHO', 'TEMA'], reconstruir_tudo='--completo' in sys.argv)
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import numpy as np
+
+from armazenamento_vetores import normalizar_linhas, salvar_arrays_npy
+from indice_ann import _top_k, busca_exata
+
+QUANTIZACAO = os.environ.get('SCRIPTURA_QUANTIZACAO', '')
+PQ_SUBESPACOS = int(os.environ.get('SCRIPTURA_PQ_SUBESPACOS', 96))
+FATOR_REFINO = int(os.environ.get('SCRIPTURA_QUANTIZACAO_REFINO', 10))
+REFINO_TEMA = int(os.environ.get('SCRIPTURA_QUANTIZACAO_REFINO_TEMA', 2000))
+
+TIPOS_SUPORTADOS = ('int8', 'pq')
+PQ_CENTROIDES = 256
+AMOSTRAS_POR_CENTROIDE = 64
+ITERACOES_KMEANS = 10
+TAMANHO_BLOCO = 65536
+TAMANHO_BLOCO_PQ = 16384
+# Linhas de códigos int8 convertidas por vez na varredura (~0,75 MB em float32
+# com 384 dimensões, dentro do cache L2).
+BLOCO_VARREDURA = 512
+CONSULTAS_RECALL = 200
+
+# As buscas varrem só os códigos compactos (residentes em RAM) e recalculam o
+# score exato de uma lista curta de candidatas lendo o .vec mapeado em memória,
+# do qual só as páginas dessas linhas chegam a ser lidas.
+
+
+class CodigosInt8:
+    # Quantização escalar simétrica: uma escala por dimensão, código = x / escala
+    # arredondado para int8. 4x menor que float32.
+    tipo = 'int8'
+
+    def __init__(self, codigos, escalas):
+        self.codigos = codigos
+        self.escalas = np.asarray(escalas, dtype=np.float32)
+
+    @classmethod
+    def treinar(cls, matriz):
+        maximos = np.zeros(matriz.shape[1], dtype=np.float32)
+        for inicio in range(0, len(matriz), TAMANHO_BLOCO):
+            bloco = np.asarray(matriz[inicio : inicio + TAMANHO_BLOCO], dtype=np.float32)
+            maximos = np.maximum(maximos, np.abs(bloco).max(axis=0))
+        escalas = maximos / 127.0
+        escalas[escalas == 0] = 1.0
+        return cls(np.empty((0, matriz.shape[1]), dtype=np.int8), escalas)
+
+    def codificar(self, matriz):
+        codigos = np.empty(matriz.shape, dtype=np.int8)
+        for inicio in range(0, len(matriz), TAMANHO_BLOCO):
+            bloco = np.asarray(matriz[inicio : inicio + TAMANHO_BLOCO], dtype=np.float32)
+            codigos[inicio : inicio + len(bloco)] = np.clip(np.rint(bloco / self.escalas), -127, 127)
+        return codigos
+
+    def pontuar_lote(self, vetores):
+        # Os códigos são convertidos para float32 em blocos pequenos, sempre no
+        # mesmo buffer, que fica no cache: da RAM só saem os bytes int8. O NumPy
+        # não tem produto int8 x int8 acelerado (o matmul inteiro é ~10x mais
+        # lento que o de float32), então o int8 economiza memória, não tempo: a
+        # varredura leva o mesmo que a dos vetores em float32.
+        consultas = np.ascontiguousarray(vetores * self.escalas, dtype=np.float32)
+        scores = np.empty((len(vetores), len(self.codigos)), dtype=np.float32)
+        buffer = np.empty((BLOCO_VARREDURA, self.codigos.shape[1]), dtype=np.float32)
+        for inicio in range(0, len(self.codigos), BLOCO_VARREDURA):
+            codigos = self.codigos[inicio : inicio + BLOCO_VARREDURA]
+            bloco = buffer[: len(codigos)]
+            np.copyto(bloco, codigos)
+            np.matmul(consultas, bloco.T, out=scores[:, inicio : inicio + len(codigos)])
+        return scores
+
+    def pontuar_linhas(self, linhas, vetor):
+        return self.codigos[linhas].astype(np.float32) @ (vetor * self.escalas)
+
+    def parametros(self):
+        return {'escalas': self.escalas}
+
+
+class CodigosPQ:
+    # Quantização por produto: a dimensão é dividida em `m` subespaços e cada
+    # pedaço do vetor vira o índice (uint8) do centróide mais próximo daquele
+    # subespaço. Com m=96 e 384 dimensões, 16x menor que float32.
+    tipo = 'pq'
+
+    def __init__(self, codigos, centroides):
+        self.codigos = codigos
+        self.centroides = np.asarray(centroides, dtype=np.float32)
+        m, n_centroides, _ = self.centroides.shape
+        self._deslocamentos = (np.arange(m) * n_centroides).astype(np.int64)
+
+    @classmethod
+    def treinar(cls, matriz, m=PQ_SUBESPACOS, semente=42):
+        dimensao = matriz.shape[1]
+        if dimensao % m:
+            raise ValueError(f"A dimensão {dimensao} não é divisível por {m} subespaços.")
+        rng = np.random.default_rng(semente)
+        n_centroides = min(PQ_CENTROIDES, len(matriz))
+        n_amostra = min(len(matriz), n_centroides * AMOSTRAS_POR_CENTROIDE)
+        amostra = np.asarray(matriz[np.sort(rng.choice(len(matriz), size=n_amostra, replace=False))], dtype=np.float32)
+
+        sub = dimensao // m
+        centroides = np.empty((m, n_centroides, sub), dtype=np.float32)
+        for j in range(m):
+            pedaco = amostra[:, j * sub : (j + 1) * sub]
+            atuais = pedaco[rng.choice(n_amostra, size=n_centroides, replace=False)].copy()
+            for _ in range(ITERACOES_KMEANS):
+                atribuicao = _mais_proximo(pedaco, atuais)
+                somas = np.zeros_like(atuais)
+                np.add.at(somas, atribuicao, pedaco)
+                contagens = np.bincount(atribuicao, minlength=n_centroides)
+                vazias = contagens == 0
+                atuais = np.where(vazias[:, None], atuais, somas / np.maximum(contagens, 1)[:, None])
+            centroides[j] = atuais
+        return cls(np.empty((0, m), dtype=np.uint8), centroides)
+
+    def codificar(self, matriz):
+        m, _, sub = self.centroides.shape
+        codigos = np.empty((len(matriz), m), dtype=np.uint8)
+        for inicio in range(0, len(matriz), TAMANHO_BLOCO):
+            bloco = np.asarray(matriz[inicio : inicio + TAMANHO_BLOCO], dtype=np.float32)
+            for j in range(m):
+                codigos[inicio : inicio + len(bloco), j] = _mais_proximo(bloco[:, j * sub : (j + 1) * sub], self.centroides[j])
+        return codigos
+
+    def _tabela(self, vetor):
+        # Produto escalar do pedaço j da consulta com cada centróide do
+        # subespaço j; o score aproximado de uma linha é a soma de m entradas.
+        m, _, sub = self.centroides.shape
+        return np.einsum('md,mkd->mk', vetor.reshape(m, sub), self.centroides).ravel()
+
+    def _somar(self, tabela, codigos):
+        return tabela[codigos.astype(np.int64) + self._deslocamentos].sum(axis=1)
+
+    def pontuar_lote(self, vetores):
+        scores = np.empty((len(vetores), len(self.codigos)), dtype=np.float32)
+        for i, vetor in enumerate(vetores):
+            tabela = self._tabela(vetor)
+            for inicio in range(0, len(self.codigos), TAMANHO_BLOCO_PQ):
+                bloco = self.codigos[inicio : inicio + TAMANHO_BLOCO_PQ]
+                scores[i, inicio : inicio + len(bloco)] = self._somar(tabela, bloco)
+        return scores
+
+    def pontuar_linhas(self, linhas, vetor):
+        return self._somar(self._tabela(vetor), self.codigos[linhas]).astype(np.float32)
+
+    def parametros(self):
+        return {'centroides': self.centroides}
+
+
+def _mais_proximo(pontos, centroides):
+    # argmin de ||p - c||² = argmin de ||c||² - 2 p·c
+    return np.argmin((centroides ** 2).sum(axis=1) - 2.0 * (pontos @ centroides.T), axis=1)
+
+
+TIPOS = {CodigosInt8.tipo: CodigosInt8, CodigosPQ.tipo: CodigosPQ}
+
+
+def treinar_quantizador(matriz, tipo):
+    if tipo not in TIPOS:
+        raise ValueError(f"Quantização '{tipo}' não suportada. Use um de {TIPOS_SUPORTADOS}.")
+    quantizador = TIPOS[tipo].treinar(matriz)
+    quantizador.codigos = quantizador.codificar(matriz)
+    return quantizador
+
+
+def com_linhas(quantizador, novas_linhas):
+    # Linhas ingeridas depois do build usam as escalas/centróides já treinados.
+    codigos = np.concatenate([quantizador.codigos, quantizador.codificar(novas_linhas)])
+    return TIPOS[quantizador.tipo](codigos, **quantizador.parametros())
+
+
+def salvar_quantizador(prefixo, quantizador):
+    salvar_arrays_npy(prefixo, {'codigos': np.ascontiguousarray(quantizador.codigos)})
+    with open(prefixo + '.npz.tmp', 'wb') as f:
+        np.savez(f, tipo=np.array(quantizador.tipo), **quantizador.parametros())
+    os.replace(prefixo + '.npz.tmp', prefixo + '.npz')
+
+
+def carregar_quantizador(prefixo):
+    # Os códigos são lidos inteiros para a RAM: são eles que as buscas varrem.
+    with np.load(prefixo + '.npz') as dados:
+        tipo = str(dados['tipo'])
+        parametros = {nome: dados[nome] for nome in dados.files if nome != 'tipo'}
+    return TIPOS[tipo](np.load(f'{prefixo}_codigos.npy'), **parametros)
+
+
+def refinar(matriz, candidatas, vetor, k):
+    candidatas = np.sort(candidatas)
+    exatos = np.asarray(matriz[candidatas], dtype=np.float32) @ vetor
+    top = _top_k(exatos, k)
+    return candidatas[top], exatos[top]
+
+
+def buscar_lote_refinando(quantizador, matriz, vetores, k, fator=FATOR_REFINO):
+    vetores = normalizar_linhas(np.atleast_2d(vetores))
+    n_candidatas = min(max(k * fator, k), len(matriz))
+    resultados = []
+    for vetor, scores in zip(vetores, quantizador.pontuar_lote(vetores)):
+        resultados.append(refinar(matriz, _top_k(scores, n_candidatas), vetor, k))
+    return resultados
+
+
+def pontuar_lote_refinando(quantizador, matriz, vetores, n_refino=REFINO_TEMA):
+    # Para o tema, que precisa do score de todas as linhas (fusão com o BM25),
+    # os scores aproximados das `n_refino` melhores linhas são trocados pelos
+    # exatos; o erro das demais é da ordem de 1e-3.
+    vetores = normalizar_linhas(np.atleast_2d(vetores))
+    scores = quantizador.pontuar_lote(vetores)
+    for vetor, linha_scores in zip(vetores, scores):
+        candidatas = np.sort(_top_k(linha_scores, min(n_refino, len(matriz))))
+        linha_scores[candidatas] = np.asarray(matriz[candidatas], dtype=np.float32) @ vetor
+    return scores
+
+
+def medir_recall(quantizador, matriz, k=10, n_consultas=CONSULTAS_RECALL, fator=FATOR_REFINO, semente=7):
+    # Consultas sintéticas: a média normalizada de duas linhas sorteadas do
+    # próprio índice. Compara o top-k exato com o aproximado e com o refinado.
+    rng = np.random.default_rng(semente)
+    pares = rng.choice(len(matriz), size=(min(n_consultas, len(matriz)), 2))
+    consultas = normalizar_linhas(
+        np.asarray(matriz[pares[:, 0]], dtype=np.float32) + np.asarray(matriz[pares[:, 1]], dtype=np.float32)
+    )
+    acertos_aprox = acertos_refinado = 0
+    aproximados = quantizador.pontuar_lote(consultas)
+    for consulta, scores_aprox in zip(consultas, aproximados):
+        exatos = set(busca_exata(matriz, consulta, k)[0].tolist())
+        acertos_aprox += len(exatos & set(_top_k(scores_aprox, k).tolist()))
+        candidatas = _top_k(scores_aprox, min(max(k * fator, k), len(matriz)))
+        acertos_refinado += len(exatos & set(refinar(matriz, candidatas, consulta, k)[0].tolist()))
+    total = max(len(consultas) * min(k, len(matriz)), 1)
+    return acertos_aprox / total, acertos_refinado / total
+
+
+def quantizar_e_salvar(prefixo, embeddings, tipo=QUANTIZACAO):
+    matriz = normalizar_linhas(embeddings)
+    print(f"  Quantizando {len(matriz)} vetores ({tipo})...")
+    try:
+        quantizador = treinar_quantizador(matriz, tipo)
+    except ValueError as e:
+        print(f"  ERRO: {e} Os códigos não foram gerados; a API usará os vetores completos.")
+        return None
+    salvar_quantizador(prefixo, quantizador)
+    recall_aprox, recall_refinado = medir_recall(quantizador, matriz)
+    print(f"  {matriz.nbytes / 1e6:.1f} MB em float32 -> {quantizador.codigos.nbytes / 1e6:.1f} MB de códigos "
+          f"({matriz.nbytes / max(quantizador.codigos.nbytes, 1):.0f}x). "
+          f"recall@10: {recall_aprox:.3f} só com os códigos, {recall_refinado:.3f} refinando {FATOR_REFINO}x.")
+    return quantizador
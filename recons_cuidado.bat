@@ -20,12 +20,8 @@ echo 3. Convertendo PDFs base...
 python auto_converter.py
 
 echo.
-echo 4. Processando IA (Trechos)...
-python processar_textos.py
-
-echo.
-echo 5. Processando IA (Temas)...
-python processar_temas.py
+echo 4. Processando IA (Trechos e Temas)...
+python processar_indices.py --completo
 
 echo.
 echo =================================================================
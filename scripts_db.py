@@ -1,5 +1,6 @@
 import sqlite3
 import os
+from cache_metadados import garantir_contador_versao
 
 DB_NAME = 'literatura.db'
 
@@ -75,6 +76,7 @@ def criar_e_popular_banco():
         cursor = conn.cursor()
         cursor.executescript(SQL_SCRIPT)
         conn.commit()
+        garantir_contador_versao(conn)
         print(f"Banco de dados '{DB_NAME}' criado e populado com sucesso.")
     except sqlite3.Error as e:
         print(f"Ocorreu um erro ao criar o banco de dados: {e}")
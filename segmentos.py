@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import shutil
+
+import numpy as np
+
+from indice_colunar import IndiceColunar
+
+
+def hash_arquivo(caminho):
+    sha = hashlib.sha256()
+    try:
+        with open(caminho, 'rb') as f:
+            for bloco in iter(lambda: f.read(1 << 20), b''):
+                sha.update(bloco)
+    except FileNotFoundError:
+        return None
+    return sha.hexdigest()
+
+
+def assinatura_configuracao(*partes):
+    return hashlib.sha256(repr(partes).encode('utf-8')).hexdigest()[:16]
+
+
+class SegmentosLivros:
+    # Um segmento por livro (`livro_<id>.npz`) com o índice colunar e os vetores
+    # daquele livro. A chave guarda o hash do .txt e a assinatura da configuração
+    # de fatiamento/modelo: se qualquer um mudar, o livro é reprocessado.
+    def __init__(self, diretorio, assinatura):
+        self.diretorio = diretorio
+        self.assinatura = assinatura
+        os.makedirs(diretorio, exist_ok=True)
+
+    def caminho(self, livro_id):
+        return os.path.join(self.diretorio, f'livro_{livro_id}.npz')
+
+    def ids_salvos(self):
+        ids = []
+        for nome in os.listdir(self.diretorio):
+            if nome.startswith('livro_') and nome.endswith('.npz'):
+                ids.append(int(nome[len('livro_'):-len('.npz')]))
+        return sorted(ids)
+
+    def chave(self, hash_txt):
+        return f'{hash_txt}:{self.assinatura}'
+
+    def chave_salva(self, livro_id):
+        try:
+            with np.load(self.caminho(livro_id)) as dados:
+                return str(dados['chave'])
+        except (FileNotFoundError, KeyError, ValueError, OSError):
+            return None
+
+    def carregar(self, livro_id):
+        with np.load(self.caminho(livro_id)) as dados:
+            indice = IndiceColunar(dados['ids'], dados['offsets'], dados['textos'].tobytes())
+            return indice, dados['embeddings']
+
+    def salvar(self, livro_id, hash_txt, indice, embeddings):
+        if len(indice) and len(embeddings) != len(indice):
+            raise ValueError(f"Livro {livro_id}: {len(embeddings)} vetores para {len(indice)} chunks.")
+        caminho = self.caminho(livro_id)
+        with open(caminho + '.tmp', 'wb') as f:
+            np.savez(
+                f,
+                chave=np.array(self.chave(hash_txt)),
+                ids=indice.ids_livro,
+                offsets=indice.offsets,
+                textos=np.frombuffer(bytes(indice.blob), dtype=np.uint8),
+                embeddings=np.asarray(embeddings, dtype=np.float32),
+            )
+        os.replace(caminho + '.tmp', caminho)
+
+    def remover(self, livro_id):
+        if os.path.exists(self.caminho(livro_id)):
+            os.remove(self.caminho(livro_id))
+
+    def limpar(self):
+        shutil.rmtree(self.diretorio, ignore_errors=True)
+        os.makedirs(self.diretorio, exist_ok=True)
+
+    def atualizado(self, livro_id, hash_txt):
+        return self.chave_salva(livro_id) == self.chave(hash_txt)
+
+    def remover_ausentes(self, ids_ativos):
+        removidos = 0
+        for livro_id in set(self.ids_salvos()) - set(ids_ativos):
+            self.remover(livro_id)
+            removidos += 1
+        return removidos
+
+    def juntar(self, ids_livros):
+        indices, matrizes = [], []
+        for livro_id in ids_livros:
+            indice, embeddings = self.carregar(livro_id)
+            if len(indice) and len(embeddings) != len(indice):
+                raise ValueError(f"Segmento '{self.caminho(livro_id)}' com {len(embeddings)} vetores para {len(indice)} chunks.")
+            if len(indice):
+                indices.append(indice)
+                matrizes.append(embeddings)
+        if not indices:
+            return IndiceColunar.vazio(), None
+        return IndiceColunar.concatenar(indices), np.vstack(matrizes)
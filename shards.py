@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import weakref
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+from armazenamento_vetores import carregar_matriz_vetores, similaridade_cosseno_lote
+from mensagens import enviar, receber
+from indice_ann import IndiceIVF, _top_k, busca_exata_lote
+
+SHARDS = int(os.environ.get('SCRIPTURA_SHARDS', 0))
+TIMEOUT_SHARDS = float(os.environ.get('SCRIPTURA_SHARDS_TIMEOUT_S', 600))
+
+# Com SCRIPTURA_SHARDS=K > 1, os builders gravam em `shards_<alvo>.json` os
+# limites de K faixas de linhas, cortadas só entre livros, e a API sobe um
+# processo (`python shards.py ...`) por faixa. Cada processo mapeia o mesmo
+# .vec da geração, mas só lê as suas linhas; a API manda os vetores da busca
+# para todos, junta os top-k (trecho) ou as fatias de scores (tema) e varre
+# ela mesma as linhas ingeridas depois do build. A conversa é por uma
+# `multiprocessing.connection` autenticada (socket unix, ou named pipe no
+# Windows), com as mensagens do daemon (cabeçalho JSON e bytes crus dos
+# arrays, nunca pickle). Com `--endereco host:porta`, o mesmo processo atende
+# por TCP, em outra máquina; como a chave só autentica, esse modo exige uma
+# SCRIPTURA_SHARDS_CHAVE definida à mão e com pelo menos 16 bytes.
+
+MARCADOR_ENDERECO = 'SHARD_ENDERECO '
+
+
+def caminho_particao(diretorio, sufixo):
+    return os.path.join(diretorio, f'shards_{sufixo}.json')
+
+
+def particionar_por_livro(ids_livro, n_shards):
+    # Limites [0, ..., n] de até `n_shards` faixas com ~n/K linhas cada. Os
+    # cortes caem sempre no início de um livro, então cada livro fica inteiro
+    # em um só shard.
+    ids = np.asarray(ids_livro)
+    n = len(ids)
+    if n == 0 or n_shards <= 1:
+        return [0, n]
+    fronteiras = np.concatenate([[0], np.flatnonzero(ids[1:] != ids[:-1]) + 1, [n]])
+    cortes = []
+    for alvo in np.arange(1, n_shards) * n / n_shards:
+        posicao = min(max(int(np.searchsorted(fronteiras, alvo)), 1), len(fronteiras) - 1)
+        antes, depois = fronteiras[posicao - 1], fronteiras[posicao]
+        cortes.append(int(antes if alvo - antes <= depois - alvo else depois))
+    return sorted({0, n, *cortes})
+
+
+def salvar_particao(diretorio, sufixo, limites, n_shards=SHARDS):
+    caminho = caminho_particao(diretorio, sufixo)
+    with open(caminho + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'shards': n_shards, 'limites': [int(l) for l in limites]}, f)
+    os.replace(caminho + '.tmp', caminho)
+
+
+def carregar_particao(diretorio, sufixo, ids_livro, n_shards):
+    try:
+        with open(caminho_particao(diretorio, sufixo), 'r', encoding='utf-8') as f:
+            particao = json.load(f)
+        limites = particao['limites']
+        if limites[-1] == len(ids_livro) and particao['shards'] == n_shards:
+            return limites
+        print(f"AVISO: 'shards_{sufixo}.json' não corresponde ao índice ou a SCRIPTURA_SHARDS. Reparticionando...")
+    except (OSError, ValueError, KeyError, IndexError):
+        pass
+    return particionar_por_livro(ids_livro, n_shards)
+
+
+# --- Processo de um shard -----------------------------------------------------
+
+def restringir_ivf(ivf, inicio, fim):
+    # As mesmas listas, só com as linhas [inicio, fim) (renumeradas a partir
+    # de 0). Com os mesmos centróides e o mesmo n_probe, a união das
+    # candidatas dos shards é a candidata do índice inteiro.
+    manter = (ivf.ordem >= inicio) & (ivf.ordem < fim)
+    listas = np.repeat(np.arange(ivf.n_listas), np.diff(ivf.offsets))[manter]
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(listas, minlength=ivf.n_listas))])
+    return IndiceIVF(ivf.centroides, ivf.ordem[manter] - inicio, offsets)
+
+
+def atender(conexao, caminho_vec, caminho_ivf, inicio, fim):
+    matriz, _ = carregar_matriz_vetores(caminho_vec)
+    embeddings = matriz[inicio:fim]
+    ivf = restringir_ivf(IndiceIVF.carregar(caminho_ivf), inicio, fim) if caminho_ivf else None
+    enviar(conexao, ('ok', fim - inicio))
+    while True:
+        try:
+            operacao, argumentos = receber(conexao)
+        except EOFError:
+            break
+        if operacao == 'encerrar':
+            break
+        try:
+            if operacao == 'trechos':
+                vetores, k, n_probe = argumentos
+                if ivf is not None:
+                    resultados = ivf.buscar_lote(embeddings, vetores, k, n_probe)
+                else:
+                    resultados = busca_exata_lote(embeddings, vetores, k)
+                resposta = [(linhas + inicio, scores) for linhas, scores in resultados]
+            elif operacao == 'temas':
+                resposta = similaridade_cosseno_lote(embeddings, argumentos[0])
+            else:
+                raise ValueError(f"operação desconhecida: {operacao}")
+            enviar(conexao, ('ok', resposta))
+        except Exception as e:
+            enviar(conexao, ('erro', f"{type(e).__name__}: {e}"))
+
+
+def servir():
+    parser = argparse.ArgumentParser(description="Processo de busca de um shard do Scriptura.")
+    parser.add_argument('--vec', required=True, help='embeddings_<alvo>.vec da geração')
+    parser.add_argument('--ivf', help='ivf_<alvo>.npz da geração (só trecho)')
+    parser.add_argument('--inicio', type=int, required=True)
+    parser.add_argument('--fim', type=int, required=True)
+    parser.add_argument('--endereco', help='host:porta para atender por TCP (padrão: socket local)')
+    args = parser.parse_args()
+
+    try:
+        chave = bytes.fromhex(os.environ.get('SCRIPTURA_SHARDS_CHAVE', ''))
+    except ValueError:
+        sys.exit("ERRO: SCRIPTURA_SHARDS_CHAVE deve estar em hexadecimal.")
+    if not chave:
+        sys.exit("ERRO: Defina SCRIPTURA_SHARDS_CHAVE (em hexadecimal) com a chave que a API usa.")
+    if args.endereco and len(chave) < 16:
+        sys.exit("ERRO: Para atender por TCP, defina uma SCRIPTURA_SHARDS_CHAVE com pelo menos 16 bytes (32 dígitos hexadecimais).")
+    if args.endereco:
+        host, porta = args.endereco.rsplit(':', 1)
+        listener = Listener((host, int(porta)), authkey=chave)
+    else:
+        listener = Listener(authkey=chave)
+    print(MARCADOR_ENDERECO + json.dumps(listener.address), flush=True)
+    with listener, listener.accept() as conexao:
+        atender(conexao, args.vec, args.ivf, args.inicio, args.fim)
+
+
+# --- Lado da API --------------------------------------------------------------
+
+def _encerrar(conexoes, processos):
+    for conexao in conexoes:
+        try:
+            enviar(conexao, ('encerrar', None))
+            conexao.close()
+        except OSError:
+            pass
+    for processo in processos:
+        try:
+            processo.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            processo.kill()
+
+
+def _abrir_processo(chave, caminho_vec, caminho_ivf, inicio, fim):
+    comando = [sys.executable, os.path.abspath(__file__), '--vec', caminho_vec, '--inicio', str(inicio), '--fim', str(fim)]
+    if caminho_ivf:
+        comando += ['--ivf', caminho_ivf]
+    ambiente = dict(os.environ, SCRIPTURA_SHARDS_CHAVE=chave.hex())
+    return subprocess.Popen(comando, stdout=subprocess.PIPE, env=ambiente, text=True, encoding='utf-8')
+
+
+def _conectar(processo, chave):
+    linha = processo.stdout.readline()
+    processo.stdout.close()
+    if not linha.startswith(MARCADOR_ENDERECO):
+        raise RuntimeError(f"o processo do shard saiu com código {processo.wait()}")
+    endereco = json.loads(linha[len(MARCADOR_ENDERECO):])
+    return Client(tuple(endereco) if isinstance(endereco, list) else endereco, authkey=chave)
+
+
+class GrupoShards:
+    def __init__(self, sufixo, caminho_vec, caminho_ivf, limites):
+        self.sufixo = sufixo
+        self.limites = limites
+        self.n_linhas = limites[-1]
+        self.ativo = True
+        self._trava = threading.Lock()
+        self.conexoes, self.processos = [], []
+        # Os processos saem junto com o último retrato dos índices que os usa.
+        self._finalizador = weakref.finalize(self, _encerrar, self.conexoes, self.processos)
+
+        chave = os.urandom(16)
+        try:
+            for inicio, fim in zip(limites[:-1], limites[1:]):
+                self.processos.append(_abrir_processo(chave, caminho_vec, caminho_ivf, inicio, fim))
+            for processo in self.processos:
+                self.conexoes.append(_conectar(processo, chave))
+            self._receber_todos()
+        except Exception:
+            self.encerrar()
+            raise
+
+    def __len__(self):
+        return len(self.processos)
+
+    def encerrar(self):
+        self.ativo = False
+        self._finalizador()
+
+    def _receber_todos(self):
+        respostas = []
+        for conexao in self.conexoes:
+            if not conexao.poll(TIMEOUT_SHARDS):
+                raise TimeoutError(f"shard de {self.sufixo} sem resposta em {TIMEOUT_SHARDS:.0f} s")
+            respostas.append(receber(conexao))
+        erros = [valor for status, valor in respostas if status != 'ok']
+        if erros:
+            raise RuntimeError(erros[0])
+        return [valor for _, valor in respostas]
+
+    def _pedir(self, operacao, *argumentos):
+        # Uma busca por vez em todos os shards: os pedidos saem juntos e os
+        # shards trabalham em paralelo. Buscas concorrentes já chegam aqui
+        # juntas, no mesmo micro-lote.
+        with self._trava:
+            if not self.ativo:
+                return None
+            try:
+                for conexao in self.conexoes:
+                    enviar(conexao, (operacao, argumentos))
+                return self._receber_todos()
+            except RuntimeError as e:
+                print(f"ERRO: Falha em um shard de {self.sufixo} ({e}). Buscando no processo da API.")
+                return None
+            except (OSError, EOFError, TimeoutError) as e:
+                print(f"ERRO: Shards de {self.sufixo} indisponíveis ({e}). Buscando no processo da API.")
+                self.ativo = False
+                threading.Thread(target=self._finalizador, daemon=True).start()
+                return None
+
+    def buscar_trechos_lote(self, embeddings, vetores, k, n_probe):
+        respostas = self._pedir('trechos', vetores, k, n_probe)
+        if respostas is None:
+            return None
+        # Linhas ingeridas depois do build: busca exata aqui mesmo.
+        cauda = embeddings[self.n_linhas:] if len(embeddings) > self.n_linhas else None
+        if cauda is not None:
+            respostas.append([(linhas + self.n_linhas, scores) for linhas, scores in busca_exata_lote(cauda, vetores, k)])
+        resultados = []
+        for por_shard in zip(*respostas):
+            linhas = np.concatenate([linhas for linhas, _ in por_shard])
+            scores = np.concatenate([scores for _, scores in por_shard])
+            top = _top_k(scores, k)
+            resultados.append((linhas[top], scores[top]))
+        return resultados
+
+    def pontuar_temas_lote(self, embeddings, vetores):
+        respostas = self._pedir('temas', vetores)
+        if respostas is None:
+            return None
+        if len(embeddings) > self.n_linhas:
+            respostas.append(similaridade_cosseno_lote(embeddings[self.n_linhas:], vetores))
+        return list(np.hstack(respostas))
+
+
+def iniciar_shards(diretorio, sufixo, ids_livro, usar_ivf=False, n_shards=SHARDS):
+    caminho_vec = os.path.join(diretorio, f'embeddings_{sufixo}.vec')
+    if n_shards <= 1 or not os.path.exists(caminho_vec):
+        if n_shards > 1:
+            print(f"AVISO: '{caminho_vec}' não encontrado; os shards precisam do formato .vec. Buscando no processo da API.")
+        return None
+    limites = carregar_particao(diretorio, sufixo, ids_livro, n_shards)
+    if len(limites) < 3:
+        print(f"AVISO: Os livros de {sufixo} não se dividem em mais de um shard. Buscando no processo da API.")
+        return None
+    caminho_ivf = os.path.join(diretorio, f'ivf_{sufixo}.npz') if usar_ivf else None
+    try:
+        grupo = GrupoShards(sufixo, caminho_vec, caminho_ivf, limites)
+    except Exception as e:
+        print(f"ERRO: Falha ao iniciar os shards de {sufixo} ({e}). Buscando no processo da API.")
+        return None
+    tamanhos = np.diff(limites)
+    print(f"  {len(grupo)} shards de {sufixo} prontos ({tamanhos.min()}-{tamanhos.max()} linhas cada).")
+    return grupo
+
+
+if __name__ == '__main__':
+    servir()
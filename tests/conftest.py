@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, 'benchmarks'))
+
+# Lidas na importação dos módulos: têm que valer antes de qualquer teste
+# importar o main. Sem vigia de gerações (as recargas são pedidas pelos
+# testes) e com a fila de ingestão olhando a tabela de jobs a toda hora.
+os.environ.setdefault('SCRIPTURA_INICIALIZACAO_SINCRONA', '1')
+os.environ.setdefault('SCRIPTURA_RECARGA_AUTOMATICA_S', '0')
+os.environ.setdefault('SCRIPTURA_INGESTAO_POLLING', '0.1')
+os.environ.setdefault('SCRIPTURA_BUILD_PROCESSOS', '1')
+
+import sintetico  # noqa: E402
+
+LIVROS = 6
+FRASES_POR_LIVRO = 60
+
+
+@pytest.fixture(scope='session')
+def acervo(tmp_path_factory):
+    # Acervo sintético com uma geração de índices publicada. O diretório de
+    # trabalho fica nele até o fim da sessão, como o da API.
+    diretorio = str(tmp_path_factory.mktemp('acervo'))
+    consultas = sintetico.gerar_corpus(diretorio, LIVROS, FRASES_POR_LIVRO, 8)
+    os.chdir(diretorio)
+    pipeline_corpus = sintetico.instalar_modelos_sinteticos()
+    assert pipeline_corpus.rodar_pipeline(processos=1)
+    return consultas
+
+
+@pytest.fixture(scope='session')
+def api(acervo):
+    import main
+    from fastapi.testclient import TestClient
+
+    assert main.inicializacao.pronto.is_set()
+    yield main, TestClient(main.app)
+    main.fila_ingestao.parar()
+    main.fila_ingestao._thread.join(5)
+
+
+def novo_livro(titulo, semente):
+    # Um livro aprovado no painel depois do build (status EM_REVISAO).
+    rng = np.random.default_rng(semente)
+    palavras, probabilidades = sintetico.gerar_vocabulario(rng, 2000)
+    caminho = os.path.join('corpus', f'novo_{semente}.txt')
+    with open(caminho, 'w', encoding='utf-8') as f:
+        f.write(' '.join(sintetico.gerar_frases(rng, palavras, probabilidades, FRASES_POR_LIVRO)))
+    conn = sqlite3.connect('literatura.db')
+    try:
+        cursor = conn.execute(
+            "INSERT INTO livros (titulo, autor, caminho_arquivo, status) VALUES (?, 'Autor Novo', ?, 'EM_REVISAO')",
+            (titulo, caminho),
+        )
+        conn.commit()
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+
+def aprovar_e_esperar(cliente, livro_id, timeout=60):
+    resposta = cliente.put(f'/admin/atualizar-livro/{livro_id}', json={'status': 'PROCESSADO'})
+    assert resposta.status_code == 200, resposta.text
+    job_id = resposta.json()['job_ingestao']
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        job = next(job for job in cliente.get('/admin/jobs').json() if job['id'] == job_id)
+        if job['status'] in ('CONCLUIDO', 'ERRO'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"O job {job_id} não terminou em {timeout} s.")
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+import pytest
+
+import pipeline_corpus
+
+
+def assert_resultados_tema_iguais(obtidos, esperados):
+    assert len(obtidos) == len(esperados)
+    for obtido, esperado in zip(obtidos, esperados):
+        assert obtido['obra'] == esperado['obra']
+        assert obtido['texto_chunk_encontrado'] == esperado['texto_chunk_encontrado']
+        for campo in ('score_fusao_multiplicativa', 'score_vetor_normalizado', 'score_bm25_normalizado'):
+            assert obtido[campo] == pytest.approx(esperado[campo], abs=1e-5)
+
+
+def test_saude_e_metricas(api):
+    main, cliente = api
+    assert cliente.get('/health/live').status_code == 200
+    pronto = cliente.get('/health/ready')
+    assert pronto.status_code == 200, pronto.text
+    metricas = cliente.get('/metrics')
+    assert metricas.status_code == 200
+    assert 'scriptura_pronto 1' in metricas.text
+    assert 'scriptura_indice_linhas' in metricas.text
+
+
+def test_trecho_encontra_o_livro_de_origem(api, acervo):
+    _, cliente = api
+    for consulta in acervo['trecho']:
+        resposta = cliente.post('/encontrar-por-trecho', json={'texto': consulta['texto']})
+        assert resposta.status_code == 200, resposta.text
+        assert 'Server-Timing' in resposta.headers
+        assert resposta.json()[0]['obra']['id'] == consulta['livro_id']
+
+
+def test_tema_encontra_o_livro_de_origem(api, acervo):
+    _, cliente = api
+    for consulta in acervo['tema']:
+        resposta = cliente.post('/recomendar-por-tema', json={'texto': consulta['texto']})
+        assert resposta.status_code == 200, resposta.text
+        assert resposta.json()[0]['obra']['id'] == consulta['livro_id']
+
+
+def test_lote_igual_as_buscas_individuais(api, acervo):
+    _, cliente = api
+    textos = [consulta['texto'] for consulta in acervo['trecho'][:4]]
+    lote = cliente.post('/encontrar-por-trecho/batch', json={'textos': textos + ['oi']})
+    assert lote.status_code == 200, lote.text
+    itens = lote.json()
+    for texto, item in zip(textos, itens):
+        assert item['erro'] is None
+        assert item['resultados'] == cliente.post('/encontrar-por-trecho', json={'texto': texto}).json()
+    # Um texto inválido não derruba o lote.
+    assert itens[-1]['erro']
+
+    textos = [consulta['texto'] for consulta in acervo['tema'][:4]]
+    lote = cliente.post('/recomendar-por-tema/batch', json={'textos': textos})
+    assert lote.status_code == 200, lote.text
+    for texto, item in zip(textos, lote.json()):
+        # O produto de matrizes do lote pode mudar o último dígito dos scores.
+        assert_resultados_tema_iguais(item['resultados'], cliente.post('/recomendar-por-tema', json={'texto': texto}).json())
+
+
+def test_paginacao_da_busca_por_tema(api, acervo):
+    _, cliente = api
+    texto = acervo['tema'][0]['texto']
+    completa = cliente.post('/recomendar-por-tema', json={'texto': texto, 'formato': 'compacto', 'limite_livros': 4}).json()
+    primeira = cliente.post('/recomendar-por-tema', json={'texto': texto, 'formato': 'compacto', 'limite_livros': 2}).json()
+    assert [obra['id'] for obra in primeira['obras']] == [obra['id'] for obra in completa['obras'][:2]]
+    assert primeira['proximo']
+
+    segunda = cliente.get('/recomendar-por-tema/pagina', params={'cursor': primeira['proximo']})
+    assert segunda.status_code == 200, segunda.text
+    assert [obra['id'] for obra in segunda.json()['obras']] == [obra['id'] for obra in completa['obras'][2:4]]
+
+    linhas = cliente.post('/recomendar-por-tema', json={'texto': texto, 'formato': 'ndjson', 'limite_livros': 4}).text
+    livros = [json.loads(linha) for linha in linhas.splitlines()[1:]]
+    assert [livro['obra']['id'] for livro in livros] == [obra['id'] for obra in completa['obras']]
+
+    for cursor in ('lixo', 'zz.l.0.0.1', primeira['ranking'] + '.l.0.0.1', primeira['ranking'] + '.c.1.-1.5'):
+        assert cliente.get('/recomendar-por-tema/pagina', params={'cursor': cursor}).status_code == 400
+
+
+def test_recarga_de_uma_geracao_nova(api, acervo):
+    main, cliente = api
+    antes = cliente.post('/encontrar-por-trecho', json={'texto': acervo['trecho'][0]['texto']}).json()
+    geracao = main.geracao_carregada
+
+    assert pipeline_corpus.rodar_pipeline(processos=1)
+    resposta = cliente.post('/admin/recarregar-indices')
+    assert resposta.status_code == 200, resposta.text
+    assert resposta.json()['geracao'] != geracao
+    assert cliente.get('/admin/indices').json()['geracao'] == resposta.json()['geracao']
+
+    depois = cliente.post('/encontrar-por-trecho', json={'texto': acervo['trecho'][0]['texto']}).json()
+    assert depois == antes
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from armazenamento_vetores import carregar_matriz_vetores, normalizar_linhas, salvar_matriz_vetores
+from geracoes import criar_geracao, diretorio_atual, geracao_atual, publicar_geracao
+from indice_bm25 import IndiceBM25, construir_indice_bm25, tokenizar_bm25
+from indice_colunar import IndiceColunar
+from segmentos import SegmentosLivros
+
+TEXTOS = [
+    'O sol nasceu sobre o mar.',
+    'A lua e o mar à noite.',
+    'Coração, alma e tempo.',
+    'O mar, o mar, sempre o mar.',
+]
+
+
+def test_vec_ida_e_volta(tmp_path):
+    embeddings = np.random.default_rng(1).standard_normal((7, 5)).astype(np.float32)
+    for dtype in ('float32', 'float16'):
+        caminho = str(tmp_path / f'embeddings_{dtype}.vec')
+        salvar_matriz_vetores(caminho, embeddings, 'modelo-teste', dtype=dtype, versao_build='v1')
+        matriz, cabecalho = carregar_matriz_vetores(caminho)
+        assert isinstance(matriz, np.memmap) and matriz.dtype == np.dtype(dtype)
+        assert (cabecalho['modelo'], cabecalho['linhas'], cabecalho['dimensao']) == ('modelo-teste', 7, 5)
+        np.testing.assert_allclose(matriz, normalizar_linhas(embeddings), atol=1e-3)
+
+    (tmp_path / 'lixo.vec').write_bytes(b'nao sou um vec')
+    with pytest.raises(ValueError):
+        carregar_matriz_vetores(str(tmp_path / 'lixo.vec'))
+
+
+def test_indice_colunar_ida_e_volta(tmp_path):
+    indice = IndiceColunar.de_registros(
+        [{'id_livro': i % 2 + 1, 'texto': texto} for i, texto in enumerate(TEXTOS)]
+    )
+    indice.salvar(str(tmp_path / 'index_TEMA'))
+    carregado = IndiceColunar.carregar(str(tmp_path / 'index_TEMA'))
+    assert list(carregado) == list(indice)
+    assert carregado.livros() == {1, 2}
+
+    juntos = IndiceColunar.concatenar([carregado, IndiceColunar.vazio(), indice])
+    assert juntos.textos() == TEXTOS + TEXTOS
+
+
+def test_bm25_csr_ida_e_volta(tmp_path):
+    indice = construir_indice_bm25(TEXTOS[:3])
+    indice.salvar(str(tmp_path / 'bm25_TEMA'))
+    carregado = IndiceBM25.carregar(str(tmp_path / 'bm25_TEMA'))
+    consulta = tokenizar_bm25('o mar e a alma')
+    np.testing.assert_array_equal(carregado.pontuar(consulta), indice.pontuar(consulta))
+
+    # Documentos acrescentados pela ingestão pontuam como num índice construído de uma vez.
+    np.testing.assert_allclose(
+        carregado.com_documentos(TEXTOS[3:]).pontuar(consulta), construir_indice_bm25(TEXTOS).pontuar(consulta),
+    )
+
+
+def test_segmentos_por_livro(tmp_path):
+    segmentos = SegmentosLivros(str(tmp_path / 'segmentos_TEMA'), 'assinatura')
+    indice = IndiceColunar.de_registros([{'id_livro': 3, 'texto': texto} for texto in TEXTOS])
+    embeddings = np.ones((len(TEXTOS), 4), dtype=np.float32)
+    segmentos.salvar(3, 'hash', indice, embeddings)
+
+    assert segmentos.ids_salvos() == [3]
+    assert segmentos.atualizado(3, 'hash')
+    assert not segmentos.atualizado(3, 'outro-hash')
+    assert not SegmentosLivros(segmentos.diretorio, 'outra').atualizado(3, 'hash')
+    carregado, vetores = segmentos.carregar(3)
+    assert carregado.textos() == TEXTOS
+    np.testing.assert_array_equal(vetores, embeddings)
+
+    with pytest.raises(ValueError):
+        segmentos.salvar(4, 'hash', indice, embeddings[:2])
+    assert segmentos.remover_ausentes([]) == 1
+    assert segmentos.ids_salvos() == []
+
+
+def test_ponteiro_de_geracao(tmp_path):
+    pasta = str(tmp_path / 'indices')
+    assert geracao_atual(pasta) is None
+    assert diretorio_atual(pasta) == '.'
+
+    nomes = []
+    for _ in range(4):
+        nome, _ = criar_geracao(pasta)
+        publicar_geracao(nome, pasta, manter=2)
+        nomes.append(nome)
+        assert geracao_atual(pasta) == nome
+    assert diretorio_atual(pasta) == str(tmp_path / 'indices' / nomes[-1])
+    # Só as `manter` mais recentes ficam no disco.
+    assert sorted(p.name for p in (tmp_path / 'indices').iterdir() if p.is_dir()) == nomes[-2:]
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+from conftest import RAIZ, aprovar_e_esperar, novo_livro
+from ingestao import FilaIngestao
+
+
+def esperar_jobs(fila, n, timeout=30):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        jobs = fila.listar()
+        if sum(job['status'] in ('CONCLUIDO', 'ERRO') for job in jobs) >= n:
+            return {job['livro_id']: job for job in jobs}
+        time.sleep(0.02)
+    raise TimeoutError(fila.listar())
+
+
+def test_fila_de_ingestao(tmp_path):
+    liberar = threading.Event()
+    processados = []
+
+    def processar(livro_id, etapa):
+        etapa('trabalhando')
+        liberar.wait(10)
+        if livro_id == 2:
+            raise ValueError('livro inválido')
+        processados.append(livro_id)
+        return f'livro {livro_id} pronto'
+
+    fila = FilaIngestao(str(tmp_path / 'jobs.db'), processar, intervalo_polling=0.05)
+    fila.iniciar()
+    try:
+        primeiro = fila.enfileirar(1)
+        # Enquanto o primeiro roda, um livro já pendente não ganha outro job.
+        segundo = fila.enfileirar(2)
+        assert fila.enfileirar(2) == segundo
+        liberar.set()
+        jobs = esperar_jobs(fila, 2)
+    finally:
+        fila.parar()
+        fila._thread.join(5)
+
+    assert jobs[1]['id'] == primeiro and jobs[1]['status'] == 'CONCLUIDO'
+    assert jobs[1]['mensagem'] == 'livro 1 pronto'
+    assert jobs[2]['status'] == 'ERRO' and jobs[2]['mensagem'] == 'livro inválido'
+    assert processados == [1]
+
+
+def bytes_vetores(metricas, indice):
+    padrao = rf'^scriptura_indice_bytes\{{indice="{indice}",tipo="vetores"\}} (\S+)$'
+    return float(re.search(padrao, metricas, re.MULTILINE).group(1))
+
+
+def test_metricas_depois_da_ingestao(api):
+    main, cliente = api
+    antes = cliente.get('/metrics')
+    assert antes.status_code == 200
+
+    livro_id = novo_livro('Livro Ingerido Para Métricas', 101)
+    job = aprovar_e_esperar(cliente, livro_id)
+    assert job['status'] == 'CONCLUIDO', job['mensagem']
+    assert livro_id in main.indices.livros_indexados()
+
+    # Depois da ingestão, os vetores são uma MatrizEmPartes.
+    depois = cliente.get('/metrics')
+    assert depois.status_code == 200, depois.text
+    assert bytes_vetores(depois.text, 'TRECHO') > bytes_vetores(antes.text, 'TRECHO')
+    assert bytes_vetores(depois.text, 'TEMA') > bytes_vetores(antes.text, 'TEMA')
+
+
+def test_ingerido_sobrevive_ao_reinicio(api):
+    main, cliente = api
+    livro_id = novo_livro('Livro Ingerido Antes do Reinício', 102)
+    job = aprovar_e_esperar(cliente, livro_id)
+    assert job['status'] == 'CONCLUIDO', job['mensagem']
+    jobs_antes = len(cliente.get('/admin/jobs').json())
+
+    # Um processo novo sobe só com a geração do disco, que não tem o livro.
+    script = (
+        "import json, sintetico; sintetico.instalar_modelos_sinteticos(); import main; "
+        "print(json.dumps({'livros': sorted(main.indices.livros_indexados()), "
+        "'trechos': len(main.indices.index_TRECHO), 'temas': len(main.indices.index_TEMA)}))"
+    )
+    ambiente = dict(os.environ, PYTHONPATH=os.pathsep.join([RAIZ, os.path.join(RAIZ, 'benchmarks')]))
+    saida = subprocess.run(
+        [sys.executable, '-c', script], capture_output=True, text=True, timeout=120, env=ambiente, check=True,
+    ).stdout
+    estado = json.loads(saida.strip().splitlines()[-1])
+
+    assert livro_id in estado['livros']
+    assert estado['trechos'] == len(main.indices.index_TRECHO)
+    assert estado['temas'] == len(main.indices.index_TEMA)
+    # Restaurado dos segmentos, sem passar de novo pela fila.
+    assert len(cliente.get('/admin/jobs').json()) == jobs_antes
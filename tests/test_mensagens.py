@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+from multiprocessing import Pipe
+
+import numpy as np
+import pytest
+
+from mensagens import enviar, receber
+
+
+def ida_e_volta(mensagem):
+    lado_a, lado_b = Pipe()
+    with lado_a, lado_b:
+        enviar(lado_a, mensagem)
+        return receber(lado_b)
+
+
+def test_tipos_suportados():
+    vetores = np.arange(12, dtype=np.float32).reshape(3, 4)
+    mensagem = (
+        'trechos',
+        (vetores, 10, np.int64(8)),
+        {'chave': [1, 2.5, None, True, 'texto']},
+        {3: b'\x00\x01bytes', (1, 2): 'tupla'},
+        [np.arange(5, dtype=np.int32), np.zeros((0, 4), dtype=np.float16), np.float32(0.5)],
+    )
+    recebida = ida_e_volta(mensagem)
+
+    assert recebida[0] == 'trechos'
+    np.testing.assert_array_equal(recebida[1][0], vetores)
+    assert recebida[1][0].dtype == np.float32 and recebida[1][0].flags.writeable
+    assert recebida[1][1:] == (10, 8) and type(recebida[1][2]) is int
+    assert recebida[2] == {'chave': [1, 2.5, None, True, 'texto']}
+    assert recebida[3] == {3: b'\x00\x01bytes', (1, 2): 'tupla'}
+    inteiros, vazio, escalar = recebida[4]
+    assert inteiros.dtype == np.int32 and list(inteiros) == [0, 1, 2, 3, 4]
+    assert vazio.shape == (0, 4) and vazio.dtype == np.float16
+    assert escalar == 0.5
+
+
+def test_tipos_nao_suportados():
+    for valor in (object(), {1, 2}, np.array(['a', 'b'], dtype=object)):
+        with pytest.raises(TypeError):
+            ida_e_volta(('ok', valor))
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from armazenamento_vetores import normalizar_linhas
+from quantizacao import BLOCO_VARREDURA, CodigosInt8, buscar_lote_refinando
+
+
+def test_int8_pontua_como_os_codigos_em_float():
+    rng = np.random.default_rng(5)
+    # Um número de linhas que não é múltiplo do bloco da varredura.
+    matriz = normalizar_linhas(rng.standard_normal((3 * BLOCO_VARREDURA + 17, 32)).astype(np.float32))
+    quantizador = CodigosInt8.treinar(matriz)
+    quantizador = CodigosInt8(quantizador.codificar(matriz), quantizador.escalas)
+    vetores = normalizar_linhas(rng.standard_normal((4, 32)).astype(np.float32))
+
+    esperado = vetores @ (quantizador.codigos.astype(np.float32) * quantizador.escalas).T
+    np.testing.assert_allclose(quantizador.pontuar_lote(vetores), esperado, atol=1e-5)
+
+    for vetor, (linhas, _) in zip(vetores, buscar_lote_refinando(quantizador, matriz, vetores, 5)):
+        assert set(linhas) == set(np.argsort(-(matriz @ vetor))[:5])
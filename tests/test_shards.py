@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from armazenamento_vetores import normalizar_linhas, salvar_matriz_vetores, similaridade_cosseno_lote
+from conftest import RAIZ
+from indice_ann import busca_exata_lote
+from shards import iniciar_shards
+
+
+def test_shards_iguais_ao_processo_unico(tmp_path):
+    rng = np.random.default_rng(3)
+    embeddings = normalizar_linhas(rng.standard_normal((400, 16)).astype(np.float32))
+    ids_livro = np.repeat(np.arange(8), 50)
+    salvar_matriz_vetores(str(tmp_path / 'embeddings_TRECHO.vec'), embeddings, 'sintetico')
+    vetores = normalizar_linhas(rng.standard_normal((5, 16)).astype(np.float32))
+
+    grupo = iniciar_shards(str(tmp_path), 'TRECHO', ids_livro, n_shards=2)
+    assert grupo is not None and len(grupo) == 2
+    try:
+        for (linhas, scores), (linhas_exatas, scores_exatos) in zip(
+            grupo.buscar_trechos_lote(embeddings, vetores, 10, 0), busca_exata_lote(embeddings, vetores, 10),
+        ):
+            assert list(linhas) == list(linhas_exatas)
+            np.testing.assert_allclose(scores, scores_exatos, atol=1e-6)
+        np.testing.assert_allclose(
+            np.asarray(grupo.pontuar_temas_lote(embeddings, vetores)),
+            similaridade_cosseno_lote(embeddings, vetores), atol=1e-6,
+        )
+    finally:
+        grupo.encerrar()
+
+
+def test_shard_por_tcp_exige_chave(tmp_path):
+    ambiente = dict(os.environ, SCRIPTURA_SHARDS_CHAVE='ab' * 8)
+    processo = subprocess.run(
+        [sys.executable, os.path.join(RAIZ, 'shards.py'), '--vec', 'x.vec', '--inicio', '0', '--fim', '1',
+         '--endereco', '127.0.0.1:0'],
+        capture_output=True, text=True, timeout=60, env=ambiente,
+    )
+    assert processo.returncode != 0
+    assert 'SCRIPTURA_SHARDS_CHAVE' in processo.stderr